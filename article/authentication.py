@@ -0,0 +1,116 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import signing
+from rest_framework.authentication import BaseAuthentication, get_authorization_header
+from rest_framework.exceptions import AuthenticationFailed
+
+from .cache import get_cache
+
+TOKEN_SALT = 'article.authentication.token'
+""" Поля пользователя токена: достаточно для прав доступа и ответов API """
+USER_FIELDS = ('id', 'username', 'is_superuser', 'is_staff', 'is_active')
+""" Предел размера кэша процесса, при превышении он очищается """
+LOCAL_CACHE_SIZE = 10000
+
+""" Кэш процесса: {id пользователя: (срок по time.monotonic, значения USER_FIELDS)} """
+_users = {}
+
+
+def make_token(user):
+    """ Подписанный токен API с id пользователя и временем выдачи, без хранения в базе данных """
+    return signing.dumps({'id': user.pk}, salt=TOKEN_SALT, compress=True)
+
+
+""" Бэкенды кэша, у которых своё содержимое в каждом процессе """
+LOCAL_CACHE_BACKENDS = ('django.core.cache.backends.locmem.LocMemCache',)
+
+
+def is_shared_cache():
+    """ Общий ли кэш API для процессов: иначе forget_user не сбрасывает пользователя в других процессах """
+    alias = getattr(settings, 'API_CACHE_ALIAS', 'default')
+    return settings.CACHES.get(alias, {}).get('BACKEND') not in LOCAL_CACHE_BACKENDS
+
+
+def get_user_ttl():
+    """
+    Срок хранения пользователя в кэше API. Если кэш не общий, срок не больше
+    API_TOKEN_USER_LOCAL_TTL: блокировка пользователя или снятие прав доходят
+    до остальных процессов не позже, чем через это время
+    """
+    ttl = getattr(settings, 'API_TOKEN_USER_TTL', 300)
+    if is_shared_cache():
+        return ttl
+    return min(ttl, getattr(settings, 'API_TOKEN_USER_LOCAL_TTL', 10))
+
+
+def get_user_key(user_id):
+    return f'token-user:{user_id}'
+
+
+def get_token_user(user_id):
+    """
+    Пользователь токена: из кэша процесса (API_TOKEN_USER_LOCAL_TTL), общего кэша API
+    (API_TOKEN_USER_TTL) или из базы данных. Остальные поля User отложены (deferred):
+    save() такого экземпляра изменяет только загруженные поля
+    """
+    now = time.monotonic()
+    local = _users.get(user_id)
+    if local is not None and local[0] > now:
+        values = local[1]
+    else:
+        cache = get_cache()
+        values = cache.get(get_user_key(user_id))
+        if values is None:
+            values = User.objects.filter(pk=user_id).values(*USER_FIELDS).first()
+            if values is None:
+                return None
+            cache.set(get_user_key(user_id), values, get_user_ttl())
+        if len(_users) >= LOCAL_CACHE_SIZE:
+            _users.clear()
+        _users[user_id] = (now + getattr(settings, 'API_TOKEN_USER_LOCAL_TTL', 10), values)
+
+    fields = [field.attname for field in User._meta.concrete_fields if field.attname in values]
+    return User.from_db(User.objects.db, fields, [values[field] for field in fields])
+
+
+def forget_user(user_id):
+    """ Сброс кэша пользователя после его изменения; кэши других процессов - по истечении срока (get_user_ttl) """
+    _users.pop(user_id, None)
+    get_cache().delete(get_user_key(user_id))
+
+
+class SignedTokenAuthentication(BaseAuthentication):
+    """
+    Заголовок Authorization: Token <токен из make_token>. Подпись и срок
+    (API_TOKEN_MAX_AGE) проверяются без базы данных, пользователь - из кэша.
+    Без authenticate_header: отказ в доступе, как и при входе по сессии, - 403
+    """
+    keyword = 'Token'
+
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise AuthenticationFailed('Invalid token header.')
+
+        try:
+            payload = signing.loads(auth[1].decode(), salt=TOKEN_SALT,
+                                    max_age=getattr(settings, 'API_TOKEN_MAX_AGE', None))
+        except signing.SignatureExpired:
+            raise AuthenticationFailed('Token expired.')
+        except (signing.BadSignature, UnicodeError):
+            raise AuthenticationFailed('Invalid token.')
+
+        user = get_token_user(payload['id'])
+        if user is None or not user.is_active:
+            raise AuthenticationFailed('User inactive or deleted.')
+        return user, payload
+
+
+def issue_token(strategy, user=None, *args, **kwargs):
+    """ Шаг SOCIAL_AUTH_PIPELINE: токен API после входа через GitHub, сохраняется в сессии """
+    if user is not None:
+        strategy.session_set('api_token', make_token(user))
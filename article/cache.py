@@ -0,0 +1,205 @@
+import hashlib
+import time
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+from conf.db import primary_pinned
+
+""" Эндпоинты с кэшированием ответов, для статистики попаданий """
+ENDPOINTS = set()
+
+
+def get_cache():
+    """ Кэш ответов API, алиас задаётся API_CACHE_ALIAS """
+    return caches[getattr(settings, 'API_CACHE_ALIAS', 'default')]
+
+
+def get_version(resource):
+    """
+    Поколение ресурса входит в ключ кэша: после изменения данных старые
+    ключи больше не запрашиваются и вытесняются по LRU/TIMEOUT
+    """
+    cache = get_cache()
+    key = f'version:{resource}'
+    version = cache.get(key)
+    if version is None:
+        """ Новое поколение не совпадает с вытесненным из кэша прежним """
+        version = time.time_ns()
+        cache.add(key, version, timeout=None)
+        version = cache.get(key, version)
+    return version
+
+
+def invalidate(*resources):
+    """ Сброс кэша ресурсов сразу и повторно после фиксации транзакции """
+    def bump():
+        cache = get_cache()
+        for resource in resources:
+            try:
+                cache.incr(f'version:{resource}')
+            except ValueError:
+                cache.set(f'version:{resource}', time.time_ns(), timeout=None)
+
+    bump()
+    transaction.on_commit(bump)
+
+
+def get_user_resource(resource, user_id):
+    """ Ресурс с поколением по пользователю: его изменение не сбрасывает кэш других пользователей """
+    return f'{resource}:{user_id}'
+
+
+def get_cache_key(request, resource, endpoint, kwargs, depends=None, private=()):
+    """
+    Ключ по поколению ресурса, аргументам URL и нормализованной строке запроса.
+    depends - {параметр запроса: ресурс}, от которого ответ зависит при этом параметре,
+    private - параметры запроса, с которыми ответ свой у каждого пользователя.
+    Ресурс private-параметра берётся по пользователю (get_user_resource)
+    """
+    if any(param in request.query_params for param in private):
+        kwargs = {**kwargs, 'user': request.user.pk}
+    resources = [resource, *(
+        get_user_resource(dependency, request.user.pk) if param in private else dependency
+        for param, dependency in (depends or {}).items() if param in request.query_params
+    )]
+    params = sorted(
+        ((name, value) for name, values in request.query_params.lists() for value in values if value != ''),
+        key=lambda param: param[0]
+    )
+    """ Хост входит в ключ: ссылки постраничного вывода абсолютные """
+    query = hashlib.md5(f'{request.scheme}://{request.get_host()}?{urlencode(params)}'.encode()).hexdigest()
+    args = ':'.join(f'{name}={value}' for name, value in sorted(kwargs.items()))
+    version = ':'.join(str(get_version(name)) for name in resources)
+    return f'response:{endpoint}:{version}:{args}:{query}'
+
+
+def record(endpoint, result):
+    """ Счётчики попаданий/промахов по эндпоинтам """
+    cache = get_cache()
+    key = f'stats:{endpoint}:{result}'
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        pass
+
+
+def get_stats():
+    """ {эндпоинт: (попадания, промахи)} """
+    cache = get_cache()
+    keys = [f'stats:{endpoint}:{result}' for endpoint in sorted(ENDPOINTS) for result in ('hit', 'miss')]
+    values = cache.get_many(keys)
+    return {
+        endpoint: (values.get(f'stats:{endpoint}:hit', 0), values.get(f'stats:{endpoint}:miss', 0))
+        for endpoint in sorted(ENDPOINTS)
+    }
+
+
+def reset_stats():
+    get_cache().delete_many([f'stats:{endpoint}:{result}' for endpoint in ENDPOINTS for result in ('hit', 'miss')])
+
+
+def is_bypassed():
+    """
+    Запрос клиента, закреплённого за основной базой после записи, при репликах не
+    читает и не заполняет кэш: ключ с новым поколением ресурса мог заполнить
+    другой клиент ответом с отстающей реплики
+    """
+    return primary_pinned.get() and bool(getattr(settings, 'DATABASE_REPLICAS', []))
+
+
+def cache_response(resource, endpoint, depends=None, private=()):
+    """
+    Декоратор list/retrieve: response.data кэшируется до изменения resource
+    (и ресурсов depends, см. get_cache_key) или до истечения TIMEOUT кэша.
+    С параметрами private ответ кэшируется отдельно для каждого пользователя
+    """
+    ENDPOINTS.add(endpoint)
+
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            if is_bypassed():
+                response = method(self, request, *args, **kwargs)
+                response['X-Cache'] = 'BYPASS'
+                return response
+
+            cache = get_cache()
+            key = get_cache_key(request, resource, endpoint, kwargs, depends, private)
+            data = cache.get(key)
+            if data is not None:
+                record(endpoint, 'hit')
+                response = Response(data)
+                response['X-Cache'] = 'HIT'
+                return response
+
+            response = method(self, request, *args, **kwargs)
+            if response.status_code == 200:
+                cache.set(key, response.data)
+            record(endpoint, 'miss')
+            response['X-Cache'] = 'MISS'
+            return response
+        return wrapper
+    return decorator
+
+
+def conditional_response(get_validators, skip_params=()):
+    """
+    Декоратор list/retrieve: ETag и Last-Modified по дешёвым данным версии.
+    get_validators(view, request, **kwargs) возвращает (версия, время изменения)
+    или None, если проверка невозможна (например, объект не найден).
+    Ответ 304 возвращается до выборки и сериализации данных.
+    С параметрами запроса skip_params ответ зависит от других данных, проверка не выполняется
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            if any(param in request.query_params for param in skip_params):
+                return method(self, request, *args, **kwargs)
+            validators = get_validators(self, request, **kwargs)
+            if validators is None:
+                return method(self, request, *args, **kwargs)
+
+            version, last_modified = validators
+            digest = hashlib.md5(f'{version}:{request.get_full_path()}'.encode()).hexdigest()
+            etag = f'"{digest}"'
+            last_modified = int(last_modified.timestamp())
+
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = method(self, request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+            return response
+        return wrapper
+    return decorator
+
+
+def get_object_validators(view, request, **kwargs):
+    """ Версия объекта по updated_at, одним запросом по первичному ключу """
+    lookup = kwargs[view.lookup_url_kwarg or view.lookup_field]
+    try:
+        updated_at = view.queryset.model.objects.filter(pk=lookup).values_list('updated_at', flat=True).first()
+    except (TypeError, ValueError):
+        return None
+    if updated_at is None:
+        return None
+    return updated_at.isoformat(), updated_at
+
+
+def get_list_validators(view, request, **kwargs):
+    """ Версия списка по количеству записей и последнему updated_at """
+    state = view.queryset.model.objects.aggregate(count=Count('pk'), last_modified=Max('updated_at'))
+    if state['last_modified'] is None:
+        return None
+    return f'{state["count"]}:{state["last_modified"].isoformat()}', state['last_modified']
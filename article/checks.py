@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+from .authentication import is_shared_cache
+
+
+@register(Tags.caches, deploy=True)
+def check_api_cache(app_configs, **kwargs):
+    """ Кэш API в каждом процессе свой: сброс кэша ответов и пользователей токенов не доходит до других процессов """
+    if is_shared_cache():
+        return []
+    alias = getattr(settings, 'API_CACHE_ALIAS', 'default')
+    return [Warning(
+        f'API cache alias {alias!r} is local to each process.',
+        hint='Use a shared backend (Redis, Memcached) when running several processes: cached responses and '
+             'token users are reset only in the process that changed them, other processes keep them '
+             'up to API_TOKEN_USER_LOCAL_TTL seconds for users and until TIMEOUT for responses.',
+        id='article.W001',
+    )]
@@ -0,0 +1,60 @@
+import time
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramSimilarity
+from django.db import connections
+from django.db.models import Case, Exists, F, FloatField, Q, When
+from django.db.models.functions import Cast
+from rest_framework.filters import SearchFilter
+
+""" Интервал повторной проверки pg_trgm, секунды: расширение можно установить без перезапуска """
+TRIGRAM_CHECK_INTERVAL = 300
+""" {алиас базы данных: (время проверки, установлено ли pg_trgm)} """
+_trigram = {}
+
+
+def has_trigram(alias):
+    """
+    Установлено ли расширение pg_trgm в базе данных alias (проверяется раз в TRIGRAM_CHECK_INTERVAL).
+    Реплика может отставать от основной базы и в установке расширения, поэтому проверяется та база,
+    из которой читается запрос
+    """
+    checked = _trigram.get(alias)
+    if checked is not None and time.monotonic() - checked[0] < TRIGRAM_CHECK_INTERVAL:
+        return checked[1]
+    with connections[alias].cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        installed = cursor.fetchone() is not None
+    _trigram[alias] = (time.monotonic(), installed)
+    return installed
+
+
+class ArticleSearchFilter(SearchFilter):
+    """
+    Полнотекстовый поиск ?search= по search_vector статьи (GIN-индекс) с сортировкой
+    по релевантности search_rank. Если ничего не найдено и установлен pg_trgm -
+    поиск по похожести заголовка для запросов с опечатками
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        search = request.query_params.get(self.search_param, '').strip()
+        if not search:
+            return queryset
+
+        model = queryset.model
+        query = SearchQuery(search, config=model.SEARCH_CONFIG, search_type='websearch')
+        rank = Cast(SearchRank(F('search_vector'), query), FloatField())
+        """ queryset.db - база данных чтения по DATABASE_ROUTERS """
+        if not has_trigram(queryset.db):
+            return queryset.filter(search_vector=query).annotate(search_rank=rank).order_by('-search_rank')
+
+        """
+        Похожие заголовки - только если полнотекстовых совпадений нет: тем же запросом
+        страницы, проверка EXISTS выполняется базой данных один раз (InitPlan)
+        """
+        found = Exists(queryset.filter(search_vector=query).order_by().values('pk'))
+        return queryset.filter(
+            Q(search_vector=query) | Q(~found, title__trigram_similar=search)
+        ).annotate(search_rank=Case(
+            When(search_vector=query, then=rank),
+            default=Cast(TrigramSimilarity('title', search), FloatField())
+        )).order_by('-search_rank')
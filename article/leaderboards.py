@@ -0,0 +1,110 @@
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Article, ArticleRelation, LeaderboardDirty, LeaderboardEntry
+
+""" Статей в ответе с рейтингом """
+LEADERBOARD_SIZE = 20
+"""
+Хранится больше, чем выводится: статья, опустившаяся ниже сохранённых при
+частичном обновлении, не оставляет на своём месте дыру, которую заняла бы
+статья вне таблицы. Полное обновление выравнивает таблицу
+"""
+LEADERBOARD_STORED = 2 * LEADERBOARD_SIZE
+""" Байесовское среднее оценки: априорная оценка и её вес в голосах """
+RATING_PRIOR = 3.0
+RATING_PRIOR_WEIGHT = 5
+""" top: средняя оценка плюс TOP_LIKE_WEIGHT * ln(1 + лайки) """
+TOP_LIKE_WEIGHT = 0.5
+""" trending: лайки за TRENDING_WINDOW, вес лайка вдвое меньше каждые TRENDING_HALF_LIFE """
+TRENDING_WINDOW = timedelta(days=7)
+TRENDING_HALF_LIFE = timedelta(days=1)
+
+BAYES_RATING = '(a.rating_sum + %(prior)s * %(prior_weight)s) / (a.rating_count + %(prior_weight)s)'
+
+""" Для каждого рейтинга: (статьи полного обновления, соединение, оценка, условие попадания) """
+BOARDS = {
+    LeaderboardEntry.TOP: (
+        f'SELECT id FROM {Article._meta.db_table} WHERE like_count > 0 OR rating_count > 0',
+        '',
+        f'{BAYES_RATING} + %(top_like_weight)s * ln(1 + a.like_count)',
+        'a.like_count > 0 OR a.rating_count > 0',
+    ),
+    LeaderboardEntry.TRENDING: (
+        f'SELECT DISTINCT article_id FROM {ArticleRelation._meta.db_table} WHERE "like" AND liked_at > %(since)s',
+        f"""
+        CROSS JOIN LATERAL (
+            SELECT sum(power(0.5, extract(epoch FROM %(now)s - r.liked_at) / %(half_life)s)) AS value
+            FROM {ArticleRelation._meta.db_table} AS r
+            WHERE r.article_id = a.id AND r."like" AND r.liked_at > %(since)s
+        ) AS likes
+        """,
+        f'likes.value * ({BAYES_RATING}) / %(prior)s',
+        'likes.value > 0',
+    ),
+}
+
+
+def get_refresh_sql(board, full):
+    """
+    Пересчёт рейтинга board одним запросом: оценки кандидатов, места в категории и
+    в общем рейтинге по row_number, замена записей рейтинга первыми LEADERBOARD_STORED.
+    Кандидаты полного обновления - все подходящие статьи, частичного - статьи рейтинга
+    и изменённые (%(dirty)s)
+    """
+    full_candidates, join, score, condition = BOARDS[board]
+    entries = LeaderboardEntry._meta.db_table
+    candidates = full_candidates if full else f"""
+        SELECT article_id FROM {entries} WHERE board = %(board)s
+        UNION SELECT unnest(%(dirty)s::integer[])
+    """
+    return f"""
+        WITH candidates AS ({candidates}), scored AS (
+            SELECT a.id, a.category_id, {score} AS score
+            FROM {Article._meta.db_table} AS a {join}
+            WHERE a.id IN (SELECT * FROM candidates) AND ({condition})
+        ), ranked AS (
+            SELECT id, category_id, score,
+                   row_number() OVER (PARTITION BY category_id ORDER BY score DESC, id DESC) AS category_position,
+                   row_number() OVER (ORDER BY score DESC, id DESC) AS position
+            FROM scored
+        ), removed AS (
+            DELETE FROM {entries} WHERE board = %(board)s
+        )
+        INSERT INTO {entries} (board, category_id, position, article_id, score)
+        SELECT %(board)s, category_id, category_position, id, score FROM ranked
+        WHERE category_position <= %(stored)s
+        UNION ALL
+        SELECT %(board)s, NULL, position, id, score FROM ranked WHERE position <= %(stored)s
+    """
+
+
+def refresh_leaderboards(full=False, now=None):
+    """
+    Обновление рейтингов top и trending по категориям и общих. Частичное обновление
+    пересчитывает только статьи рейтингов и статьи из LeaderboardDirty - изменённые
+    голосами после прошлого обновления, полное - все статьи. Параллельные обновления
+    выполняются по очереди, чтение рейтингов не блокируется. Возвращает количество
+    учтённых изменённых статей. now - момент отсчёта окна trending
+    """
+    now = now or timezone.now()
+    params = {
+        'now': now, 'since': now - TRENDING_WINDOW, 'half_life': TRENDING_HALF_LIFE.total_seconds(),
+        'prior': RATING_PRIOR, 'prior_weight': RATING_PRIOR_WEIGHT, 'top_like_weight': TOP_LIKE_WEIGHT,
+        'stored': LEADERBOARD_STORED,
+    }
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'LOCK TABLE {LeaderboardEntry._meta.db_table} IN SHARE ROW EXCLUSIVE MODE')
+        cursor.execute(f'DELETE FROM {LeaderboardDirty._meta.db_table} RETURNING article_id')
+        dirty = [article_id for article_id, in cursor.fetchall()]
+        for board, _ in LeaderboardEntry.BOARDS:
+            cursor.execute(get_refresh_sql(board, full), {**params, 'board': board, 'dirty': dirty})
+    return len(dirty)
+
+
+def get_leaderboard(board, category_id=None):
+    """ Первые LEADERBOARD_SIZE записей рейтинга со статьями и авторами, одним запросом по индексу """
+    return LeaderboardEntry.objects.filter(board=board, category_id=category_id).select_related(
+        'article__owner').defer('article__search_vector').order_by('position')[:LEADERBOARD_SIZE]
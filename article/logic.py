@@ -1,13 +1,473 @@
-from django.db.models import Avg
+import logging
 
-from .models import ArticleRelation
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import DatabaseError, connection, connections, router, transaction
+from django.db.models import Avg, Case, Count, DecimalField, ExpressionWrapper, F, OuterRef, Q, Subquery, Sum, When
+from django.db.models.functions import Cast, Coalesce
+from django.utils import timezone
+
+from .cache import get_user_resource, invalidate
+from .models import Article, ArticleCounterDelta, ArticleRelation, CategoryStats, CategoryStatsDelta
+
+logger = logging.getLogger(__name__)
+
+""" Количество читателей, встраиваемых в ответ со статьёй """
+READERS_PREVIEW_LIMIT = 10
+""" Количество отложенных изменений счётчиков, применяемых одним запросом """
+FLUSH_BATCH_SIZE = 10000
+""" Счётчики статьи, изменение которых попадает в очередь сводных данных категории """
+CATEGORY_STATS_FIELDS = ('like_count', 'rating_sum', 'rating_count')
 
 
 def get_rating(article):
-    """ Метод для получения рейтинга """
-    rating_article = ArticleRelation.objects.filter(article=article).aggregate(rating_count=Avg('rating')).get(
-        'rating_count')
-    article.rating = rating_article
-    article.save()
+    """ Метод для получения рейтинга (полный пересчёт по всем оценкам статьи) """
+    rebuild_counters(Article.objects.filter(pk=article.pk))
+    article.refresh_from_db(fields=Article.COUNTER_FIELDS)
+
+
+def get_rating_delta(old_rating, new_rating):
+    """ Изменение счётчиков рейтинга при смене оценки old_rating -> new_rating """
+    return {
+        'rating_sum': (new_rating or 0) - (old_rating or 0),
+        'rating_count': (new_rating is not None) - (old_rating is not None),
+    }
+
+
+def get_relation_delta(old_like=False, old_rating=None, like=False, rating=None):
+    """ Изменение счётчиков статьи при смене состояния связи (лайк, оценка) """
+    return {'like_count': int(like) - int(old_like), **get_rating_delta(old_rating, rating)}
+
+
+def get_rating_expression(sum_delta, count_delta):
+    """ Средний рейтинг по счётчикам с учётом изменения, NULL если оценок нет """
+    output_field = DecimalField(max_digits=3, decimal_places=2)
+    return Case(
+        When(rating_count__gt=-count_delta, then=ExpressionWrapper(
+            Cast(F('rating_sum') + sum_delta, DecimalField(max_digits=12, decimal_places=2)) /
+            (F('rating_count') + count_delta),
+            output_field=output_field
+        )),
+        default=None,
+        output_field=output_field
+    )
+
+
+def change_counters(article_id, **deltas):
+    """
+    Атомарное изменение счётчиков статьи одним UPDATE через F(),
+    без чтения строки статьи и без агрегации по оценкам.
+    В режиме ARTICLE_COUNTERS_MODE = 'queue' изменение откладывается (False)
+    """
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if not deltas:
+        return False
+    if getattr(settings, 'ARTICLE_COUNTERS_MODE', 'inline') == 'queue':
+        enqueue_counters(article_id, deltas)
+        return False
+
+    values = {field: F(field) + delta for field, delta in deltas.items()}
+    values['updated_at'] = timezone.now()
+    if 'rating_sum' in deltas or 'rating_count' in deltas:
+        values['rating'] = get_rating_expression(deltas.get('rating_sum', 0), deltas.get('rating_count', 0))
+    Article.objects.filter(pk=article_id).update(**values)
+    if deltas.keys() & set(CATEGORY_STATS_FIELDS):
+        schedule_category_stats_flush()
+    invalidate('article')
+    return True
+
+
+def get_actual_counters():
+    """ Выражения для значений счётчиков, посчитанных по таблице ArticleRelation """
+    relations = ArticleRelation.objects.filter(article=OuterRef('pk')).order_by().values('article')
+
+    def aggregate(expression, **filters):
+        """ Условия filters отдельно от агрегата: подзапрос читает частичный индекс связей """
+        return Subquery(relations.filter(**filters).annotate(value=expression).values('value'))
+
+    return {
+        'rating_sum': Coalesce(aggregate(Sum('rating'), rating__isnull=False), 0),
+        'rating_count': Coalesce(aggregate(Count('rating'), rating__isnull=False), 0),
+        'like_count': Coalesce(aggregate(Count('pk'), like=True), 0),
+        'readers_count': Coalesce(aggregate(Count('pk')), 0),
+        'rating': aggregate(Avg('rating'), rating__isnull=False),
+    }
+
+
+def enqueue_counters(article_id, deltas):
+    """ Отложенное изменение счётчиков: вставка строки без блокировки строки статьи """
+    from .workers import ensure_counters_worker
+
+    ArticleCounterDelta.objects.create(article_id=article_id, **deltas)
+    ensure_counters_worker()
+
+
+def flush_counters(batch_size=FLUSH_BATCH_SIZE):
+    """
+    Применение отложенных изменений счётчиков: пакет строк ArticleCounterDelta
+    удаляется, суммируется по статьям и применяется одним UPDATE вместе с рейтингом.
+    Сводные данные категорий изменяются тем же запросом, одним UPDATE строки
+    CategoryStats на категорию: построчный триггер (миграция 0010) не добавляет
+    изменения в очередь категорий при article.category_stats_batch = 'on' (миграция 0013).
+    Параллельные вызовы берут разные строки (SKIP LOCKED). Возвращает количество
+    применённых изменений
+    """
+    deltas, articles, stats = ArticleCounterDelta._meta.db_table, Article._meta.db_table, CategoryStats._meta.db_table
+    sql = f"""
+        WITH batch AS (
+            DELETE FROM {deltas} WHERE id IN (
+                SELECT id FROM {deltas} ORDER BY id LIMIT %(batch_size)s FOR UPDATE SKIP LOCKED
+            )
+            RETURNING article_id, like_count, rating_sum, rating_count, readers_count
+        ), total AS (
+            SELECT article_id, sum(like_count) AS like_count, sum(rating_sum) AS rating_sum,
+                   sum(rating_count) AS rating_count, sum(readers_count) AS readers_count
+            FROM batch GROUP BY article_id
+        ), updated AS (
+            UPDATE {articles} AS article SET
+                like_count = article.like_count + total.like_count,
+                rating_sum = article.rating_sum + total.rating_sum,
+                rating_count = article.rating_count + total.rating_count,
+                readers_count = article.readers_count + total.readers_count,
+                rating = CASE WHEN article.rating_count + total.rating_count > 0 THEN
+                    (article.rating_sum + total.rating_sum)::numeric(12, 2) /
+                    (article.rating_count + total.rating_count)
+                END,
+                updated_at = %(now)s
+            FROM total WHERE article.id = total.article_id
+            RETURNING article.category_id, total.like_count, total.rating_sum, total.rating_count
+        ), category_total AS (
+            SELECT category_id, sum(like_count) AS like_count, sum(rating_sum) AS rating_sum,
+                   sum(rating_count) AS rating_count
+            FROM updated GROUP BY category_id
+        ), category_updated AS (
+            UPDATE {stats} AS stats SET
+                like_count = stats.like_count + category_total.like_count,
+                rating_sum = stats.rating_sum + category_total.rating_sum,
+                rating_count = stats.rating_count + category_total.rating_count,
+                updated_at = %(now)s
+            FROM category_total WHERE stats.category_id = category_total.category_id
+        )
+        SELECT count(*) FROM batch
+    """
+    flushed = 0
+    while True:
+        with transaction.atomic(), connection.cursor() as cursor:
+            """ Флаг до конца транзакции: во внешней транзакции вызывающего снимается сразу """
+            cursor.execute("SELECT set_config('article.category_stats_batch', 'on', true)")
+            cursor.execute(sql, {'batch_size': batch_size, 'now': timezone.now()})
+            consumed, = cursor.fetchone()
+            cursor.execute("SELECT set_config('article.category_stats_batch', 'off', true)")
+        flushed += consumed
+        if consumed < batch_size:
+            break
+    """ Очередь категорий от изменений статей вне голосов (rebuild_counters, UPDATE вручную) """
+    flush_category_stats(batch_size)
+    if flushed:
+        invalidate('article')
+    return flushed
+
+
+def flush_category_stats(batch_size=FLUSH_BATCH_SIZE):
+    """
+    Применение очереди CategoryStatsDelta: пакет строк удаляется, суммируется по
+    категориям и применяется одним UPDATE на категорию. Строку CategoryStats блокирует
+    только этот запрос, а не транзакции голосов. Параллельные вызовы берут разные
+    строки (SKIP LOCKED). Возвращает количество применённых изменений
+    """
+    deltas, stats = CategoryStatsDelta._meta.db_table, CategoryStats._meta.db_table
+    sql = f"""
+        WITH batch AS (
+            DELETE FROM {deltas} WHERE id IN (
+                SELECT id FROM {deltas} ORDER BY id LIMIT %(batch_size)s FOR UPDATE SKIP LOCKED
+            )
+            RETURNING category_id, like_count, rating_sum, rating_count
+        ), total AS (
+            SELECT category_id, sum(like_count) AS like_count, sum(rating_sum) AS rating_sum,
+                   sum(rating_count) AS rating_count
+            FROM batch GROUP BY category_id
+        ), updated AS (
+            UPDATE {stats} AS stats SET
+                like_count = stats.like_count + total.like_count,
+                rating_sum = stats.rating_sum + total.rating_sum,
+                rating_count = stats.rating_count + total.rating_count,
+                updated_at = %(now)s
+            FROM total WHERE stats.category_id = total.category_id
+        )
+        SELECT count(*) FROM batch
+    """
+    flushed = 0
+    while True:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(sql, {'batch_size': batch_size, 'now': timezone.now()})
+            consumed, = cursor.fetchone()
+        flushed += consumed
+        if consumed < batch_size:
+            break
+    if flushed:
+        """ Сводные данные выводятся со списком категорий (?stats=true), зависящим от 'article' """
+        invalidate('article')
+    return flushed
+
+
+def schedule_category_stats_flush():
+    """
+    Применение очереди категорий после фиксации текущей транзакции, один раз на
+    транзакцию. Изменение зафиксировано до применения: его применит этот вызов
+    или параллельный, взявший строку раньше
+    """
+    if not any(func is flush_category_stats_on_commit for _, func in connection.run_on_commit):
+        transaction.on_commit(flush_category_stats_on_commit)
+
+
+def flush_category_stats_on_commit():
+    """ Голос уже зафиксирован: при ошибке строки остаются в очереди до следующего применения """
+    try:
+        flush_category_stats()
+    except DatabaseError:
+        logger.exception('Ошибка применения очереди сводных данных категорий')
+
+
+def rebuild_counters(queryset=None):
+    """
+    Пересчёт счётчиков статей с нуля по таблице ArticleRelation,
+    отложенные изменения этих статей уже учтены и удаляются
+    """
+    if queryset is None:
+        queryset = Article.objects.all()
+    with transaction.atomic():
+        ArticleCounterDelta.objects.filter(article__in=queryset.values('pk')).delete()
+        updated = queryset.update(updated_at=timezone.now(), **get_actual_counters())
+        schedule_category_stats_flush()
+    invalidate('article')
+    return updated
+
+
+def rebuild_category_stats():
+    """
+    Пересчёт CategoryStats с нуля по счётчикам статей. Изменения статей на время
+    пересчёта блокируются (SHARE), чтобы не разойтись с триггером. Очередь
+    CategoryStatsDelta уже учтена в счётчиках статей и очищается
+    """
+    stats, articles = CategoryStats._meta.db_table, Article._meta.db_table
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'LOCK TABLE {articles} IN SHARE MODE')
+        cursor.execute(f'DELETE FROM {CategoryStatsDelta._meta.db_table}')
+        cursor.execute(f"""
+            INSERT INTO {stats} AS stats
+                (category_id, article_count, like_count, rating_sum, rating_count, updated_at)
+            SELECT category_id, count(*), sum(like_count), sum(rating_sum), sum(rating_count), %s
+            FROM {articles} GROUP BY category_id
+            ON CONFLICT (category_id) DO UPDATE SET
+                article_count = EXCLUDED.article_count,
+                like_count = EXCLUDED.like_count,
+                rating_sum = EXCLUDED.rating_sum,
+                rating_count = EXCLUDED.rating_count,
+                updated_at = EXCLUDED.updated_at
+        """, [timezone.now()])
+        updated = cursor.rowcount
+        cursor.execute(f"""
+            DELETE FROM {stats} AS stats
+            WHERE NOT EXISTS (SELECT 1 FROM {articles} AS article WHERE article.category_id = stats.category_id)
+        """)
+    invalidate('category')
+    return updated
+
+
+def get_counters_drift(queryset=None):
+    """ Статьи, у которых сохранённые счётчики расходятся с таблицей ArticleRelation """
+    if queryset is None:
+        queryset = Article.objects.all()
+    actual = {f'actual_{field}': expression for field, expression in get_actual_counters().items()
+              if field != 'rating'}
+    drift = Q()
+    for name in actual:
+        drift |= ~Q(**{name[len('actual_'):]: F(name)})
+    return queryset.annotate(**actual).filter(drift)
+
+
+def get_readers_preview(article_ids, limit=READERS_PREVIEW_LIMIT):
+    """
+    Первые limit читателей каждой статьи одним запросом: LATERAL с LIMIT
+    по индексу (article, id), независимо от количества читателей статьи
+    """
+    if not article_ids:
+        return {}
+    sql = f"""
+        SELECT articles.id, users.id, users.username
+        FROM unnest(%s::integer[]) AS articles(id)
+        CROSS JOIN LATERAL (
+            SELECT relations.id, relations.user_id
+            FROM {ArticleRelation._meta.db_table} AS relations
+            WHERE relations.article_id = articles.id
+            ORDER BY relations.id
+            LIMIT %s
+        ) AS relations
+        JOIN {User._meta.db_table} AS users ON users.id = relations.user_id
+        ORDER BY articles.id, relations.id
+    """
+    preview = {article_id: [] for article_id in article_ids}
+    with connections[router.db_for_read(ArticleRelation)].cursor() as cursor:
+        cursor.execute(sql, [list(article_ids), limit])
+        for article_id, user_id, username in cursor.fetchall():
+            preview[article_id].append({'id': user_id, 'username': username})
+    return preview
+
+
+def get_user_relations(user_id, article_ids):
+    """
+    Отметки пользователя для статей одним запросом по unique (user, article):
+    {article_id: (like, to_favorites, rating)}, None - связи нет
+    """
+    relations = {article_id: None for article_id in article_ids}
+    if article_ids:
+        rows = ArticleRelation.objects.filter(user_id=user_id, article_id__in=list(article_ids)).values_list(
+            'article_id', 'like', 'to_favorites', 'rating')
+        relations.update((article_id, tuple(marks)) for article_id, *marks in rows)
+    return relations
+
+
+def bulk_update_relations(user, items):
+    """
+    Применение пакета изменений связей пользователя со статьями одним
+    INSERT ... ON CONFLICT DO UPDATE, как upsert_relation: связь, вставленная
+    параллельно (PUT или другим пакетом), изменяется, а не даёт IntegrityError.
+    Изменяются только переданные поля элемента (флаги *_set), прежние like/rating
+    читаются и блокируются тем же запросом, в порядке статей. Счётчики каждой
+    затронутой статьи изменяются один раз.
+    items - проверенные словари {article, like, to_favorites, rating},
+    возвращает {article_id: (статус, связь)}
+    """
+    changes = {}
+    for item in items:
+        changes.setdefault(item['article'], {}).update(
+            (field, value) for field, value in item.items() if field != 'article')
+    if not changes:
+        return {}
+
+    article_ids = sorted(changes)
+    defaults = {'like': False, 'to_favorites': False, 'rating': None}
+    params = {'user_id': user.pk, 'articles': article_ids}
+    for field, default in defaults.items():
+        params[field] = [changes[article_id].get(field, default) for article_id in article_ids]
+        params[f'{field}_set'] = [field in changes[article_id] for article_id in article_ids]
+
+    table, article_table = ArticleRelation._meta.db_table, Article._meta.db_table
+    assignments = ', '.join(
+        f'"{field}" = CASE WHEN (SELECT {field}_set FROM input WHERE input.article_id = EXCLUDED.article_id) '
+        f'THEN EXCLUDED."{field}" ELSE relation."{field}" END'
+        for field in defaults
+    )
+    sql = f"""
+        WITH input AS (
+            SELECT * FROM unnest(
+                %(articles)s::integer[], %(like)s::boolean[], %(like_set)s::boolean[],
+                %(to_favorites)s::boolean[], %(to_favorites_set)s::boolean[],
+                %(rating)s::integer[], %(rating_set)s::boolean[]
+            ) AS input(article_id, "like", like_set, to_favorites, to_favorites_set, rating, rating_set)
+        ), old AS (
+            SELECT id, article_id, "like", to_favorites, rating FROM {table}
+            WHERE user_id = %(user_id)s AND article_id = ANY(%(articles)s)
+            ORDER BY article_id
+            FOR UPDATE
+        ), upsert AS (
+            INSERT INTO {table} AS relation (user_id, article_id, "like", to_favorites, rating)
+            SELECT %(user_id)s, input.article_id, input."like", input.to_favorites, input.rating
+            FROM input JOIN {article_table} AS article ON article.id = input.article_id
+            WHERE (SELECT count(*) FROM old) >= 0
+            ORDER BY input.article_id
+            ON CONFLICT (user_id, article_id) DO UPDATE SET {assignments}
+            RETURNING relation.id, relation.article_id, relation."like", relation.to_favorites, relation.rating,
+                      relation.xmax = 0 AS inserted
+        )
+        SELECT input.article_id, upsert.id, upsert."like", upsert.to_favorites, upsert.rating, upsert.inserted,
+               old.id IS NOT NULL, old."like", old.to_favorites, old.rating
+        FROM input LEFT JOIN upsert USING (article_id) LEFT JOIN old USING (article_id)
+    """
+    results, rebuild = {}, []
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+        for article_id, pk, like, to_favorites, rating, inserted, found, *old in rows:
+            if pk is None:
+                results[article_id] = ('not_found', None)
+                continue
+            relation = ArticleRelation(
+                id=pk, user=user, article_id=article_id, like=like, to_favorites=to_favorites, rating=rating)
+            if inserted:
+                change_counters(article_id, readers_count=1, **get_relation_delta(like=like, rating=rating))
+                results[article_id] = ('created', relation)
+            elif found:
+                old_like, _, old_rating = old
+                change_counters(article_id, **get_relation_delta(old_like, old_rating, like, rating))
+                changed = (like, to_favorites, rating) != tuple(old)
+                results[article_id] = ('updated' if changed else 'unchanged', relation)
+            else:
+                """ Строку вставила параллельная транзакция, прежние значения неизвестны """
+                rebuild.append(article_id)
+                results[article_id] = ('updated', relation)
+        if rebuild:
+            rebuild_counters(Article.objects.filter(pk__in=rebuild))
+        if any(status in ('created', 'updated') for status, _ in results.values()):
+            invalidate(get_user_resource('relation', user.pk))
+    return results
+
+
+def upsert_relation(user_id, article_id, values):
+    """
+    Изменение связи пользователя со статьёй одним INSERT ... ON CONFLICT DO UPDATE
+    по уникальному (user, article). Прежние like/rating возвращаются тем же запросом
+    и дают изменение счётчиков для одного UPDATE статьи. Article.DoesNotExist, если статьи нет.
+    old читается (и блокируется) до вставки: иначе FOR UPDATE пропускает строку,
+    уже изменённую этим же запросом
+    """
+    fields = [field for field in ('like', 'to_favorites', 'rating') if field in values]
+    defaults = {'like': False, 'to_favorites': False, 'rating': None, **values}
+    table, article_table = ArticleRelation._meta.db_table, Article._meta.db_table
+    assignments = ', '.join(f'"{field}" = EXCLUDED."{field}"' for field in fields) or 'user_id = EXCLUDED.user_id'
+    sql = f"""
+        WITH old AS (
+            SELECT id, "like", rating FROM {table}
+            WHERE user_id = %(user_id)s AND article_id = %(article_id)s
+            FOR UPDATE
+        ), upsert AS (
+            INSERT INTO {table} (user_id, article_id, "like", to_favorites, rating)
+            SELECT %(user_id)s, id, %(like)s, %(to_favorites)s, %(rating)s
+            FROM {article_table} WHERE id = %(article_id)s AND (SELECT count(*) FROM old) >= 0
+            ON CONFLICT (user_id, article_id) DO UPDATE SET {assignments}
+            RETURNING id, "like", to_favorites, rating, xmax = 0 AS inserted
+        )
+        SELECT upsert.id, upsert."like", upsert.to_favorites, upsert.rating, upsert.inserted,
+               old.id IS NOT NULL, old."like", old.rating
+        FROM upsert LEFT JOIN old ON TRUE
+    """
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(sql, {'user_id': user_id, 'article_id': article_id, **defaults})
+            row = cursor.fetchone()
+        if row is None:
+            raise Article.DoesNotExist()
+        pk, like, to_favorites, rating, inserted, found, old_like, old_rating = row
+
+        if inserted:
+            change_counters(article_id, readers_count=1, **get_relation_delta(like=like, rating=rating))
+        elif found:
+            change_counters(article_id, **get_relation_delta(old_like, old_rating, like, rating))
+        else:
+            """ Строку вставила параллельная транзакция, прежние значения неизвестны """
+            rebuild_counters(Article.objects.filter(pk=article_id))
+        invalidate(get_user_resource('relation', user_id))
+
+    return ArticleRelation(
+        id=pk, user_id=user_id, article_id=article_id, like=like, to_favorites=to_favorites, rating=rating)
 
 
+def delete_article(article):
+    """
+    Удаление статьи: её связи удаляются одним DELETE, без post_delete ArticleRelation,
+    который пересчитывал бы счётчики удаляемой статьи по каждому читателю
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {ArticleRelation._meta.db_table} WHERE article_id = %s', [article.pk])
+        article.delete()
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+import article.views  # noqa: регистрация эндпоинтов с кэшированием
+from article.cache import get_stats, reset_stats
+
+
+class Command(BaseCommand):
+    help = 'Статистика попаданий в кэш ответов API по эндпоинтам'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Обнулить счётчики после вывода')
+
+    def handle(self, *args, **options):
+        for endpoint, (hits, misses) in get_stats().items():
+            total = hits + misses
+            ratio = hits / total * 100 if total else 0
+            self.stdout.write(f'{endpoint:<20} hit {hits:>10} miss {misses:>10} hit ratio {ratio:6.2f}%')
+        if options['reset']:
+            reset_stats()
+            self.stdout.write(self.style.SUCCESS('Счётчики обнулены'))
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from article.logic import FLUSH_BATCH_SIZE, flush_counters
+
+
+class Command(BaseCommand):
+    help = 'Применение отложенных изменений счётчиков статей (ARTICLE_COUNTERS_MODE = "queue")'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, help='Применять непрерывно раз в interval секунд')
+        parser.add_argument('--batch-size', type=int, default=FLUSH_BATCH_SIZE,
+                            help='Количество изменений в одном UPDATE')
+
+    def handle(self, *args, **options):
+        if options['interval'] is None:
+            flushed = flush_counters(options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'Применено изменений: {flushed}'))
+            return
+
+        while True:
+            started = time.monotonic()
+            try:
+                flush_counters(options['batch_size'])
+            finally:
+                close_old_connections()
+            time.sleep(max(0.0, options['interval'] - (time.monotonic() - started)))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from article.logic import rebuild_category_stats
+
+
+class Command(BaseCommand):
+    help = 'Пересчёт сводных данных категорий (CategoryStats) с нуля по счётчикам статей'
+
+    def handle(self, *args, **options):
+        updated = rebuild_category_stats()
+        self.stdout.write(self.style.SUCCESS(f'Пересчитано категорий: {updated}'))
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from article.logic import flush_counters, get_counters_drift, rebuild_counters
+from article.models import Article
+
+
+class Command(BaseCommand):
+    help = 'Проверка и пересчёт денормализованных счётчиков статей с нуля (исправление расхождений)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('articles', nargs='*', type=int, help='id статей, по умолчанию все статьи')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Количество статей в одном UPDATE')
+        parser.add_argument('--check', action='store_true', help='Только найти расхождения, без исправления')
+
+    def handle(self, *args, **options):
+        queryset = Article.objects.order_by('pk')
+        if options['articles']:
+            queryset = queryset.filter(pk__in=options['articles'])
+
+        if options['check']:
+            self.check_drift(queryset)
+            return
+
+        updated, last_pk = 0, 0
+        while True:
+            batch = list(queryset.filter(pk__gt=last_pk).values_list('pk', flat=True)[:options['batch_size']])
+            if not batch:
+                break
+            updated += rebuild_counters(Article.objects.filter(pk__in=batch))
+            last_pk = batch[-1]
+
+        self.stdout.write(self.style.SUCCESS(f'Пересчитано статей: {updated}'))
+
+    def check_drift(self, queryset):
+        """ Отложенные изменения (ARTICLE_COUNTERS_MODE = 'queue') применяются до сравнения """
+        flush_counters()
+        fields = ('like_count', 'readers_count', 'rating_sum', 'rating_count')
+        drift = get_counters_drift(queryset).values(
+            'pk', *fields, *(f'actual_{field}' for field in fields))
+        found = 0
+        for row in drift.iterator():
+            found += 1
+            self.stdout.write(f'Статья {row["pk"]}: ' + ', '.join(
+                f'{field} {row[field]} != {row[f"actual_{field}"]}' for field in fields
+                if row[field] != row[f'actual_{field}']))
+        if found:
+            raise CommandError(f'Расхождение счётчиков у статей: {found}')
+        self.stdout.write(self.style.SUCCESS('Расхождений нет'))
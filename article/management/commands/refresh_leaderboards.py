@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from article.leaderboards import refresh_leaderboards
+
+
+class Command(BaseCommand):
+    help = 'Обновление рейтингов статей top и trending по изменённым статьям (--full - по всем)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Пересчитать рейтинги по всем статьям')
+        parser.add_argument('--interval', type=float, help='Обновлять непрерывно раз в interval секунд')
+        parser.add_argument('--full-interval', type=float, default=3600,
+                            help='При --interval: полное обновление раз в full-interval секунд')
+
+    def handle(self, *args, **options):
+        if options['interval'] is None:
+            changed = refresh_leaderboards(options['full'])
+            self.stdout.write(self.style.SUCCESS(f'Обновлено рейтингов, изменённых статей: {changed}'))
+            return
+
+        full_at = time.monotonic() if options['full'] else time.monotonic() + options['full_interval']
+        while True:
+            started = time.monotonic()
+            full = started >= full_at
+            try:
+                refresh_leaderboards(full)
+            finally:
+                close_old_connections()
+            if full:
+                full_at = started + options['full_interval']
+            time.sleep(max(0.0, options['interval'] - (time.monotonic() - started)))
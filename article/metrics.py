@@ -0,0 +1,94 @@
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+""" Показатели текущего запроса, создаются article.middleware.MetricsMiddleware """
+current = ContextVar('article_metrics', default=None)
+
+
+class RequestMetrics:
+    """ SQL-запросы одного HTTP-запроса и время этапов его обработки """
+
+    def __init__(self):
+        self.view = None
+        self.queries = 0
+        self.sql_time = 0.0
+        self.statements = Counter()
+        """ {этап: (время, время SQL-запросов этапа)} """
+        self.timings = {}
+        self._started = {}
+
+    def start(self, name):
+        self._started[name] = (time.perf_counter(), self.sql_time)
+
+    def is_started(self, name):
+        return name in self._started
+
+    def stop(self, name):
+        """ Повторные этапы с тем же name (несколько сериализаций за запрос) суммируются """
+        if name not in self._started:
+            return
+        start, sql_time = self._started.pop(name)
+        elapsed, sql_elapsed = self.timings.get(name, (0.0, 0.0))
+        self.timings[name] = (elapsed + time.perf_counter() - start, sql_elapsed + self.sql_time - sql_time)
+
+    def get_time(self, name, sql=True):
+        """ Время этапа (секунды), sql=False - без SQL-запросов """
+        elapsed, sql_time = self.timings.get(name, (0.0, 0.0))
+        return elapsed if sql else max(elapsed - sql_time, 0.0)
+
+    def get_repeated(self):
+        """ Самый частый SQL-запрос (текст с параметрами %s) и количество его выполнений """
+        return self.statements.most_common(1)[0] if self.statements else (None, 0)
+
+    def execute(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.sql_time += time.perf_counter() - start
+            self.statements[sql] += 1
+
+
+def execute_wrapper(execute, sql, params, many, context):
+    """ Учёт SQL-запроса в показателях текущего запроса, вне запроса - без изменений """
+    metrics = current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    return metrics.execute(execute, sql, params, many, context)
+
+
+def install(connection, **kwargs):
+    """
+    Подключение execute_wrapper к соединению с базой данных (и по сигналу connection_created).
+    Обёртка ставится первой: connection.execute_wrapper() снимает последнюю в списке
+    """
+    if execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, execute_wrapper)
+
+
+@contextmanager
+def measure(name):
+    """ Время этапа name текущего запроса """
+    metrics = current.get()
+    if metrics is None:
+        yield
+        return
+    metrics.start(name)
+    try:
+        yield
+    finally:
+        metrics.stop(name)
+
+
+@contextmanager
+def measure_outermost(name):
+    """ Как measure, вложенный этап с тем же name (сериализатор внутри сериализатора) входит во внешний """
+    metrics = current.get()
+    if metrics is not None and metrics.is_started(name):
+        yield
+        return
+    with measure(name):
+        yield
@@ -0,0 +1,95 @@
+import json
+import logging
+import random
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from rest_framework.views import APIView
+
+from .metrics import RequestMetrics, current, install
+
+logger = logging.getLogger('article.metrics')
+
+
+class MetricsMiddleware:
+    """
+    Показатели запросов к представлениям DRF (маршруты SimpleRouter): количество
+    и время SQL-запросов, время кода представления без SQL-запросов (фильтры,
+    постраничный вывод, права доступа и сериализация вместе), отдельно - время
+    сериализации (data сериализаторов, вместе с её SQL-запросами), рендеринга
+    и всего запроса, размер ответа. Время - в заголовке Server-Timing
+    (API_METRICS_SERVER_TIMING), строка лога article.metrics в формате JSON -
+    для доли API_METRICS_SAMPLE_RATE запросов и для всех запросов, в которых один
+    и тот же SQL-запрос выполнен больше API_METRICS_N_PLUS_ONE раз (N+1).
+    Размер потокового ответа заранее неизвестен и не записывается
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        connection_created.connect(install, dispatch_uid='article.metrics')
+
+    def __call__(self, request):
+        for connection in connections.all():
+            install(connection)
+        metrics = RequestMetrics()
+        token = current.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current.reset(token)
+        if metrics.view is None:
+            return response
+
+        metrics.stop('view')
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'view': metrics.view,
+            'status': response.status_code,
+            'queries': metrics.queries,
+            'db_ms': round(metrics.sql_time * 1000, 2),
+            'view_python_ms': round(metrics.get_time('view', sql=False) * 1000, 2),
+            'serialize_ms': round(metrics.get_time('serialize') * 1000, 2),
+            'render_ms': round(metrics.get_time('render') * 1000, 2),
+            'total_ms': round((time.perf_counter() - start) * 1000, 2),
+            'size': None if response.streaming else len(response.content),
+        }
+        sql, repeats = metrics.get_repeated()
+        if repeats > getattr(settings, 'API_METRICS_N_PLUS_ONE', 10):
+            record['n_plus_one'] = {'sql': sql, 'count': repeats}
+
+        if getattr(settings, 'API_METRICS_SERVER_TIMING', True):
+            response['Server-Timing'] = ', '.join([
+                f'db;desc="{record["queries"]} queries";dur={record["db_ms"]}',
+                f'view;desc="python";dur={record["view_python_ms"]}',
+                f'serialize;dur={record["serialize_ms"]}',
+                f'render;dur={record["render_ms"]}',
+                f'total;dur={record["total_ms"]}',
+            ])
+        if 'n_plus_one' in record:
+            logger.warning(json.dumps(record, ensure_ascii=False))
+        elif random.random() < getattr(settings, 'API_METRICS_SAMPLE_RATE', 0.0):
+            logger.info(json.dumps(record, ensure_ascii=False))
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics = current.get()
+        view = getattr(view_func, 'cls', None)
+        if metrics is None or not (isinstance(view, type) and issubclass(view, APIView)):
+            return None
+        action = (getattr(view_func, 'actions', None) or {}).get(request.method.lower())
+        metrics.view = f'{view.__name__}.{action}' if action else view.__name__
+        metrics.start('view')
+        return None
+
+    def process_template_response(self, request, response):
+        """ Представление DRF завершено, ответ рендерится после этого метода """
+        metrics = current.get()
+        if metrics is not None and metrics.view is not None:
+            metrics.stop('view')
+            metrics.start('render')
+            response.add_post_render_callback(lambda response: metrics.stop('render'))
+        return response
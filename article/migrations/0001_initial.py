@@ -0,0 +1,60 @@
+# Generated by Django 3.1.14 on 2026-10-18 17:14
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Article',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=154)),
+                ('description', models.CharField(blank=True, max_length=255, null=True)),
+                ('date_of_publication', models.DateTimeField(auto_now_add=True)),
+                ('rating', models.DecimalField(decimal_places=2, max_digits=3, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Category',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=154, unique=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArticleRelation',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('like', models.BooleanField(default=False)),
+                ('to_favorites', models.BooleanField(default=False)),
+                ('rating', models.SmallIntegerField(blank=True, choices=[(1, 'badly'), (2, 'come down'), (3, 'fine'), (4, 'good'), (5, 'excellent')], null=True)),
+                ('article', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='article.article')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='article',
+            name='category',
+            field=models.ForeignKey(blank=True, on_delete=django.db.models.deletion.PROTECT, to='article.category'),
+        ),
+        migrations.AddField(
+            model_name='article',
+            name='owner',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='article_owner', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='article',
+            name='readers',
+            field=models.ManyToManyField(null=True, related_name='article_readers', through='article.ArticleRelation', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 3.1.14 on 2026-10-18 17:19
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def fill_rating_counters(apps, schema_editor):
+    Article = apps.get_model('article', 'Article')
+    ArticleRelation = apps.get_model('article', 'ArticleRelation')
+    relations = ArticleRelation.objects.filter(article=OuterRef('pk')).order_by().values('article')
+    Article.objects.update(
+        rating_sum=Coalesce(Subquery(relations.annotate(value=Sum('rating')).values('value')), 0),
+        rating_count=Coalesce(Subquery(relations.annotate(value=Count('rating')).values('value')), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('article', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='article',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='article',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_rating_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 3.1.14 on 2026-10-18 17:21
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_like_count(apps, schema_editor):
+    Article = apps.get_model('article', 'Article')
+    ArticleRelation = apps.get_model('article', 'ArticleRelation')
+    relations = ArticleRelation.objects.filter(article=OuterRef('pk')).order_by().values('article')
+    Article.objects.update(like_count=Coalesce(
+        Subquery(relations.annotate(value=Count('pk', filter=Q(like=True))).values('value')), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('article', '0002_article_rating_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='article',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_like_count, migrations.RunPython.noop),
+    ]
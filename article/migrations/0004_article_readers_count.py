@@ -0,0 +1,33 @@
+# Generated by Django 3.1.14 on 2026-10-18 17:22
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_readers_count(apps, schema_editor):
+    Article = apps.get_model('article', 'Article')
+    ArticleRelation = apps.get_model('article', 'ArticleRelation')
+    relations = ArticleRelation.objects.filter(article=OuterRef('pk')).order_by().values('article')
+    Article.objects.update(readers_count=Coalesce(
+        Subquery(relations.annotate(value=Count('pk')).values('value')), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('article', '0003_article_like_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='article',
+            name='readers_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_readers_count, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='articlerelation',
+            index=models.Index(fields=['article', 'id'], name='relation_article_id_idx'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 3.1.14 on 2026-10-18 17:28
+
+from django.db import migrations, models
+from django.db.models import Avg, Count, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def remove_duplicates(apps, schema_editor):
+    """ Из повторяющихся связей (user, article) остаётся последняя, счётчики статей пересчитываются """
+    Article = apps.get_model('article', 'Article')
+    ArticleRelation = apps.get_model('article', 'ArticleRelation')
+    table = ArticleRelation._meta.db_table
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f"""
+            DELETE FROM {table} AS old USING {table} AS new
+            WHERE old.user_id = new.user_id AND old.article_id = new.article_id AND old.id < new.id
+            RETURNING old.article_id
+        """)
+        articles = {row[0] for row in cursor.fetchall()}
+    if not articles:
+        return
+
+    relations = ArticleRelation.objects.filter(article=OuterRef('pk')).order_by().values('article')
+
+    def aggregate(expression):
+        return Subquery(relations.annotate(value=expression).values('value'))
+
+    Article.objects.filter(pk__in=articles).update(
+        rating_sum=Coalesce(aggregate(Sum('rating')), 0),
+        rating_count=Coalesce(aggregate(Count('rating')), 0),
+        like_count=Coalesce(aggregate(Count('pk', filter=Q(like=True))), 0),
+        readers_count=Coalesce(aggregate(Count('pk')), 0),
+        rating=aggregate(Avg('rating')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('article', '0005_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='articlerelation',
+            constraint=models.UniqueConstraint(fields=('user', 'article'), name='unique_user_article'),
+        ),
+    ]
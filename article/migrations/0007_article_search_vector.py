@@ -0,0 +1,62 @@
+# Generated by Django 3.1.14 on 2026-10-18 17:32
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+SEARCH_TRIGGER = """
+    CREATE FUNCTION article_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('russian', coalesce(NEW.title, '')), 'A') ||
+            setweight(to_tsvector('russian', coalesce(NEW.description, '')), 'B');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql;
+
+    CREATE TRIGGER article_search_vector_trigger
+        BEFORE INSERT OR UPDATE OF title, description ON article_article
+        FOR EACH ROW EXECUTE FUNCTION article_search_vector_update();
+
+    UPDATE article_article SET title = title;
+"""
+
+DROP_SEARCH_TRIGGER = """
+    DROP TRIGGER article_search_vector_trigger ON article_article;
+    DROP FUNCTION article_search_vector_update();
+"""
+
+
+def create_trigram_index(apps, schema_editor):
+    """ Индекс для поиска с опечатками, если в PostgreSQL доступно расширение pg_trgm """
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        if cursor.fetchone() is None:
+            return
+        cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        cursor.execute('CREATE INDEX article_title_trgm_idx ON article_article USING gin (title gin_trgm_ops)')
+
+
+def drop_trigram_index(apps, schema_editor):
+    schema_editor.execute('DROP INDEX IF EXISTS article_title_trgm_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('article', '0006_unique_user_article'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='article',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunSQL(SEARCH_TRIGGER, DROP_SEARCH_TRIGGER),
+        migrations.AddIndex(
+            model_name='article',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='article_search_vector_idx'),
+        ),
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 3.1.14 on 2026-10-18 17:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('article', '0007_article_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='article',
+            index=models.Index(fields=['title', 'id'], name='article_title_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='article',
+            index=models.Index(fields=['date_of_publication', 'id'], name='article_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='article',
+            index=models.Index(fields=['category', 'date_of_publication', 'id'], name='article_category_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='article',
+            index=models.Index(fields=['owner', 'id'], name='article_owner_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='articlerelation',
+            index=models.Index(condition=models.Q(like=True), fields=['article'], name='relation_article_like_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='articlerelation',
+            index=models.Index(condition=models.Q(rating__isnull=False), fields=['article', 'rating'], name='relation_article_rating_idx'),
+        ),
+    ]
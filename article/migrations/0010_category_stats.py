@@ -0,0 +1,81 @@
+# Generated by Django 3.1.14 on 2026-10-18 17:43
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+STATS_TRIGGER = """
+    CREATE FUNCTION category_stats_update() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'UPDATE' AND OLD.category_id = NEW.category_id THEN
+            IF OLD.like_count = NEW.like_count AND OLD.rating_sum = NEW.rating_sum
+                    AND OLD.rating_count = NEW.rating_count THEN
+                RETURN NULL;
+            END IF;
+            UPDATE article_categorystats SET
+                like_count = like_count + NEW.like_count - OLD.like_count,
+                rating_sum = rating_sum + NEW.rating_sum - OLD.rating_sum,
+                rating_count = rating_count + NEW.rating_count - OLD.rating_count,
+                updated_at = now()
+            WHERE category_id = NEW.category_id;
+            RETURN NULL;
+        END IF;
+
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            UPDATE article_categorystats SET
+                article_count = article_count - 1,
+                like_count = like_count - OLD.like_count,
+                rating_sum = rating_sum - OLD.rating_sum,
+                rating_count = rating_count - OLD.rating_count,
+                updated_at = now()
+            WHERE category_id = OLD.category_id;
+        END IF;
+        IF TG_OP IN ('UPDATE', 'INSERT') THEN
+            INSERT INTO article_categorystats AS stats
+                (category_id, article_count, like_count, rating_sum, rating_count, updated_at)
+            VALUES (NEW.category_id, 1, NEW.like_count, NEW.rating_sum, NEW.rating_count, now())
+            ON CONFLICT (category_id) DO UPDATE SET
+                article_count = stats.article_count + 1,
+                like_count = stats.like_count + EXCLUDED.like_count,
+                rating_sum = stats.rating_sum + EXCLUDED.rating_sum,
+                rating_count = stats.rating_count + EXCLUDED.rating_count,
+                updated_at = EXCLUDED.updated_at;
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql;
+
+    CREATE TRIGGER category_stats_trigger
+        AFTER INSERT OR DELETE OR UPDATE OF category_id, like_count, rating_sum, rating_count ON article_article
+        FOR EACH ROW EXECUTE FUNCTION category_stats_update();
+
+    INSERT INTO article_categorystats (category_id, article_count, like_count, rating_sum, rating_count, updated_at)
+    SELECT category_id, count(*), sum(like_count), sum(rating_sum), sum(rating_count), now()
+    FROM article_article GROUP BY category_id;
+"""
+
+DROP_STATS_TRIGGER = """
+    DROP TRIGGER category_stats_trigger ON article_article;
+    DROP FUNCTION category_stats_update();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('article', '0009_article_counter_delta'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryStats',
+            fields=[
+                ('category', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='article.category')),
+                ('article_count', models.IntegerField(default=0)),
+                ('like_count', models.IntegerField(default=0)),
+                ('rating_sum', models.IntegerField(default=0)),
+                ('rating_count', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunSQL(STATS_TRIGGER, DROP_STATS_TRIGGER),
+    ]
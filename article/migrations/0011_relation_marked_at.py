@@ -0,0 +1,62 @@
+# Generated by Django 3.1.14 on 2026-10-18 18:11
+
+from django.db import migrations, models
+
+MARKED_AT_TRIGGER = """
+    CREATE FUNCTION relation_marked_at_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.favorited_at := CASE
+            WHEN NOT NEW.to_favorites THEN NULL
+            WHEN TG_OP = 'UPDATE' AND OLD.to_favorites THEN COALESCE(OLD.favorited_at, clock_timestamp())
+            ELSE clock_timestamp()
+        END;
+        NEW.liked_at := CASE
+            WHEN NOT NEW."like" THEN NULL
+            WHEN TG_OP = 'UPDATE' AND OLD."like" THEN COALESCE(OLD.liked_at, clock_timestamp())
+            ELSE clock_timestamp()
+        END;
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql;
+
+    CREATE TRIGGER relation_marked_at_trigger
+        BEFORE INSERT OR UPDATE ON article_articlerelation
+        FOR EACH ROW EXECUTE FUNCTION relation_marked_at_update();
+
+    UPDATE article_articlerelation SET favorited_at = now() WHERE to_favorites;
+    UPDATE article_articlerelation SET liked_at = now() WHERE "like";
+"""
+
+DROP_MARKED_AT_TRIGGER = """
+    DROP TRIGGER relation_marked_at_trigger ON article_articlerelation;
+    DROP FUNCTION relation_marked_at_update();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('article', '0010_category_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='articlerelation',
+            name='favorited_at',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='articlerelation',
+            name='liked_at',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='articlerelation',
+            index=models.Index(condition=models.Q(to_favorites=True), fields=['user', '-favorited_at', '-id'], name='relation_user_favorites_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='articlerelation',
+            index=models.Index(condition=models.Q(like=True), fields=['user', '-liked_at', '-id'], name='relation_user_liked_idx'),
+        ),
+        migrations.RunSQL(MARKED_AT_TRIGGER, DROP_MARKED_AT_TRIGGER),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 3.1.14 on 2026-10-18 18:18
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+DIRTY_TRIGGER = """
+    CREATE FUNCTION leaderboard_dirty_update() RETURNS trigger AS $$
+    BEGIN
+        INSERT INTO article_leaderboarddirty (article_id) VALUES (NEW.id) ON CONFLICT DO NOTHING;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql;
+
+    CREATE TRIGGER leaderboard_dirty_trigger
+        AFTER UPDATE OF category_id, like_count, rating_sum, rating_count ON article_article
+        FOR EACH ROW WHEN (
+            OLD.category_id IS DISTINCT FROM NEW.category_id OR OLD.like_count IS DISTINCT FROM NEW.like_count
+            OR OLD.rating_sum IS DISTINCT FROM NEW.rating_sum OR OLD.rating_count IS DISTINCT FROM NEW.rating_count
+        )
+        EXECUTE FUNCTION leaderboard_dirty_update();
+"""
+
+DROP_DIRTY_TRIGGER = """
+    DROP TRIGGER leaderboard_dirty_trigger ON article_article;
+    DROP FUNCTION leaderboard_dirty_update();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('article', '0011_relation_marked_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardDirty',
+            fields=[
+                ('article', models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='+', serialize=False, to='article.article')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('board', models.CharField(choices=[('top', 'top rated'), ('trending', 'trending')], max_length=16)),
+                ('position', models.PositiveSmallIntegerField()),
+                ('score', models.FloatField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='articlerelation',
+            index=models.Index(condition=models.Q(like=True), fields=['liked_at'], name='relation_liked_at_idx'),
+        ),
+        migrations.AddField(
+            model_name='leaderboardentry',
+            name='article',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='article.article'),
+        ),
+        migrations.AddField(
+            model_name='leaderboardentry',
+            name='category',
+            field=models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='article.category'),
+        ),
+        migrations.AddIndex(
+            model_name='leaderboardentry',
+            index=models.Index(fields=['board', 'category', 'position'], name='leaderboard_position_idx'),
+        ),
+        migrations.RunSQL(DIRTY_TRIGGER, DROP_DIRTY_TRIGGER),
+    ]
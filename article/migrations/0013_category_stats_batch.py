@@ -0,0 +1,63 @@
+from django.db import migrations
+
+STATS_FUNCTION = """
+    CREATE OR REPLACE FUNCTION category_stats_update() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'UPDATE' AND OLD.category_id = NEW.category_id THEN
+            IF OLD.like_count = NEW.like_count AND OLD.rating_sum = NEW.rating_sum
+                    AND OLD.rating_count = NEW.rating_count THEN
+                RETURN NULL;
+            END IF;
+            IF current_setting('article.category_stats_batch', true) = 'on' THEN
+                RETURN NULL;
+            END IF;
+            UPDATE article_categorystats SET
+                like_count = like_count + NEW.like_count - OLD.like_count,
+                rating_sum = rating_sum + NEW.rating_sum - OLD.rating_sum,
+                rating_count = rating_count + NEW.rating_count - OLD.rating_count,
+                updated_at = now()
+            WHERE category_id = NEW.category_id;
+            RETURN NULL;
+        END IF;
+
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            UPDATE article_categorystats SET
+                article_count = article_count - 1,
+                like_count = like_count - OLD.like_count,
+                rating_sum = rating_sum - OLD.rating_sum,
+                rating_count = rating_count - OLD.rating_count,
+                updated_at = now()
+            WHERE category_id = OLD.category_id;
+        END IF;
+        IF TG_OP IN ('UPDATE', 'INSERT') THEN
+            INSERT INTO article_categorystats AS stats
+                (category_id, article_count, like_count, rating_sum, rating_count, updated_at)
+            VALUES (NEW.category_id, 1, NEW.like_count, NEW.rating_sum, NEW.rating_count, now())
+            ON CONFLICT (category_id) DO UPDATE SET
+                article_count = stats.article_count + 1,
+                like_count = stats.like_count + EXCLUDED.like_count,
+                rating_sum = stats.rating_sum + EXCLUDED.rating_sum,
+                rating_count = stats.rating_count + EXCLUDED.rating_count,
+                updated_at = EXCLUDED.updated_at;
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql;
+"""
+
+""" Функция миграции 0010: изменения счётчиков всегда применяются построчно """
+PREVIOUS_STATS_FUNCTION = STATS_FUNCTION.replace("""
+            IF current_setting('article.category_stats_batch', true) = 'on' THEN
+                RETURN NULL;
+            END IF;""", '')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('article', '0012_leaderboards'),
+    ]
+
+    operations = [
+        migrations.RunSQL(STATS_FUNCTION, PREVIOUS_STATS_FUNCTION),
+    ]
@@ -0,0 +1,86 @@
+# Generated by Django 3.1.14 on 2026-10-18 19:03
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+"""
+Изменение счётчиков статьи без смены категории (голос) не изменяет общую строку
+CategoryStats, а добавляет строку в очередь CategoryStatsDelta: голоса статей одной
+категории не ждут друг друга. Очередь применяет logic.flush_category_stats
+"""
+STATS_FUNCTION = """
+    CREATE OR REPLACE FUNCTION category_stats_update() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'UPDATE' AND OLD.category_id = NEW.category_id THEN
+            IF OLD.like_count = NEW.like_count AND OLD.rating_sum = NEW.rating_sum
+                    AND OLD.rating_count = NEW.rating_count THEN
+                RETURN NULL;
+            END IF;
+            IF current_setting('article.category_stats_batch', true) = 'on' THEN
+                RETURN NULL;
+            END IF;
+            INSERT INTO article_categorystatsdelta (category_id, like_count, rating_sum, rating_count)
+            VALUES (NEW.category_id, NEW.like_count - OLD.like_count, NEW.rating_sum - OLD.rating_sum,
+                    NEW.rating_count - OLD.rating_count);
+            RETURN NULL;
+        END IF;
+
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            UPDATE article_categorystats SET
+                article_count = article_count - 1,
+                like_count = like_count - OLD.like_count,
+                rating_sum = rating_sum - OLD.rating_sum,
+                rating_count = rating_count - OLD.rating_count,
+                updated_at = now()
+            WHERE category_id = OLD.category_id;
+        END IF;
+        IF TG_OP IN ('UPDATE', 'INSERT') THEN
+            INSERT INTO article_categorystats AS stats
+                (category_id, article_count, like_count, rating_sum, rating_count, updated_at)
+            VALUES (NEW.category_id, 1, NEW.like_count, NEW.rating_sum, NEW.rating_count, now())
+            ON CONFLICT (category_id) DO UPDATE SET
+                article_count = stats.article_count + 1,
+                like_count = stats.like_count + EXCLUDED.like_count,
+                rating_sum = stats.rating_sum + EXCLUDED.rating_sum,
+                rating_count = stats.rating_count + EXCLUDED.rating_count,
+                updated_at = EXCLUDED.updated_at;
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql;
+"""
+
+""" Функция миграции 0013: изменения счётчиков применяются к CategoryStats построчно """
+PREVIOUS_STATS_FUNCTION = STATS_FUNCTION.replace("""
+            INSERT INTO article_categorystatsdelta (category_id, like_count, rating_sum, rating_count)
+            VALUES (NEW.category_id, NEW.like_count - OLD.like_count, NEW.rating_sum - OLD.rating_sum,
+                    NEW.rating_count - OLD.rating_count);
+            RETURN NULL;""", """
+            UPDATE article_categorystats SET
+                like_count = like_count + NEW.like_count - OLD.like_count,
+                rating_sum = rating_sum + NEW.rating_sum - OLD.rating_sum,
+                rating_count = rating_count + NEW.rating_count - OLD.rating_count,
+                updated_at = now()
+            WHERE category_id = NEW.category_id;
+            RETURN NULL;""")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('article', '0013_category_stats_batch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryStatsDelta',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('like_count', models.IntegerField(default=0)),
+                ('rating_sum', models.IntegerField(default=0)),
+                ('rating_count', models.IntegerField(default=0)),
+                ('category', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='article.category')),
+            ],
+        ),
+        migrations.RunSQL(STATS_FUNCTION, PREVIOUS_STATS_FUNCTION),
+    ]
@@ -1,10 +1,17 @@
-from django.db import models
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.db import models, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.contrib.auth.models import User
 
 
 class Category(models.Model):
     """ Модель категорий """
     title = models.CharField(max_length=154, unique=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f'Категория: {self.title}'
@@ -19,10 +26,171 @@ class Article(models.Model):
     owner = models.ForeignKey(User, models.SET_NULL, related_name='article_owner', null=True)
     readers = models.ManyToManyField(User, through='ArticleRelation', related_name='article_readers', null=True)
     rating = models.DecimalField(max_digits=3, decimal_places=2, null=True)
+    """ Время последнего изменения, в т.ч. счётчиков, для ETag и Last-Modified """
+    updated_at = models.DateTimeField(auto_now=True)
+    """ Денормализованные счётчики, изменяются атомарно через F() """
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+    like_count = models.PositiveIntegerField(default=0)
+    readers_count = models.PositiveIntegerField(default=0)
+    """ tsvector по title (вес A) и description (вес B), заполняется триггером базы данных """
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    COUNTER_FIELDS = ('rating', 'rating_sum', 'rating_count', 'like_count', 'readers_count', 'updated_at')
+    """ Конфигурация полнотекстового поиска, та же, что в триггере (миграция 0007) """
+    SEARCH_CONFIG = 'russian'
+
+    class Meta:
+        """ Индексы под фильтры и сортировки ArticleViewSet, id - ключ курсора постраничного вывода """
+        indexes = [
+            GinIndex(fields=['search_vector'], name='article_search_vector_idx'),
+            models.Index(fields=['title', 'id'], name='article_title_id_idx'),
+            models.Index(fields=['date_of_publication', 'id'], name='article_date_id_idx'),
+            models.Index(fields=['category', 'date_of_publication', 'id'], name='article_category_date_idx'),
+            models.Index(fields=['owner', 'id'], name='article_owner_id_idx'),
+        ]
 
     def __str__(self):
         return f'Статья: {self.title} ; author: {self.owner}'
 
+    def save(self, *args, **kwargs):
+        """
+        Счётчики изменяются только через F() (logic.change_counters): сохранение
+        экземпляра с устаревшими значениями не должно их перезаписать
+        """
+        if not self._state.adding and not kwargs.get('force_insert') and kwargs.get('update_fields') is None:
+            skip = {*self.COUNTER_FIELDS, 'search_vector', *self.get_deferred_fields()} - {'updated_at'}
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in skip
+            ]
+        super().save(*args, **kwargs)
+
+
+class CategoryStats(models.Model):
+    """
+    Сводные данные категории по счётчикам её статей. Изменяются триггером базы данных
+    на article_article (миграция 0010) при добавлении, удалении и смене категории статьи.
+    Изменения счётчиков статей (голоса) триггер не применяет, а добавляет в очередь
+    CategoryStatsDelta (миграция 0014), очередь применяется пакетом после фиксации
+    голоса, одним UPDATE на категорию. Полный пересчёт - команда rebuild_category_stats
+    """
+    category = models.OneToOneField(Category, models.CASCADE, primary_key=True, related_name='stats')
+    article_count = models.IntegerField(default=0)
+    like_count = models.IntegerField(default=0)
+    rating_sum = models.IntegerField(default=0)
+    rating_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'Статистика категории: {self.category_id}'
+
+    @property
+    def rating(self):
+        """ Средняя оценка по всем оценкам статей категории """
+        if not self.rating_count:
+            return None
+        return (Decimal(self.rating_sum) / self.rating_count).quantize(Decimal('0.01'), ROUND_HALF_UP)
+
+
+class ArticleRelationQuerySet(models.QuerySet):
+    """ Массовые операции над связями с поддержкой счётчиков статей """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._counters_applied = False
+
+    def _clone(self):
+        clone = super()._clone()
+        clone._counters_applied = self._counters_applied
+        return clone
+
+    def bulk_create(self, objs, *args, **kwargs):
+        from article.logic import change_counters, get_relation_delta, rebuild_counters
+
+        objs = list(objs)
+        with transaction.atomic(using=self.db):
+            objs = super().bulk_create(objs, *args, **kwargs)
+            if kwargs.get('ignore_conflicts'):
+                """ Неизвестно, какие строки вставлены, пересчитываем затронутые статьи """
+                rebuild_counters(Article.objects.filter(pk__in={obj.article_id for obj in objs}))
+            else:
+                deltas = {}
+                for obj in objs:
+                    add_deltas(deltas, obj.article_id, get_relation_delta(like=obj.like, rating=obj.rating))
+                    add_deltas(deltas, obj.article_id, {'readers_count': 1})
+                for article_id, delta in deltas.items():
+                    change_counters(article_id, **delta)
+        for obj in objs:
+            obj.old_like, obj.old_rating = obj.like, obj.rating
+        return objs
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        from article.logic import change_counters, get_relation_delta
+
+        objs = list(objs)
+        if not ArticleRelation.COUNTED_FIELDS & set(fields):
+            return super().bulk_update(objs, fields, *args, **kwargs)
+
+        with transaction.atomic(using=self.db):
+            current = self.filter(pk__in=[obj.pk for obj in objs]).get_locked_state()
+            """ bulk_update выполняется через update(), счётчики меняем здесь один раз по статье """
+            queryset = self._chain()
+            queryset._counters_applied = True
+            rows = super(ArticleRelationQuerySet, queryset).bulk_update(objs, fields, *args, **kwargs)
+            deltas = {}
+            for obj in objs:
+                article_id, like, rating = current[obj.pk]
+                new_like = obj.like if 'like' in fields else like
+                new_rating = obj.rating if 'rating' in fields else rating
+                add_deltas(deltas, article_id, get_relation_delta(like, rating, new_like, new_rating))
+            for article_id, delta in deltas.items():
+                change_counters(article_id, **delta)
+        for obj in objs:
+            obj.old_like, obj.old_rating = obj.like, obj.rating
+        return rows
+
+    def update(self, **kwargs):
+        from article.logic import change_counters, get_relation_delta, rebuild_counters
+
+        counted = ArticleRelation.COUNTED_FIELDS & kwargs.keys()
+        if self._counters_applied or not counted and 'article' not in kwargs and 'article_id' not in kwargs:
+            return super().update(**kwargs)
+
+        with transaction.atomic(using=self.db):
+            current = self.get_locked_state()
+            rows = super().update(**kwargs)
+            if any(hasattr(kwargs[field], 'resolve_expression') for field in counted) or \
+                    'article' in kwargs or 'article_id' in kwargs:
+                """ Новые значения вычисляются в БД, пересчитываем затронутые статьи """
+                article_ids = {article_id for article_id, _, _ in current.values()}
+                article_ids.update(
+                    ArticleRelation.objects.filter(pk__in=list(current)).values_list('article_id', flat=True))
+                rebuild_counters(Article.objects.filter(pk__in=article_ids))
+            else:
+                deltas = {}
+                for article_id, like, rating in current.values():
+                    add_deltas(deltas, article_id, get_relation_delta(
+                        like, rating, kwargs.get('like', like), kwargs.get('rating', rating)))
+                for article_id, delta in deltas.items():
+                    change_counters(article_id, **delta)
+        return rows
+
+    update.alters_data = True
+
+    def get_locked_state(self):
+        """ Текущие (article_id, like, rating) связей, строки блокируются до конца транзакции """
+        rows = self.order_by('pk').select_for_update().values_list(
+            'pk', 'article_id', 'like', 'rating')
+        return {pk: (article_id, like, rating) for pk, article_id, like, rating in rows}
+
+
+def add_deltas(deltas, article_id, delta):
+    """ Суммирование изменений счётчиков по статьям """
+    total = deltas.setdefault(article_id, {})
+    for field, value in delta.items():
+        total[field] = total.get(field, 0) + value
+
 
 class ArticleRelation(models.Model):
     """ Модель посредник между моделями User и Article """
@@ -31,27 +199,169 @@ class ArticleRelation(models.Model):
         (3, 'fine'),
         (4, 'good'), (5, 'excellent')
     )
+    """ Поля, от которых зависят счётчики статьи """
+    COUNTED_FIELDS = {'like', 'rating'}
+
     user = models.ForeignKey(User, models.CASCADE)
     article = models.ForeignKey(Article, models.CASCADE)
     like = models.BooleanField(default=False)
     to_favorites = models.BooleanField(default=False)
     rating = models.SmallIntegerField(choices=CHOICES_RATING, blank=True, null=True)
+    """ Время добавления в избранное и лайка, NULL - нет. Заполняются триггером relation_marked_at_update """
+    favorited_at = models.DateTimeField(null=True, editable=False)
+    liked_at = models.DateTimeField(null=True, editable=False)
+
+    objects = ArticleRelationQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'article'], name='unique_user_article'),
+        ]
+        indexes = [
+            models.Index(fields=['article', 'id'], name='relation_article_id_idx'),
+            models.Index(fields=['article'], name='relation_article_like_idx', condition=models.Q(like=True)),
+            models.Index(fields=['article', 'rating'], name='relation_article_rating_idx',
+                         condition=models.Q(rating__isnull=False)),
+            # Избранное и лайки пользователя по времени добавления (favorites, liked)
+            models.Index(fields=['user', '-favorited_at', '-id'], name='relation_user_favorites_idx',
+                         condition=models.Q(to_favorites=True)),
+            models.Index(fields=['user', '-liked_at', '-id'], name='relation_user_liked_idx',
+                         condition=models.Q(like=True)),
+            # Недавние лайки для рейтинга trending
+            models.Index(fields=['liked_at'], name='relation_liked_at_idx', condition=models.Q(like=True)),
+        ]
 
     def __str__(self):
-        return f'Пользователь: {self.user.username} Статья: {self.article.title}'
+        return f'Пользователь: {self.user_id} Статья: {self.article_id}'
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
+        self.old_like = self.like
         self.old_rating = self.rating
 
     def save(self, *args, **kwargs):
-        from article.logic import get_rating
+        from article.cache import get_user_resource, invalidate
+        from article.logic import change_counters, get_relation_delta
 
         creating = not self.pk
+        old_like = False if creating else self.old_like
+        old_rating = None if creating else self.old_rating
+
+        delta = get_relation_delta(old_like, old_rating, self.like, self.rating)
+        if creating:
+            delta['readers_count'] = 1
+
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            changed = change_counters(self.article_id, **delta)
+            invalidate(get_user_resource('relation', self.user_id))
+        self.old_like, self.old_rating = self.like, self.rating
+
+        if changed and ArticleRelation.article.is_cached(self):
+            self.article.refresh_from_db(fields=Article.COUNTER_FIELDS)
+
+
+class ArticleCounterDelta(models.Model):
+    """
+    Отложенное изменение счётчиков статьи (ARTICLE_COUNTERS_MODE = 'queue'):
+    голос добавляет строку вместо UPDATE статьи, строки применяются пакетом
+    (см. logic.flush_counters). Без ограничения внешнего ключа: изменения
+    удалённой статьи просто отбрасываются при применении
+    """
+    article = models.ForeignKey(Article, models.DO_NOTHING, db_constraint=False, related_name='+')
+    like_count = models.IntegerField(default=0)
+    rating_sum = models.IntegerField(default=0)
+    rating_count = models.IntegerField(default=0)
+    readers_count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f'Статья: {self.article_id}'
+
+
+class CategoryStatsDelta(models.Model):
+    """
+    Отложенное изменение сводных данных категории при изменении счётчиков её статьи:
+    строку добавляет триггер на article_article вместо UPDATE общей строки CategoryStats,
+    строки применяются пакетом (см. logic.flush_category_stats). Без ограничения
+    внешнего ключа, изменения удалённой категории отбрасываются при применении
+    """
+    category = models.ForeignKey(Category, models.DO_NOTHING, db_constraint=False, related_name='+')
+    like_count = models.IntegerField(default=0)
+    rating_sum = models.IntegerField(default=0)
+    rating_count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f'Категория: {self.category_id}'
+
+
+class LeaderboardEntry(models.Model):
+    """
+    Предрассчитанная позиция статьи в рейтинге board категории (category = NULL - общий).
+    Хранится ограниченное число лучших статей, обновляет article.leaderboards.refresh_leaderboards.
+    Без ограничений внешних ключей: удаление статьи или категории не трогает рейтинг,
+    записи удалённых статей отбрасываются соединением при чтении и при обновлении
+    """
+    TOP = 'top'
+    TRENDING = 'trending'
+    BOARDS = ((TOP, 'top rated'), (TRENDING, 'trending'))
+
+    board = models.CharField(max_length=16, choices=BOARDS)
+    category = models.ForeignKey(Category, models.DO_NOTHING, db_constraint=False, null=True, related_name='+')
+    position = models.PositiveSmallIntegerField()
+    article = models.ForeignKey(Article, models.DO_NOTHING, db_constraint=False, related_name='+')
+    score = models.FloatField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['board', 'category', 'position'], name='leaderboard_position_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.board} {self.category_id}: {self.position}. {self.article_id}'
+
+
+class LeaderboardDirty(models.Model):
+    """
+    Статья, счётчики или категория которой изменились после обновления рейтингов.
+    Строка добавляется триггером базы данных на article_article (миграция 0012)
+    """
+    article = models.OneToOneField(Article, models.DO_NOTHING, db_constraint=False, primary_key=True,
+                                   related_name='+')
+
+    def __str__(self):
+        return f'Статья: {self.article_id}'
+
+
+@receiver(post_delete, sender=ArticleRelation)
+def article_relation_delete(sender, instance, **kwargs):
+    """ Удаление связи (в т.ч. каскадное) вычитает читателя, его лайк и оценку из счётчиков статьи """
+    from article.cache import get_user_resource, invalidate
+    from article.logic import change_counters, get_relation_delta
+
+    change_counters(instance.article_id, readers_count=-1,
+                    **get_relation_delta(instance.old_like, instance.old_rating))
+    invalidate(get_user_resource('relation', instance.user_id))
+
+
+@receiver([post_save, post_delete], sender=Article)
+def article_change(sender, **kwargs):
+    """ Сброс кэша ответов со статьями """
+    from article.cache import invalidate
+
+    invalidate('article')
+
+
+@receiver([post_save, post_delete], sender=Category)
+def category_change(sender, **kwargs):
+    """ Сброс кэша категорий и статей (фильтр и сортировка по category__title) """
+    from article.cache import invalidate
+
+    invalidate('category', 'article')
 
-        super().save(*args, **kwargs)
-        new_rating = self.rating
 
-        if self.old_rating != new_rating or creating:
-            get_rating(self.article)
+@receiver([post_save, post_delete], sender=User)
+def user_change(sender, instance, **kwargs):
+    """ Сброс кэша пользователя токенов API (права, блокировка) """
+    from article.authentication import forget_user
 
+    forget_user(instance.pk)
@@ -0,0 +1,194 @@
+import json
+from base64 import b64decode, b64encode
+from collections import OrderedDict, namedtuple
+from datetime import date, datetime
+from decimal import Decimal
+from urllib import parse
+
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+Cursor = namedtuple('Cursor', ['reverse', 'position'])
+
+
+class KeysetCursorPagination(BasePagination):
+    """
+    Keyset (seek) пагинация по непрозрачному курсору.
+
+    Порядок берётся из queryset после фильтров (в т.ч. OrderingFilter) и
+    дополняется первичным ключом, курсор хранит значения всех полей сортировки
+    последней записи страницы. Страница выбирается условием WHERE по этим
+    значениям, поэтому OFFSET и COUNT(*) не используются: любая страница
+    стоит столько же, сколько первая. Поля сортировки должны быть NOT NULL.
+    """
+    cursor_query_param = 'cursor'
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('pk',)
+    invalid_cursor_message = 'Invalid cursor'
+    position_annotation = 'cursor_position_%d'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        results = list(self.get_page_queryset(queryset, request))
+        reverse = self.cursor is not None and self.cursor.reverse
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.cursor is not None
+        return self.page
+
+    def get_page_queryset(self, queryset, request):
+        """ Запрос страницы (на одну запись больше размера страницы) без выполнения """
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(queryset)
+        self.cursor = self.decode_cursor(request)
+
+        reverse = self.cursor is not None and self.cursor.reverse
+        ordering = [self.invert(field) for field in self.ordering] if reverse else self.ordering
+        queryset = queryset.annotate(**{
+            self.position_annotation % index: F(field.lstrip('-'))
+            for index, field in enumerate(self.ordering)
+        }).order_by(*ordering)
+        if self.cursor is not None:
+            position = self.clean_position(queryset, self.cursor.position)
+            queryset = queryset.filter(self.get_position_filter(ordering, position))
+        return queryset[:self.page_size + 1]
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True},
+                'previous': {'type': 'string', 'nullable': True},
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        if self.page_size_query_param:
+            try:
+                return _positive_int(
+                    request.query_params[self.page_size_query_param],
+                    strict=True,
+                    cutoff=self.max_page_size
+                )
+            except (KeyError, ValueError):
+                pass
+        return self.page_size
+
+    def get_ordering(self, queryset):
+        """ Порядок сортировки queryset с первичным ключом в конце """
+        ordering = list(queryset.query.order_by)
+        if not ordering and queryset.query.default_ordering:
+            ordering = list(queryset.model._meta.ordering)
+        ordering = ordering or list(self.ordering)
+
+        if not all(isinstance(field, str) for field in ordering):
+            raise ImproperlyConfigured(f'{self.__class__.__name__} supports only field name ordering.')
+
+        pk_names = {'pk', queryset.model._meta.pk.name}
+        if not pk_names & {field.lstrip('-') for field in ordering}:
+            ordering.append('-pk' if ordering[0].startswith('-') else 'pk')
+        return ordering
+
+    @staticmethod
+    def invert(field):
+        return field[1:] if field.startswith('-') else f'-{field}'
+
+    @staticmethod
+    def get_position_filter(ordering, position):
+        """
+        Условие "строго после позиции" для составного ключа:
+        (k1 > v1) OR (k1 = v1 AND k2 > v2) OR ...
+        """
+        condition = Q()
+        equal = Q()
+        for field, value in zip(ordering, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def clean_position(self, queryset, position):
+        """ Значения курсора по типам полей сортировки, неверное значение - NotFound, а не ошибка запроса """
+        cleaned = []
+        for index, value in enumerate(position):
+            field = queryset.query.annotations[self.position_annotation % index].output_field
+            if value is None or isinstance(value, (list, dict)):
+                raise NotFound(self.invalid_cursor_message)
+            try:
+                cleaned.append(field.to_python(value))
+            except (TypeError, ValueError, ValidationError):
+                raise NotFound(self.invalid_cursor_message)
+        return cleaned
+
+    def get_position(self, item):
+        """ Значения полей сортировки записи (модели или строки .values()) """
+        names = [self.position_annotation % index for index in range(len(self.ordering))]
+        if isinstance(item, dict):
+            return [self.encode_value(item[name]) for name in names]
+        return [self.encode_value(getattr(item, name)) for name in names]
+
+    @staticmethod
+    def encode_value(value):
+        if isinstance(value, (datetime, date)):
+            return value.isoformat()
+        if isinstance(value, Decimal):
+            return str(value)
+        return value
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(Cursor(reverse=False, position=self.get_position(self.page[-1])))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(Cursor(reverse=True, position=self.get_position(self.page[0])))
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+
+        try:
+            querystring = b64decode(encoded.encode('ascii')).decode('ascii')
+            tokens = parse.parse_qs(querystring, keep_blank_values=True)
+            reverse = bool(int(tokens.get('r', ['0'])[0]))
+            position = json.loads(tokens['p'][0])
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return Cursor(reverse=reverse, position=position)
+
+    def encode_cursor(self, cursor):
+        tokens = {'p': json.dumps(cursor.position, separators=(',', ':'))}
+        if cursor.reverse:
+            tokens['r'] = '1'
+        querystring = parse.urlencode(tokens, doseq=True)
+        encoded = b64encode(querystring.encode('ascii')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
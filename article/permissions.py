@@ -1,14 +1,26 @@
 from rest_framework.permissions import BasePermission, SAFE_METHODS
 
 
+def is_owner_or_staff(request, owner_id):
+    """
+    Пользователь запроса - владелец (по owner_id, без загрузки владельца) или администратор.
+    Решения кэшируются на время запроса: повторные проверки объектов того же владельца бесплатны
+    """
+    decisions = getattr(request, '_owner_decisions', None)
+    if decisions is None:
+        decisions = request._owner_decisions = {}
+    if owner_id not in decisions:
+        user = request.user
+        decisions[owner_id] = bool(
+            user and user.is_authenticated and (user.is_staff or (owner_id is not None and owner_id == user.pk))
+        )
+    return decisions[owner_id]
+
+
 class IsAuthenticatedOrReadOnlyModify(BasePermission):
 
     def has_object_permission(self, request, view, obj):
-        return bool(
-            request.method in SAFE_METHODS or
-            request.user and
-            request.user.is_authenticated and (obj.owner == request.user or request.user.is_staff)
-        )
+        return request.method in SAFE_METHODS or is_owner_or_staff(request, obj.owner_id)
 
 
 class IsAuthenticatedReadOnlyModify(BasePermission):
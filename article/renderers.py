@@ -0,0 +1,94 @@
+import csv
+import json
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer на orjson, если он установлен, иначе - на json стандартной библиотеки.
+    Результат совпадает с JSONRenderer байт в байт: Decimal и даты (DATETIME_FORMAT)
+    сериализаторы отдают строками, остальные типы orjson не поддерживает сам
+    и передаёт в JSONEncoder DRF. Отступы (indent), ensure_ascii, не компактный
+    и не строгий JSON, а также то, что orjson вывести не может (например, целые
+    больше 64 бит), выводятся JSONRenderer. Запись чисел с плавающей точкой
+    в экспоненциальной форме у orjson короче (1e16 вместо 1e+16), а NaN
+    и Infinity выводятся как null вместо ошибки
+    """
+    options = orjson and orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if orjson is None or self.ensure_ascii or not self.compact or not self.strict \
+                or self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(data, default=self.encoder_class().default, option=self.options)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        """ Как и JSONRenderer, экранирует \\u2028 и \\u2029 """
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+
+
+class StreamRenderer(BaseRenderer):
+    """
+    Рендерер потоковой выгрузки: render_stream(rows, fields) - генератор байтов
+    по строкам (словарям), без сборки всего ответа в памяти
+    """
+    charset = 'utf-8'
+    """ Количество строк в одной части потока """
+    chunk_size = 500
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        rows = data if isinstance(data, list) else [data]
+        fields = list(rows[0]) if rows else []
+        return b''.join(self.render_stream(rows, fields))
+
+    def render_stream(self, rows, fields):
+        chunk = []
+        for row in rows:
+            chunk.append(self.render_row(row, fields))
+            if len(chunk) >= self.chunk_size:
+                yield ''.join(chunk).encode(self.charset)
+                chunk = []
+        if chunk:
+            yield ''.join(chunk).encode(self.charset)
+
+    def render_row(self, row, fields):
+        raise NotImplementedError('render_row() must be implemented.')
+
+
+class NDJSONRenderer(StreamRenderer):
+    """ JSON-объект на строку (NDJSON) """
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+    def render_row(self, row, fields):
+        return json.dumps(row, cls=JSONEncoder, ensure_ascii=False, separators=(',', ':')) + '\n'
+
+
+class CSVRenderer(StreamRenderer):
+    """ CSV с заголовком из fields, отсутствующие значения - пустые """
+    media_type = 'text/csv'
+    format = 'csv'
+
+    class Line:
+        """ Файловый объект для csv.writer: возвращает записанную строку """
+        def write(self, value):
+            return value
+
+    def render_stream(self, rows, fields):
+        self.writer = csv.writer(self.Line())
+        yield self.render_row(dict(zip(fields, fields)), fields).encode(self.charset)
+        yield from super().render_stream(rows, fields)
+
+    def render_row(self, row, fields):
+        return self.writer.writerow(['' if row.get(field) is None else row[field] for field in fields])
@@ -2,42 +2,252 @@ from django.contrib.auth.models import User
 from rest_framework import serializers
 from rest_framework.serializers import ModelSerializer
 
-from .models import Category, Article, ArticleRelation
+from .logic import get_readers_preview, get_user_relations
+from .metrics import measure_outermost
+from .models import Category, CategoryStats, Article, ArticleRelation, LeaderboardEntry
 
 
-class CategorySerializer(ModelSerializer):
-    """ Сериализация модели Category """
+class MeasuredListSerializer(serializers.ListSerializer):
+    """ Список сериализатора с MeasuredSerializerMixin (many=True) """
+
+    @property
+    def data(self):
+        with measure_outermost('serialize'):
+            return super().data
+
+
+class MeasuredSerializerMixin:
+    """ Время вычисления data - этап serialize показателей запроса (article.middleware) """
+
+    @property
+    def data(self):
+        with measure_outermost('serialize'):
+            return super().data
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        """ Как BaseSerializer.many_init, со списком MeasuredListSerializer """
+        allow_empty = kwargs.pop('allow_empty', None)
+        list_kwargs = {'child': cls(*args, **kwargs)}
+        if allow_empty is not None:
+            list_kwargs['allow_empty'] = allow_empty
+        list_kwargs.update(
+            (key, value) for key, value in kwargs.items() if key in serializers.LIST_SERIALIZER_KWARGS)
+        return MeasuredListSerializer(*args, **list_kwargs)
+
+
+class CategoryStatsSerializer(MeasuredSerializerMixin, ModelSerializer):
+    """ Сериализация модели CategoryStats """
+    rating = serializers.DecimalField(max_digits=3, decimal_places=2, read_only=True)
+
+    class Meta:
+        model = CategoryStats
+        fields = ('article_count', 'like_count', 'rating_count', 'rating')
+
+
+class CategorySerializer(MeasuredSerializerMixin, ModelSerializer):
+    """ Сериализация модели Category, сводные данные stats - по ?stats=true """
+    stats_param = 'stats'
+    stats = serializers.SerializerMethodField()
 
     class Meta:
         model = Category
-        fields = '__all__'
+        exclude = ('updated_at',)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if not self.with_stats(self.context.get('request')):
+            self.fields.pop('stats')
+
+    @classmethod
+    def with_stats(cls, request):
+        return request is not None and request.query_params.get(cls.stats_param) in ('1', 'true')
+
+    def get_stats(self, obj):
+        stats = getattr(obj, 'stats', None) or CategoryStats(category=obj)
+        return CategoryStatsSerializer(stats).data
 
 
-class UserSerializer(ModelSerializer):
+class UserSerializer(MeasuredSerializerMixin, ModelSerializer):
     class Meta:
         model = User
         fields = ['id', 'username']
 
 
-class ArticleSerializer(ModelSerializer):
-    """ Сериализация модели Article """
+class ArticleSerializer(MeasuredSerializerMixin, ModelSerializer):
+    """ Сериализация модели Article, отметки текущего пользователя my_* - по ?mine=true """
+    mine_param = 'mine'
+    mine_fields = ('my_like', 'my_favorite', 'my_rating')
 
     owner = serializers.CharField(source='owner.username', read_only=True)
-    readers = UserSerializer(many=True, read_only=True)
-    count_like_annotate = serializers.IntegerField(read_only=True)
-
+    readers = serializers.SerializerMethodField()
+    readers_count = serializers.IntegerField(read_only=True)
+    count_like_annotate = serializers.IntegerField(source='like_count', read_only=True)
+    my_like = serializers.SerializerMethodField()
+    my_favorite = serializers.SerializerMethodField()
+    my_rating = serializers.SerializerMethodField()
 
     class Meta:
         model = Article
         fields = (
             'id', 'title', 'category', 'description', 'date_of_publication', 'owner',
-            'count_like_annotate',  'rating', 'readers'
+            'count_like_annotate',  'rating', 'readers', 'readers_count', 'my_like', 'my_favorite', 'my_rating'
+        )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if not self.with_mine(self.context.get('request')):
+            for name in self.mine_fields:
+                self.fields.pop(name, None)
+
+    @classmethod
+    def with_mine(cls, request):
+        return request is not None and request.query_params.get(cls.mine_param) in ('1', 'true') \
+            and request.user.is_authenticated
+
+    def get_my_relation(self, obj):
+        """ (like, to_favorites, rating) текущего пользователя, для списка загружены одним запросом на страницу """
+        if not hasattr(obj, 'my_relation'):
+            obj.my_relation = get_user_relations(self.context['request'].user.pk, [obj.pk])[obj.pk]
+        return obj.my_relation or (False, False, None)
+
+    def get_my_like(self, obj):
+        return self.get_my_relation(obj)[0]
+
+    def get_my_favorite(self, obj):
+        return self.get_my_relation(obj)[1]
+
+    def get_my_rating(self, obj):
+        return self.get_my_relation(obj)[2]
+
+    def get_readers(self, obj):
+        """ Ограниченный список первых читателей, полный список - /api/article/{id}/readers/ """
+        preview = getattr(obj, 'readers_preview', None)
+        if preview is None:
+            preview = get_readers_preview([obj.pk])[obj.pk]
+        return UserSerializer(preview, many=True).data
+
+
+class ArticleSummarySerializer(ArticleSerializer):
+    """ Статья без списка читателей, поля как у ArticleValuesSerializer """
+
+    class Meta(ArticleSerializer.Meta):
+        fields = (
+            'id', 'title', 'category', 'description', 'date_of_publication', 'owner',
+            'count_like_annotate', 'rating', 'readers_count'
         )
 
 
-class ArticleRelationSerializer(ModelSerializer):
+class ArticleValuesSerializer:
+    """
+    Быстрая сериализация статей только для чтения по строкам .values().
+    Формирует тот же JSON, что и ArticleSerializer, без экземпляров моделей
+    и без создания полей сериализатора на каждую статью
+    """
+    values = (
+        'id', 'title', 'category_id', 'description', 'date_of_publication', 'owner__username',
+        'like_count', 'rating', 'readers_count'
+    )
+    """ Поля ответа без списка читателей (readers=False), в порядке ArticleSerializer """
+    fields = (
+        'id', 'title', 'category', 'description', 'date_of_publication', 'owner',
+        'count_like_annotate', 'rating', 'readers_count'
+    )
+    date_of_publication = serializers.DateTimeField()
+    rating = serializers.DecimalField(max_digits=3, decimal_places=2)
+
+    def __init__(self, instance, many=False, readers=True, user=None):
+        self.instance = instance
+        self.many = many
+        self.readers = readers
+        """ Пользователь, отметки которого выводятся в my_* (см. ArticleSerializer.with_mine) """
+        self.user = user
+
+    @property
+    def data(self):
+        with measure_outermost('serialize'):
+            if self.many:
+                return list(self.iterator())
+            return self.to_representation(self.instance)
+
+    def iterator(self):
+        """ Ленивая сериализация строк, например из queryset.iterator() """
+        return (self.to_representation(row) for row in self.instance)
+
+    def to_representation(self, row):
+        data = {
+            'id': row['id'],
+            'title': row['title'],
+            'category': row['category_id'],
+            'description': row['description'],
+            'date_of_publication': self.date_of_publication.to_representation(row['date_of_publication']),
+        }
+        if row['owner__username'] is not None:
+            """ Как и у ArticleSerializer, статья без автора выводится без поля owner """
+            data['owner'] = row['owner__username']
+        data['count_like_annotate'] = row['like_count']
+        data['rating'] = None if row['rating'] is None else self.rating.to_representation(row['rating'])
+        if self.readers:
+            preview = row.get('readers_preview')
+            if preview is None:
+                preview = get_readers_preview([row['id']])[row['id']]
+            data['readers'] = preview
+        data['readers_count'] = row['readers_count']
+        if self.user is not None:
+            if 'my_relation' not in row:
+                row['my_relation'] = get_user_relations(self.user.pk, [row['id']])[row['id']]
+            data['my_like'], data['my_favorite'], data['my_rating'] = row['my_relation'] or (False, False, None)
+        return data
+
+
+class ReaderSerializer(MeasuredSerializerMixin, ModelSerializer):
+    """ Сериализация читателя статьи по модели ArticleRelation """
+    id = serializers.IntegerField(source='user_id', read_only=True)
+    username = serializers.CharField(source='user.username', read_only=True)
+
+    class Meta:
+        model = ArticleRelation
+        fields = ('id', 'username')
+
+
+class ArticleRelationSerializer(MeasuredSerializerMixin, ModelSerializer):
     """ Сериализация модели ArticleRelation """
 
     class Meta:
         model = ArticleRelation
         fields = ('article', 'like', 'to_favorites', 'rating')
+
+
+class FavoriteSerializer(MeasuredSerializerMixin, ModelSerializer):
+    """ Статья из избранного пользователя со временем добавления """
+    article = ArticleSummarySerializer(read_only=True)
+
+    class Meta:
+        model = ArticleRelation
+        fields = ('favorited_at', 'article')
+
+
+class LikedSerializer(MeasuredSerializerMixin, ModelSerializer):
+    """ Статья, отмеченная лайком пользователя, со временем отметки """
+    article = ArticleSummarySerializer(read_only=True)
+
+    class Meta:
+        model = ArticleRelation
+        fields = ('liked_at', 'article')
+
+
+class LeaderboardEntrySerializer(MeasuredSerializerMixin, ModelSerializer):
+    """ Место статьи в рейтинге """
+    article = ArticleSummarySerializer(read_only=True)
+
+    class Meta:
+        model = LeaderboardEntry
+        fields = ('position', 'score', 'article')
+
+
+class ArticleRelationBulkSerializer(serializers.Serializer):
+    """ Элемент пакетного изменения связей ArticleRelation """
+    article = serializers.IntegerField()
+    like = serializers.BooleanField(required=False)
+    to_favorites = serializers.BooleanField(required=False)
+    rating = serializers.ChoiceField(choices=ArticleRelation.CHOICES_RATING, required=False, allow_null=True)
@@ -0,0 +1,66 @@
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from article.cache import get_cache
+from article.logic import rebuild_counters
+from article.models import Category, Article, ArticleRelation
+
+
+class QueryBudgetMixin:
+    """
+    Бюджет SQL-запросов эндпоинта: assertQueryBudget(budget, request) выполняет
+    request() на данных scales (1×, 10×, 100× единиц grow) и проверяет, что
+    запросов не больше budget и их количество не зависит от объёма данных.
+    prepare() - подготовка вне подсчёта (например, удаляемый объект), её результат
+    передаётся в request. Кэш ответов очищается перед каждым запросом
+    """
+    scales = (1, 10, 100)
+    """ В единице данных: категория, пользователи и статьи, у каждой статьи - все пользователи единицы """
+    unit_users = 3
+    unit_articles = 3
+
+    def grow(self, units):
+        """ Дополняет данные до units единиц """
+        created = getattr(self, '_units', 0)
+        if units <= created:
+            return
+        categories = Category.objects.bulk_create(Category(title=f'budget-category-{index}')
+                                                  for index in range(created, units))
+        users = User.objects.bulk_create(
+            User(username=f'budget-user-{index}-{user}') for index in range(created, units)
+            for user in range(self.unit_users)
+        )
+        articles = Article.objects.bulk_create(
+            Article(title=f'budget-article-{index}-{article}', category=category,
+                    description=f'budget-description-{index}', owner=users[number * self.unit_users])
+            for number, (index, category) in enumerate(zip(range(created, units), categories))
+            for article in range(self.unit_articles)
+        )
+        ArticleRelation.objects.bulk_create(
+            ArticleRelation(article=article, user=user, like=bool(position % 2), rating=position % 5 + 1)
+            for number, article in enumerate(articles)
+            for position, user in enumerate(users[number // self.unit_articles * self.unit_users:]
+                                            [:self.unit_users])
+        )
+        rebuild_counters(Article.objects.filter(pk__in=[article.pk for article in articles]))
+        self._units = units
+
+    def assertQueryBudget(self, budget, request, prepare=None):
+        counts = {}
+        for scale in self.scales:
+            self.grow(scale)
+            get_cache().clear()
+            args = () if prepare is None else (prepare(),)
+            with CaptureQueriesContext(connection) as queries:
+                response = request(*args)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+            self.assertLess(response.status_code, 400, f'{scale}×: {getattr(response, "data", response)}')
+            counts[scale] = len(queries)
+            self.assertLessEqual(
+                counts[scale], budget,
+                f'{scale}×: {counts[scale]} запросов при бюджете {budget}\n' +
+                '\n'.join(query['sql'] for query in queries.captured_queries)
+            )
+        self.assertEqual(1, len(set(counts.values())), f'Количество запросов зависит от объёма данных: {counts}')
@@ -1,14 +1,28 @@
+import asyncio
 import json
+import threading
+import time
+from base64 import b64encode
+from urllib.parse import urlencode
 
+from asgiref.sync import sync_to_async
 from django.urls import reverse
 from django.contrib.auth.models import User
-from django.db.models import Count, When, Case, Avg
+from django.db import connection
+from django.http import StreamingHttpResponse
+from django.test import AsyncRequestFactory, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 
 from rest_framework import status
 from rest_framework.test import APITestCase
 
-from article.models import Category, Article, ArticleRelation
+from article.cache import get_stats, reset_stats
+from article.filters import has_trigram
+from article.logic import READERS_PREVIEW_LIMIT, flush_category_stats
+from article.models import Category, CategoryStats, Article, ArticleRelation
 from article.serializers import CategorySerializer, ArticleSerializer, ArticleRelationSerializer
+from article.views import ArticleViewSet, CategoryViewSet, run_view
+from conf.asgi import ASGIHandler
 
 
 class TestApiArticle(APITestCase):
@@ -30,11 +44,10 @@ class TestApiArticle(APITestCase):
         """ Тест сериализации данных """
         url = reverse('article-list')
         response = self.client.get(url)
-        articles = Article.objects.all().annotate(
-            count_like_annotate=Count(Case(When(articlerelation__like=True, then=1)))).order_by('id')
+        articles = Article.objects.all().order_by('id')
         serializer = ArticleSerializer(articles, many=True)
         self.assertEqual(status.HTTP_200_OK, response.status_code)
-        self.assertEqual(serializer.data, response.data)
+        self.assertEqual(serializer.data, response.data['results'])
 
         url = reverse('category-list')
         response = self.client.get(url)
@@ -46,8 +59,7 @@ class TestApiArticle(APITestCase):
         """ Тест получения объекта """
         url = reverse('article-detail', args=(self.article_1.id,))
         response = self.client.get(url)
-        article = Article.objects.filter(id__in=[self.article_1.id]).annotate(
-            count_like_annotate=Count(Case(When(articlerelation__like=True, then=1))))
+        article = Article.objects.filter(id__in=[self.article_1.id])
         serializer = ArticleSerializer(article[0])
         self.assertEqual(status.HTTP_200_OK, response.status_code)
         self.assertEqual(serializer.data, response.data)
@@ -62,21 +74,19 @@ class TestApiArticle(APITestCase):
         """ Тест фильтрации """
         url = reverse('article-list')
         response = self.client.get(url, data={'owner__username': self.user_2.username})
-        articles = Article.objects.filter(id__in=[self.article_2.id, self.article_3.id]).annotate(
-            count_like_annotate=Count(Case(When(articlerelation__like=True, then=1)))).order_by('id')
+        articles = Article.objects.filter(id__in=[self.article_2.id, self.article_3.id]).order_by('id')
         serializer = ArticleSerializer(articles, many=True)
         self.assertEqual(status.HTTP_200_OK, response.status_code)
-        self.assertEqual(serializer.data, response.data)
+        self.assertEqual(serializer.data, response.data['results'])
 
     def test_search(self):
         """ Тест поиска """
         url = reverse('article-list')
         response = self.client.get(url, data={'search': 'article-2'})
-        articles = Article.objects.filter(id__in=[self.article_2.id, ]).annotate(
-            count_like_annotate=Count(Case(When(articlerelation__like=True, then=1)))).order_by('id')
+        articles = Article.objects.filter(id__in=[self.article_2.id, ]).order_by('id')
         serializer = ArticleSerializer(articles, many=True)
         self.assertEqual(status.HTTP_200_OK, response.status_code)
-        self.assertEqual(serializer.data, response.data)
+        self.assertEqual(serializer.data, response.data['results'])
 
         url = reverse('category-list')
         response = self.client.get(url, data={'search': 'category-2'})
@@ -84,15 +94,50 @@ class TestApiArticle(APITestCase):
         self.assertEqual(status.HTTP_200_OK, response.status_code)
         self.assertEqual(serializer.data, response.data)
 
+    def test_search_ranking(self):
+        """ Тест полнотекстового поиска по заголовку и описанию с сортировкой по релевантности """
+        url = reverse('article-list')
+        article_4 = Article.objects.create(title='Кэширование', description='Статьи о базах данных',
+                                           category=self.category_1, owner=self.user_1)
+        article_5 = Article.objects.create(title='Базы данных', description='Индексы', category=self.category_1,
+                                           owner=self.user_1)
+        response = self.client.get(url, data={'search': 'база данных'})
+        self.assertEqual([article_5.id, article_4.id], [article['id'] for article in response.data['results']])
+
+        response = self.client.get(url, data={'search': 'база данных', 'page_size': 1})
+        self.assertEqual([article_5.id], [article['id'] for article in response.data['results']])
+        response = self.client.get(response.data['next'])
+        self.assertEqual([article_4.id], [article['id'] for article in response.data['results']])
+        self.assertIsNone(response.data['next'])
+
+        article_4.title = 'Индексы'
+        article_4.save()
+        response = self.client.get(url, data={'search': 'индекс'})
+        self.assertEqual([article_4.id, article_5.id], [article['id'] for article in response.data['results']])
+
+    def test_search_typo(self):
+        """ Тест поиска по похожести заголовка (pg_trgm), если полнотекстовых совпадений нет """
+        if not has_trigram(Article.objects.db):
+            self.skipTest('pg_trgm не установлено')
+        url = reverse('article-list')
+        article_4 = Article.objects.create(title='Репликация postgresql', category=self.category_1,
+                                           owner=self.user_1)
+        response = self.client.get(url, data={'search': 'postgersql'})
+        self.assertEqual([article_4.id], [article['id'] for article in response.data['results']])
+
+        """ При полнотекстовых совпадениях похожие заголовки не добавляются """
+        Article.objects.create(title='Обзор', description='postgersql', category=self.category_1, owner=self.user_1)
+        response = self.client.get(url, data={'search': 'postgersql'})
+        self.assertNotIn(article_4.id, [article['id'] for article in response.data['results']])
+
     def test_ordering(self):
         """ Тест сортировки """
         url = reverse('article-list')
         response = self.client.get(url, data={'ordering': 'title'})
-        articles = Article.objects.all().annotate(
-            count_like_annotate=Count(Case(When(articlerelation__like=True, then=1)))).order_by('title')
+        articles = Article.objects.all().order_by('title')
         serializer = ArticleSerializer(articles, many=True)
         self.assertEqual(status.HTTP_200_OK, response.status_code)
-        self.assertEqual(serializer.data, response.data)
+        self.assertEqual(serializer.data, response.data['results'])
 
         url = reverse('category-list')
         response = self.client.get(url, data={'ordering': '-title'})
@@ -100,12 +145,233 @@ class TestApiArticle(APITestCase):
         self.assertEqual(status.HTTP_200_OK, response.status_code)
         self.assertEqual(serializer.data, response.data)
 
+    def test_pagination(self):
+        """ Тест постраничного вывода по курсору """
+        Article.objects.create(title='article-2', category=self.category_2, owner=self.user_1)
+        url = reverse('article-list')
+        for ordering in ('title', '-title', 'date_of_publication', '-category__title'):
+            articles = Article.objects.all()
+            direction = '-' if ordering.startswith('-') else ''
+            expected = ArticleSerializer(articles.order_by(ordering, f'{direction}id'), many=True).data
+
+            results, pages = [], []
+            response = self.client.get(url, data={'ordering': ordering, 'page_size': 1})
+            while True:
+                self.assertEqual(status.HTTP_200_OK, response.status_code)
+                results.extend(response.data['results'])
+                pages.append(response.data)
+                if response.data['next'] is None:
+                    break
+                response = self.client.get(response.data['next'])
+            self.assertEqual(expected, results)
+            self.assertIsNone(pages[0]['previous'])
+
+            """ Возврат на предыдущую страницу """
+            response = self.client.get(pages[-1]['previous'])
+            self.assertEqual(pages[-2]['results'], response.data['results'])
+
+    def test_pagination_invalid_cursor(self):
+        """ Тест некорректного курсора """
+        url = reverse('article-list')
+        response = self.client.get(url, data={'cursor': 'invalid'})
+        self.assertEqual(status.HTTP_404_NOT_FOUND, response.status_code)
+
+        """ Значения неверного типа для полей сортировки """
+        for ordering, position in (('id', ['abc']), ('id', [[1]]), ('id', [None]),
+                                   ('date_of_publication', ['not-a-date', 1]),
+                                   ('date_of_publication', [[2020], 1]), ('title', ['article-1', 'x'])):
+            cursor = b64encode(urlencode({'p': json.dumps(position)}).encode()).decode()
+            with self.subTest(ordering=ordering, position=position):
+                response = self.client.get(url, data={'ordering': ordering, 'cursor': cursor})
+                self.assertEqual(status.HTTP_404_NOT_FOUND, response.status_code)
+
+    def test_export(self):
+        """ Тест потоковой выгрузки статей в NDJSON и CSV """
+        url = reverse('article-export')
+        response = self.client.get(url, data={'ordering': '-title'})
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertTrue(response.streaming)
+        self.assertEqual('application/x-ndjson; charset=utf-8', response['Content-Type'])
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        expected = ArticleSerializer([self.article_3, self.article_2, self.article_1], many=True).data
+        for article in expected:
+            article.pop('readers')
+        self.assertEqual(json.loads(json.dumps(expected)), rows)
+
+        response = self.client.get(url, data={'format': 'csv', 'search': 'article-2'})
+        self.assertEqual('attachment; filename="articles.csv"', response['Content-Disposition'])
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual('id,title,category,description,date_of_publication,owner,count_like_annotate,rating,'
+                         'readers_count', lines[0])
+        self.assertTrue(lines[1].startswith(f'{self.article_2.id},article-2,{self.category_1.id},Article-description-2,'))
+        self.assertTrue(lines[1].endswith(',test-2,0,,0'))
+        self.assertEqual(2, len(lines))
+
+    def test_metrics(self):
+        """ Server-Timing и строка лога article.metrics по запросам к API, N+1 """
+        url = reverse('article-list')
+        with self.settings(API_METRICS_SAMPLE_RATE=1), CaptureQueriesContext(connection) as queries, \
+                self.assertLogs('article.metrics', 'INFO') as logs:
+            response = self.client.get(url, data={'ordering': 'title'})
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual('INFO', logs.records[0].levelname)
+        self.assertEqual(
+            {'method': 'GET', 'path': url, 'view': 'ArticleViewSet.list', 'status': 200,
+             'queries': len(queries), 'size': len(response.content)},
+            {field: record[field] for field in ('method', 'path', 'view', 'status', 'queries', 'size')}
+        )
+        self.assertNotIn('n_plus_one', record)
+        timing = dict(metric.split(';', 1) for metric in response['Server-Timing'].split(', '))
+        self.assertEqual(['db', 'view', 'serialize', 'render', 'total'], list(timing))
+        self.assertIn(f'desc="{len(queries)} queries"', timing['db'])
+        """ Сериализация - часть представления, вложенные сериализаторы (читатели) входят в неё """
+        self.assertGreater(record['serialize_ms'], 0)
+        self.assertLessEqual(record['serialize_ms'], record['view_python_ms'] + record['db_ms'])
+        self.assertEqual(f'dur={record["serialize_ms"]}', timing['serialize'])
+
+        with self.settings(API_METRICS_SAMPLE_RATE=0, API_METRICS_N_PLUS_ONE=0), \
+                self.assertLogs('article.metrics', 'WARNING') as logs:
+            self.client.get(reverse('article-detail', args=(self.article_1.id,)), data={'n': 1})
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual('ArticleViewSet.retrieve', record['view'])
+        self.assertGreaterEqual(record['n_plus_one']['count'], 1)
+
+        response = self.client.get('/auth/')
+        self.assertFalse(response.has_header('Server-Timing'))
+
+    def test_readers(self):
+        """ Тест ограниченного списка читателей и постраничного вывода всех читателей """
+        users = [User.objects.create(username=f'reader-{index}') for index in range(READERS_PREVIEW_LIMIT + 2)]
+        ArticleRelation.objects.bulk_create(ArticleRelation(user=user, article=self.article_1) for user in users)
+        expected = [{'id': user.id, 'username': user.username} for user in users]
+
+        url = reverse('article-list')
+        response = self.client.get(url)
+        data = response.data['results'][0]
+        self.assertEqual(expected[:READERS_PREVIEW_LIMIT], data['readers'])
+        self.assertEqual(len(users), data['readers_count'])
+
+        url = reverse('article-readers', args=(self.article_1.id,))
+        response = self.client.get(url, data={'page_size': READERS_PREVIEW_LIMIT})
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        readers = response.data['results']
+        response = self.client.get(response.data['next'])
+        self.assertEqual(expected, readers + response.data['results'])
+        self.assertIsNone(response.data['next'])
+
+        url = reverse('article-readers', args=(0,))
+        response = self.client.get(url)
+        self.assertEqual(status.HTTP_404_NOT_FOUND, response.status_code)
+
+    def test_response_cache(self):
+        """ Тест кэша ответов и его сброса при изменении данных """
+        reset_stats()
+        url = reverse('article-list')
+        self.assertEqual('MISS', self.client.get(url)['X-Cache'])
+        self.assertEqual('HIT', self.client.get(url)['X-Cache'])
+        self.assertEqual('MISS', self.client.get(url, data={'ordering': 'title'})['X-Cache'])
+        self.assertEqual('HIT', self.client.get(url, data={'ordering': 'title', 'search': ''})['X-Cache'])
+
+        """ Лайк через ArticleRelationViewSet сбрасывает кэш статей """
+        self.client.force_login(self.user_2)
+        relation_url = reverse('articlerelation-detail', args=(self.article_1.id,))
+        self.client.patch(relation_url, data=json.dumps({'like': True}), content_type='application/json')
+        response = self.client.get(url)
+        self.assertEqual('MISS', response['X-Cache'])
+        self.assertEqual(1, response.data['results'][0]['count_like_annotate'])
+
+        """ Изменение категории сбрасывает кэш категорий """
+        category_url = reverse('category-detail', args=(self.category_1.id,))
+        self.assertEqual('MISS', self.client.get(category_url)['X-Cache'])
+        self.category_1.title = 'category-1-changed'
+        self.category_1.save()
+        response = self.client.get(category_url)
+        self.assertEqual('MISS', response['X-Cache'])
+        self.assertEqual('category-1-changed', response.data['title'])
+
+        self.assertEqual((2, 3), get_stats()['article-list'])
+        self.assertEqual((0, 2), get_stats()['category-detail'])
+
+    def test_conditional_get(self):
+        """ Тест ответа 304 по ETag и Last-Modified """
+        url = reverse('article-detail', args=(self.article_1.id,))
+        response = self.client.get(url)
+        etag = response['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(status.HTTP_304_NOT_MODIFIED, response.status_code)
+        self.assertEqual(b'', response.content)
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(status.HTTP_304_NOT_MODIFIED, response.status_code)
+
+        """ Оценка через ArticleRelationViewSet меняет версию статьи """
+        self.client.force_login(self.user_2)
+        relation_url = reverse('articlerelation-detail', args=(self.article_1.id,))
+        self.client.patch(relation_url, data=json.dumps({'rating': 5}), content_type='application/json')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual('5.00', response.data['rating'])
+        self.assertNotEqual(etag, response['ETag'])
+
+        url = reverse('category-list')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(status.HTTP_304_NOT_MODIFIED, self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code)
+        self.category_3.delete()
+        self.assertEqual(status.HTTP_200_OK, self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code)
+
+        url = reverse('category-detail', args=(0,))
+        self.assertEqual(status.HTTP_404_NOT_FOUND, self.client.get(url).status_code)
+
+    def test_mine(self):
+        """ Тест отметок текущего пользователя в списке и статье (?mine=true) """
+        ArticleRelation.objects.create(user=self.user_2, article=self.article_1, like=True, rating=4)
+        ArticleRelation.objects.create(user=self.user_2, article=self.article_3, to_favorites=True)
+        url = reverse('article-list')
+        self.assertNotIn('my_like', self.client.get(url, data={'mine': 'true'}).data['results'][0])
+
+        for values in (False, True):
+            with self.subTest(values=values), self.settings(ARTICLE_VALUES_SERIALIZATION=values):
+                self.client.force_login(self.user_2)
+                response = self.client.get(url, data={'mine': 'true'})
+                self.assertEqual(
+                    [(True, False, 4), (False, False, None), (False, True, None)],
+                    [(item['my_like'], item['my_favorite'], item['my_rating']) for item in response.data['results']]
+                )
+                self.assertNotIn('my_like', self.client.get(url).data['results'][0])
+                response = self.client.get(reverse('article-detail', args=(self.article_3.id,)), data={'mine': '1'})
+                self.assertEqual((False, True, None),
+                                 (response.data['my_like'], response.data['my_favorite'], response.data['my_rating']))
+                self.assertNotIn('ETag', response)
+
+                """ Ответ кэшируется для каждого пользователя отдельно """
+                self.client.force_login(self.user_1)
+                response = self.client.get(url, data={'mine': 'true'})
+                self.assertEqual([False, False, False], [item['my_like'] for item in response.data['results']])
+        self.assertEqual(2, ArticleRelation.objects.count())
+
+        """ Изменение отметки без изменения счётчиков сбрасывает кэш """
+        relation_url = reverse('articlerelation-detail', args=(self.article_2.id,))
+        self.client.patch(relation_url, data=json.dumps({'to_favorites': True}), content_type='application/json')
+        response = self.client.get(url, data={'mine': 'true'})
+        self.assertEqual([False, True, False], [item['my_favorite'] for item in response.data['results']])
+
+        """ Отметка одного пользователя не сбрасывает кэш ?mine других """
+        self.client.force_login(self.user_2)
+        self.assertEqual('MISS', self.client.get(url, data={'mine': 'true'})['X-Cache'])
+        self.client.force_login(self.user_1)
+        self.client.patch(relation_url, data=json.dumps({'to_favorites': False}), content_type='application/json')
+        self.assertEqual('MISS', self.client.get(url, data={'mine': 'true'})['X-Cache'])
+        self.client.force_login(self.user_2)
+        response = self.client.get(url, data={'mine': 'true'})
+        self.assertEqual('HIT', response['X-Cache'])
+        self.assertEqual([False, False, True], [item['my_favorite'] for item in response.data['results']])
+
     def test_create(self):
         """ Тест создания объекта """
         self.client.force_login(self.user_2)
         url = reverse('article-list')
         data = {
-            "category": 2,
+            "category": self.category_2.id,
             "title": "article-4",
             "description": "Article description-4",
             "readers": []
@@ -205,6 +471,33 @@ class TestApiArticle(APITestCase):
         self.assertEqual(status.HTTP_403_FORBIDDEN, response.status_code)
         self.assertEqual(3, Article.objects.all().count())
 
+    def test_delete_with_readers(self):
+        """ Удаление прочитанной статьи: связи удалены, сводные данные категории вычтены """
+        ArticleRelation.objects.create(user=self.user_1, article=self.article_2, like=True, rating=5)
+        ArticleRelation.objects.create(user=self.user_3, article=self.article_2, like=True, rating=3)
+        ArticleRelation.objects.create(user=self.user_3, article=self.article_1, rating=4)
+        self.client.force_login(self.user_2)
+        response = self.client.delete(reverse('article-detail', args=(self.article_2.id,)))
+        self.assertEqual(status.HTTP_204_NO_CONTENT, response.status_code)
+        self.assertFalse(ArticleRelation.objects.filter(article_id=self.article_2.id).exists())
+        flush_category_stats()
+        stats = CategoryStats.objects.get(category=self.category_1)
+        self.assertEqual((1, 0, 4, 1), (stats.article_count, stats.like_count, stats.rating_sum, stats.rating_count))
+
+    def test_owner_permission_queries(self):
+        """ Права на изменение проверяются по owner_id, фильтры и поиск списка не применяются """
+        self.client.force_login(self.user_2)
+        url = reverse('article-detail', args=(self.article_1.id,)) + '?search=nothing'
+        self.client.get(reverse('category-list'))
+        with self.assertNumQueries(3) as queries:
+            response = self.client.patch(url, data=json.dumps({'title': 'article-1-changed'}),
+                                         content_type='application/json')
+        self.assertEqual(status.HTTP_403_FORBIDDEN, response.status_code)
+        self.assertNotIn('search_vector', queries.captured_queries[-1]['sql'])
+
+        response = self.client.delete(url)
+        self.assertEqual(status.HTTP_403_FORBIDDEN, response.status_code)
+
     def test_update_user_is_staff(self):
         """ Тест обновления чужого объекта администратором """
         self.client.force_login(self.user_3)
@@ -228,6 +521,38 @@ class TestApiArticle(APITestCase):
         self.assertEqual(status.HTTP_204_NO_CONTENT, response.status_code)
         self.assertEqual(2, Article.objects.all().count())
 
+    def test_category_stats(self):
+        """ Тестирование сводных данных категории """
+        ArticleRelation.objects.create(article=self.article_1, user=self.user_2, like=True, rating=5)
+        ArticleRelation.objects.create(article=self.article_2, user=self.user_1, rating=4)
+        """ Очередь категорий применяется после фиксации, TestCase не выполняет on_commit """
+        flush_category_stats()
+        response = self.client.get(reverse('category-stats', args=(self.category_1.id,)))
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual({'article_count': 2, 'like_count': 1, 'rating_count': 2, 'rating': '4.50'}, response.data)
+
+        response = self.client.get(reverse('category-stats', args=(self.category_3.id,)))
+        self.assertEqual({'article_count': 0, 'like_count': 0, 'rating_count': 0, 'rating': None}, response.data)
+
+        url = reverse('category-detail', args=(self.category_1.id,))
+        self.assertNotIn('stats', self.client.get(url).data)
+        response = self.client.get(url, data={'stats': 'true'})
+        self.assertEqual(2, response.data['stats']['article_count'])
+        self.assertFalse(response.has_header('ETag'))
+
+        ArticleRelation.objects.create(article=self.article_2, user=self.user_2, like=True)
+        self.assertEqual(1, self.client.get(url, data={'stats': 'true'}).data['stats']['like_count'])
+        """ Применение очереди сбрасывает кэш ответов со сводными данными """
+        flush_category_stats()
+        response = self.client.get(url, data={'stats': 'true'})
+        self.assertEqual('MISS', response['X-Cache'])
+        self.assertEqual(2, response.data['stats']['like_count'])
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('category-list'), data={'stats': '1'})
+        self.assertEqual({self.category_1.id: 2, self.category_2.id: 1, self.category_3.id: 0},
+                         {category['id']: category['stats']['article_count'] for category in response.data})
+
     def test_get_relation_article_user(self):
         """ Тестирование связи - Лайк"""
         self.client.force_login(self.user_2)
@@ -278,9 +603,213 @@ class TestApiArticle(APITestCase):
         """ Тестирование среднего рейтинга """
         url = reverse('article-detail', args=(self.article_2.id,))
         response = self.client.get(url)
-        article = Article.objects.filter(id__in=[self.article_2.id, ]).annotate(
-            count_like_annotate=Count(Case(When(articlerelation__like=True, then=1))))
+        article = Article.objects.filter(id__in=[self.article_2.id, ])
         data_article = ArticleSerializer(article[0]).data
         self.assertEqual(data_article, response.data)
         self.assertEqual('4.50', response.data['rating'])
         self.assertEqual('4.50', data_article['rating'])
+
+    def test_relation_upsert(self):
+        """ Тестирование изменения связи одним upsert и одним UPDATE счётчиков статьи """
+        self.client.force_login(self.user_2)
+        url = reverse('articlerelation-detail', args=(self.article_1.id,))
+        self.client.get(reverse('category-list'))
+        with self.assertNumQueries(6):
+            response = self.client.patch(url, data=json.dumps({'like': True, 'rating': 4}),
+                                         content_type='application/json')
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual({'article': self.article_1.id, 'like': True, 'to_favorites': False, 'rating': 4},
+                         response.data)
+
+        with self.assertNumQueries(6) as queries:
+            response = self.client.patch(url, data=json.dumps({'rating': 2}), content_type='application/json')
+        self.assertEqual({'article': self.article_1.id, 'like': True, 'to_favorites': False, 'rating': 2},
+                         response.data)
+        self.assertEqual(1, ArticleRelation.objects.filter(user=self.user_2, article=self.article_1).count())
+        self.assertNotIn('SUM', ' '.join(query['sql'] for query in queries.captured_queries))
+        self.article_1.refresh_from_db()
+        self.assertEqual((1, 2, 1, 1), (self.article_1.like_count, self.article_1.rating_sum,
+                                        self.article_1.rating_count, self.article_1.readers_count))
+
+        response = self.client.patch(reverse('articlerelation-detail', args=(0,)),
+                                     data=json.dumps({'like': True}), content_type='application/json')
+        self.assertEqual(status.HTTP_404_NOT_FOUND, response.status_code)
+
+    def test_relation_bulk(self):
+        """ Тестирование пакетного изменения связей """
+        self.client.force_login(self.user_2)
+        url = reverse('articlerelation-bulk')
+        ArticleRelation.objects.create(user=self.user_2, article=self.article_3, rating=1)
+        data = [
+            {'article': self.article_1.id, 'like': True},
+            {'article': self.article_2.id, 'rating': 4, 'to_favorites': True},
+            {'article': 0, 'like': True},
+            {'article': self.article_1.id, 'rating': 5},
+            {'article': self.article_3.id, 'rating': 3, 'like': False},
+            {'rating': 9},
+        ]
+        response = self.client.post(url, data=json.dumps(data), content_type='application/json')
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual(['created', 'created', 'not_found', 'created', 'updated', 'invalid'],
+                         [result['status'] for result in response.data])
+        self.assertEqual({'article': self.article_1.id, 'like': True, 'to_favorites': False, 'rating': 5},
+                         response.data[0]['data'])
+        self.assertIn('rating', response.data[5]['errors'])
+
+        for article, counters in ((self.article_1, (1, 5, 1)), (self.article_2, (0, 4, 1)),
+                                  (self.article_3, (0, 3, 1))):
+            article.refresh_from_db()
+            self.assertEqual(counters, (article.like_count, article.rating_sum, article.rating_count))
+        self.assertEqual('5.00', str(self.article_1.rating))
+
+        data = [{'article': self.article_1.id, 'like': False}, {'article': self.article_2.id, 'rating': 4}]
+        response = self.client.post(url, data=json.dumps(data), content_type='application/json')
+        self.assertEqual(['updated', 'unchanged'], [result['status'] for result in response.data])
+        self.article_1.refresh_from_db()
+        self.assertEqual(0, self.article_1.like_count)
+        self.assertEqual(3, ArticleRelation.objects.filter(user=self.user_2).count())
+
+        response = self.client.post(url, data=json.dumps({'article': 1}), content_type='application/json')
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+
+
+    def test_relation_favorites(self):
+        """ Тестирование избранного и лайков пользователя по времени отметки """
+        self.client.force_login(self.user_2)
+        for article, data in ((self.article_3, {'to_favorites': True}), (self.article_1, {'to_favorites': True}),
+                              (self.article_2, {'to_favorites': True, 'like': True}),
+                              (self.article_1, {'like': True, 'rating': 3})):
+            self.client.patch(reverse('articlerelation-detail', args=(article.id,)), data=json.dumps(data),
+                              content_type='application/json')
+        ArticleRelation.objects.create(user=self.user_1, article=self.article_3, to_favorites=True)
+
+        url = reverse('articlerelation-favorites')
+        response = self.client.get(url, data={'page_size': 2})
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual([self.article_2.id, self.article_1.id],
+                         [item['article']['id'] for item in response.data['results']])
+        self.assertEqual({'favorited_at', 'article'}, set(response.data['results'][0]))
+        self.assertNotIn('readers', response.data['results'][0]['article'])
+        self.assertEqual('test-2', response.data['results'][0]['article']['owner'])
+        response = self.client.get(response.data['next'])
+        self.assertEqual([self.article_3.id], [item['article']['id'] for item in response.data['results']])
+        self.assertIsNone(response.data['next'])
+
+        response = self.client.get(reverse('articlerelation-liked'))
+        self.assertEqual([self.article_1.id, self.article_2.id],
+                         [item['article']['id'] for item in response.data['results']])
+
+        """ Повторная отметка не меняет время, снятая и поставленная заново - поднимает статью """
+        relation_url = reverse('articlerelation-detail', args=(self.article_3.id,))
+        self.client.patch(relation_url, data=json.dumps({'to_favorites': True, 'rating': 5}),
+                          content_type='application/json')
+        response = self.client.get(url)
+        self.assertEqual([self.article_2.id, self.article_1.id, self.article_3.id],
+                         [item['article']['id'] for item in response.data['results']])
+        self.client.patch(relation_url, data=json.dumps({'to_favorites': False}), content_type='application/json')
+        self.assertIsNone(ArticleRelation.objects.get(user=self.user_2, article=self.article_3).favorited_at)
+        self.client.patch(relation_url, data=json.dumps({'to_favorites': True}), content_type='application/json')
+        response = self.client.get(url)
+        self.assertEqual([self.article_3.id, self.article_2.id, self.article_1.id],
+                         [item['article']['id'] for item in response.data['results']])
+
+        self.client.logout()
+        self.assertEqual(status.HTTP_403_FORBIDDEN, self.client.get(url).status_code)
+
+
+@override_settings(ASYNC_API_VIEWS=True)
+class TestAsyncApi(TransactionTestCase):
+    """ Асинхронные представления (ASYNC_API_VIEWS): тот же ответ, что и у синхронных """
+    def setUp(self):
+        self.category = Category.objects.create(title='category-1')
+        self.user = User.objects.create(username='test-1')
+        self.article_1 = Article.objects.create(title='article-1', category=self.category,
+                                                description='Article-description-1', owner=self.user)
+        self.article_2 = Article.objects.create(title='article-2', category=self.category,
+                                                description='Article-description-2', owner=self.user)
+
+    def tearDown(self):
+        """
+        Соединения потоков пула закрываются после каждого чтения. Оставшиеся закрываются
+        здесь, иначе тестовую базу не удалить, и тест считается проваленным
+        """
+        sql = 'SELECT pid FROM pg_stat_activity WHERE datname = current_database() AND pid <> pg_backend_pid()'
+        with connection.cursor() as cursor:
+            for _ in range(50):
+                cursor.execute(sql)
+                leaked = [pid for pid, in cursor.fetchall()]
+                if not leaked:
+                    break
+                time.sleep(0.02)
+            for pid in leaked:
+                cursor.execute('SELECT pg_terminate_backend(%s)', [pid])
+        self.assertEqual([], leaked)
+
+    async def test_article(self):
+        """ Список с поиском, сортировкой и одна статья """
+        factory = AsyncRequestFactory()
+        view = ArticleViewSet.as_view({'get': 'list'})
+        self.assertTrue(asyncio.iscoroutinefunction(view))
+        response = await view(factory.get('/api/article/?search=article-2'))
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual([self.article_2.id], [article['id'] for article in json.loads(response.content)['results']])
+
+        response = await view(factory.get('/api/article/?ordering=-title'))
+        self.assertEqual([self.article_2.id, self.article_1.id],
+                         [article['id'] for article in json.loads(response.content)['results']])
+
+        view = ArticleViewSet.as_view({'get': 'retrieve', 'delete': 'destroy'})
+        response = await view(factory.get(f'/api/article/{self.article_1.id}/'), pk=str(self.article_1.id))
+        self.assertEqual(self.article_1.title, json.loads(response.content)['title'])
+        self.assertTrue(response.has_header('ETag'))
+
+        response = await view(factory.delete(f'/api/article/{self.article_1.id}/'), pk=str(self.article_1.id))
+        self.assertEqual(status.HTTP_403_FORBIDDEN, response.status_code)
+
+    async def test_export(self):
+        """ Выгрузка читается из базы в потоке ответа, не в цикле событий, и отправляется по частям """
+        view = ArticleViewSet.as_view({'get': 'export'}, **ArticleViewSet.export.kwargs)
+        response = await view(AsyncRequestFactory().get('/api/article/export/?format=csv'))
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        messages = []
+
+        async def send(message):
+            messages.append(message)
+
+        await ASGIHandler().send_response(response, send)
+        self.assertEqual('http.response.start', messages[0]['type'])
+        self.assertFalse(messages[-1].get('more_body', False))
+        lines = b''.join(message.get('body', b'') for message in messages[1:]).decode().splitlines()
+        self.assertEqual(3, len(lines))
+        self.assertIn('article-2', lines[2])
+        self.assertTrue(response.closed)
+
+    async def test_streaming_first_chunk(self):
+        """ Первая часть потокового ответа отправляется до того, как прочитана следующая """
+        sent = threading.Event()
+        released = []
+
+        def content():
+            yield b'first'
+            released.append(sent.wait(5))
+            yield b'second'
+
+        response = await sync_to_async(run_view, thread_sensitive=False)(lambda request: StreamingHttpResponse(content()), None)
+
+        async def send(message):
+            if message.get('body') == b'first':
+                sent.set()
+
+        await ASGIHandler().send_response(response, send)
+        self.assertEqual([True], released)
+
+    async def test_metrics(self):
+        """ Показатели запроса при обработке через ASGI """
+        response = await self.async_client.get(f'/api/article/{self.article_1.id}/')
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertRegex(response['Server-Timing'], r'^db;desc="[1-9]\d* queries";dur=')
+
+    async def test_category(self):
+        view = CategoryViewSet.as_view({'get': 'list'})
+        response = await view(AsyncRequestFactory().get('/api/category/'))
+        self.assertEqual([{'id': self.category.id, 'title': 'category-1'}], json.loads(response.content))
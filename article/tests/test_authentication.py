@@ -0,0 +1,110 @@
+import json
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from article.authentication import get_token_user, get_user_ttl, issue_token, make_token
+from article.checks import check_api_cache
+from article.models import Category, Article
+
+
+class TestTokenAuthentication(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='test-1', password='password')
+        self.category = Category.objects.create(title='category-1')
+        self.article = Article.objects.create(title='article-1', category=self.category,
+                                              description='description-1', owner=self.user)
+
+    def authorize(self, user, token=None):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token or make_token(user)}')
+
+    def vote(self, data):
+        return self.client.patch(reverse('articlerelation-detail', args=(self.article.id,)),
+                                 data=json.dumps(data), content_type='application/json')
+
+    def test_no_auth_queries(self):
+        """ После первого запроса пользователь токена берётся из кэша: ни сессии, ни auth_user """
+        self.authorize(self.user)
+        self.assertEqual(status.HTTP_200_OK, self.vote({'like': True}).status_code)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.vote({'rating': 5})
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        sql = ' '.join(query['sql'] for query in queries.captured_queries)
+        self.assertNotIn(User._meta.db_table, sql)
+        self.assertNotIn('django_session', sql)
+
+        response = self.client.patch(reverse('article-detail', args=(self.article.id,)),
+                                     data=json.dumps({'title': 'article-1-changed'}), content_type='application/json')
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual('test-1', response.data['owner'])
+
+    def test_invalid_token(self):
+        valid = make_token(self.user)
+        for token in ('invalid', valid[:-1] + ('1' if valid.endswith('0') else '0')):
+            with self.subTest(token=token):
+                self.authorize(self.user, token)
+                self.assertEqual(status.HTTP_403_FORBIDDEN, self.vote({'like': True}).status_code)
+
+        self.authorize(self.user)
+        with self.settings(API_TOKEN_MAX_AGE=-1):
+            response = self.vote({'like': True})
+        self.assertEqual(status.HTTP_403_FORBIDDEN, response.status_code)
+        self.assertEqual('Token expired.', response.data['detail'])
+
+    def test_user_change(self):
+        """ Изменение пользователя сразу сбрасывает кэш: блокировка и права администратора """
+        self.authorize(self.user)
+        response = self.client.post(reverse('category-list'), data={'title': 'category-2'}, format='json')
+        self.assertEqual(status.HTTP_403_FORBIDDEN, response.status_code)
+
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.post(reverse('category-list'), data={'title': 'category-2'}, format='json')
+        self.assertEqual(status.HTTP_201_CREATED, response.status_code)
+
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(status.HTTP_403_FORBIDDEN, self.vote({'like': True}).status_code)
+
+    def test_user_ttl(self):
+        """ Кэш API не общий для процессов: пользователь хранится не дольше срока кэша процесса """
+        caches = {'api': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'api'}}
+        with self.settings(CACHES=caches, API_CACHE_ALIAS='api', API_TOKEN_USER_TTL=300, API_TOKEN_USER_LOCAL_TTL=10):
+            self.assertEqual(10, get_user_ttl())
+            self.assertEqual(['article.W001'], [message.id for message in check_api_cache(None)])
+        caches['api']['BACKEND'] = 'django.core.cache.backends.memcached.PyMemcacheCache'
+        with self.settings(CACHES=caches, API_CACHE_ALIAS='api', API_TOKEN_USER_TTL=300):
+            self.assertEqual(300, get_user_ttl())
+            self.assertEqual([], check_api_cache(None))
+
+    def test_token_user_save(self):
+        """ Пользователь токена загружен частично: save() не затирает остальные поля """
+        user = get_token_user(self.user.pk)
+        self.assertEqual(('test-1', False), (user.username, user.is_staff))
+        user.save()
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('password'))
+
+    def test_issue_token(self):
+        """ Токен выдаётся по сессии или паролю и после входа через GitHub (SOCIAL_AUTH_PIPELINE) """
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('api-token'))
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.client.logout()
+        self.authorize(self.user, response.data['token'])
+        self.assertEqual(status.HTTP_200_OK, self.vote({'like': True}).status_code)
+
+        strategy = mock.Mock()
+        issue_token(strategy, user=self.user)
+        name, token = strategy.session_set.call_args[0]
+        self.assertEqual('api_token', name)
+        self.authorize(self.user, token)
+        self.assertEqual(status.HTTP_200_OK, self.vote({'like': False}).status_code)
+
+        self.client.credentials()
+        self.assertEqual(status.HTTP_403_FORBIDDEN, self.client.post(reverse('api-token')).status_code)
@@ -0,0 +1,110 @@
+from itertools import chain
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from article.logic import get_counters_drift
+from article.models import Category, Article, ArticleRelation
+from article.pagination import KeysetCursorPagination
+from article.views import ArticleViewSet
+
+
+class TestIndexes(TestCase):
+    """
+    EXPLAIN запросов ArticleViewSet для всех filter_fields и ordering_fields
+    на большом наборе данных: ни один не должен читать статьи или связи
+    последовательным сканированием таблицы
+    """
+    articles = 20000
+    users = 200
+    categories = 50
+    readers = 5
+    tables = (Article._meta.db_table, ArticleRelation._meta.db_table)
+
+    @classmethod
+    def setUpTestData(cls):
+        with connection.cursor() as cursor:
+            cursor.execute(f"""
+                INSERT INTO {User._meta.db_table} (username, password, first_name, last_name, email,
+                                                   is_superuser, is_staff, is_active, date_joined)
+                SELECT 'user-' || i, '', '', '', '', false, false, true, now()
+                FROM generate_series(1, %s) AS i
+            """, [cls.users])
+            cursor.execute(f"""
+                INSERT INTO {Category._meta.db_table} (title, updated_at)
+                SELECT 'category-' || i, now() FROM generate_series(1, %s) AS i
+            """, [cls.categories])
+            cursor.execute(f"""
+                INSERT INTO {Article._meta.db_table} (
+                    title, category_id, description, date_of_publication, owner_id, updated_at,
+                    rating_sum, rating_count, like_count, readers_count
+                )
+                SELECT 'article-' || i, (SELECT min(id) FROM {Category._meta.db_table}) + i %% %s,
+                       'description-' || i, now() - i * interval '1 minute',
+                       (SELECT min(id) FROM {User._meta.db_table}) + i %% %s, now(), 0, 0, 0, 0
+                FROM generate_series(1, %s) AS i
+            """, [cls.categories, cls.users, cls.articles])
+            cursor.execute(f"""
+                INSERT INTO {ArticleRelation._meta.db_table} (user_id, article_id, "like", to_favorites, rating)
+                SELECT (SELECT min(id) FROM {User._meta.db_table}) + (article.id + k) %% %s, article.id,
+                       k %% 2 = 0, k = 1, NULLIF(k, 5)
+                FROM {Article._meta.db_table} AS article, generate_series(1, %s) AS k
+            """, [cls.users, cls.readers])
+            for table in chain(cls.tables, (User._meta.db_table, Category._meta.db_table)):
+                cursor.execute(f'ANALYZE {table}')
+
+        article = Article.objects.select_related('category', 'owner').order_by('id')[cls.articles // 2]
+        cls.article = article
+        cls.filter_values = {
+            'category': article.category_id,
+            'category__title': article.category.title,
+            'date_of_publication': article.date_of_publication.isoformat(),
+            'owner': article.owner_id,
+            'owner__username': article.owner.username,
+        }
+
+    def get_list_queryset(self, params):
+        """ Запрос страницы списка статей так, как его строит ArticleViewSet.list """
+        view = ArticleViewSet(action_map={'get': 'list'}, kwargs={}, format_kwarg=None)
+        view.request = view.initialize_request(APIRequestFactory().get('/api/article/', params))
+        queryset = view.filter_queryset(view.get_queryset())
+        return KeysetCursorPagination().get_page_queryset(queryset, view.request)
+
+    def assertNoSeqScan(self, queryset, params=None):
+        plan = queryset.explain()
+        for table in self.tables:
+            self.assertNotIn(f'Seq Scan on {table}', plan, f'{params}\n{plan}')
+
+    def test_filter_fields(self):
+        """ Каждый фильтр ArticleViewSet с сортировкой по умолчанию """
+        self.assertEqual(set(ArticleViewSet.filter_fields), set(self.filter_values))
+        for field, value in self.filter_values.items():
+            with self.subTest(field=field):
+                params = {field: value}
+                self.assertNoSeqScan(self.get_list_queryset(params), params)
+
+    def test_ordering_fields(self):
+        """ Каждая сортировка ArticleViewSet в обе стороны, без фильтра и с каждым фильтром """
+        for field in ArticleViewSet.ordering_fields:
+            for ordering in (field, f'-{field}'):
+                for filters in chain([{}], ({name: value} for name, value in self.filter_values.items())):
+                    params = {'ordering': ordering, **filters}
+                    with self.subTest(**params):
+                        self.assertNoSeqScan(self.get_list_queryset(params), params)
+
+    def test_relations(self):
+        """ Читатели статьи и пересчёт счётчиков одной статьи """
+        self.assertNoSeqScan(ArticleRelation.objects.filter(article=self.article).order_by('id')[:21])
+        self.assertNoSeqScan(get_counters_drift(Article.objects.filter(pk=self.article.pk)))
+
+    def test_marked(self):
+        """ Страницы избранного и лайков пользователя """
+        request = Request(APIRequestFactory().get('/api/relation/favorites/'))
+        for marked, marked_at in (('to_favorites', 'favorited_at'), ('like', 'liked_at')):
+            with self.subTest(marked=marked):
+                queryset = ArticleRelation.objects.filter(user=self.article.owner_id, **{marked: True}).select_related(
+                    'article__owner').order_by(f'-{marked_at}', '-id')
+                self.assertNoSeqScan(KeysetCursorPagination().get_page_queryset(queryset, request))
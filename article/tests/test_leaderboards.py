@@ -0,0 +1,110 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from article.leaderboards import LEADERBOARD_SIZE, refresh_leaderboards
+from article.models import Category, Article, ArticleRelation, LeaderboardDirty, LeaderboardEntry
+
+
+class TestLeaderboards(APITestCase):
+    def setUp(self):
+        self.category_1 = Category.objects.create(title='category-1')
+        self.category_2 = Category.objects.create(title='category-2')
+        self.users = User.objects.bulk_create(User(username=f'user-{index}') for index in range(4))
+        self.article_1 = Article.objects.create(title='article-1', category=self.category_1, owner=self.users[0])
+        self.article_2 = Article.objects.create(title='article-2', category=self.category_1, owner=self.users[0])
+        self.article_3 = Article.objects.create(title='article-3', category=self.category_2, owner=self.users[1])
+        self.article_4 = Article.objects.create(title='article-4', category=self.category_2, owner=self.users[1])
+        """ article-1: две пятёрки и лайк, article-2: лайки с тройками, article-3: лайки без оценок """
+        for user in self.users[:2]:
+            ArticleRelation.objects.create(user=user, article=self.article_1, rating=5)
+        ArticleRelation.objects.filter(user=self.users[0], article=self.article_1).update(like=True)
+        for user in self.users[:3]:
+            ArticleRelation.objects.create(user=user, article=self.article_2, like=True, rating=3)
+            ArticleRelation.objects.create(user=user, article=self.article_3, like=True)
+
+    def get_board(self, board, category=None):
+        return [(entry.article_id, entry.position) for entry in
+                LeaderboardEntry.objects.filter(board=board, category=category).order_by('position')]
+
+    def test_full_refresh(self):
+        """ Тест полного обновления рейтингов по категориям и общих """
+        self.assertEqual(3, refresh_leaderboards(full=True))
+        self.assertEqual(0, LeaderboardDirty.objects.count())
+        self.assertEqual([(self.article_1.id, 1), (self.article_2.id, 2)],
+                         self.get_board(LeaderboardEntry.TOP, self.category_1))
+        self.assertEqual([(self.article_3.id, 1)], self.get_board(LeaderboardEntry.TOP, self.category_2))
+        self.assertEqual([self.article_1.id, self.article_3.id, self.article_2.id],
+                         [article for article, _ in self.get_board(LeaderboardEntry.TOP)])
+
+        """ trending: лайки за неделю с учётом оценки, за пределами окна - пусто """
+        self.assertEqual([self.article_3.id, self.article_2.id, self.article_1.id],
+                         [article for article, _ in self.get_board(LeaderboardEntry.TRENDING)])
+        refresh_leaderboards(full=True, now=timezone.now() + timedelta(days=8))
+        self.assertEqual([], self.get_board(LeaderboardEntry.TRENDING))
+        self.assertEqual(3, len(self.get_board(LeaderboardEntry.TOP)))
+
+    def test_incremental_refresh(self):
+        """ Тест частичного обновления по статьям, изменённым голосами """
+        refresh_leaderboards(full=True)
+        for user in self.users:
+            ArticleRelation.objects.create(user=user, article=self.article_4, like=True, rating=5)
+        self.article_4.category = self.category_1
+        self.article_4.save()
+        self.article_1.title = 'article-1-changed'
+        self.article_1.save()
+        self.assertEqual({self.article_4.id}, set(LeaderboardDirty.objects.values_list('article_id', flat=True)))
+
+        out = StringIO()
+        call_command('refresh_leaderboards', stdout=out)
+        self.assertIn('изменённых статей: 1', out.getvalue())
+        self.assertEqual([self.article_4.id, self.article_1.id, self.article_2.id],
+                         [article for article, _ in self.get_board(LeaderboardEntry.TOP, self.category_1)])
+        self.assertEqual([(self.article_3.id, 1)], self.get_board(LeaderboardEntry.TOP, self.category_2))
+        self.assertEqual(self.article_4.id, self.get_board(LeaderboardEntry.TRENDING)[0][0])
+
+        """ Статья без голосов выбывает из рейтинга """
+        ArticleRelation.objects.filter(article=self.article_3).delete()
+        self.assertEqual(1, refresh_leaderboards())
+        self.assertEqual([], self.get_board(LeaderboardEntry.TOP, self.category_2))
+
+    def test_api(self):
+        """ Тест /api/article/trending/ и /api/category/{id}/top/ """
+        refresh_leaderboards(full=True)
+        response = self.client.get(reverse('article-trending'))
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual([1, 2, 3], [entry['position'] for entry in response.data])
+        self.assertEqual({'id': self.article_3.id, 'title': 'article-3', 'owner': 'user-1'},
+                         {field: response.data[0]['article'][field] for field in ('id', 'title', 'owner')})
+        response = self.client.get(reverse('article-trending'), data={'category': self.category_1.id})
+        self.assertEqual([self.article_2.id, self.article_1.id], [entry['article']['id'] for entry in response.data])
+        response = self.client.get(reverse('article-trending'), data={'category': 'x'})
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+
+        url = reverse('category-top', args=(self.category_1.id,))
+        self.assertEqual([self.article_1.id, self.article_2.id],
+                         [entry['article']['id'] for entry in self.client.get(url).data])
+        self.assertEqual(status.HTTP_404_NOT_FOUND, self.client.get(reverse('category-top', args=(0,))).status_code)
+
+        """ Удалённая статья не выводится до следующего обновления """
+        self.article_1.delete()
+        self.assertEqual([self.article_2.id], [entry['article']['id'] for entry in self.client.get(url).data])
+
+    def test_size(self):
+        """ Выводится не больше LEADERBOARD_SIZE статей """
+        articles = Article.objects.bulk_create(
+            Article(title=f'bulk-{index}', category=self.category_2, owner=self.users[0])
+            for index in range(LEADERBOARD_SIZE + 5)
+        )
+        ArticleRelation.objects.bulk_create(
+            ArticleRelation(user=self.users[0], article=article, like=True) for article in articles)
+        Article.objects.filter(pk__in=[article.pk for article in articles]).update(like_count=1)
+        refresh_leaderboards(full=True)
+        response = self.client.get(reverse('category-top', args=(self.category_2.id,)))
+        self.assertEqual(LEADERBOARD_SIZE, len(response.data))
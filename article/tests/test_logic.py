@@ -1,7 +1,20 @@
-from django.test import TestCase
+import threading
+import time
+from io import StringIO
+
+from django.core.management import call_command, CommandError
+from django.db import connection, connections, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth.models import User
 
-from article.models import Category, Article, ArticleRelation
+from article.logic import (
+    bulk_update_relations, flush_category_stats, flush_counters, rebuild_category_stats, upsert_relation
+)
+from article.models import (
+    Category, CategoryStats, CategoryStatsDelta, Article, ArticleCounterDelta, ArticleRelation
+)
+from article.workers import stop_counters_worker
 
 
 class GetRatingTestCase(TestCase):
@@ -21,3 +34,290 @@ class GetRatingTestCase(TestCase):
         self.article_relation_1.rating = 4
         self.article_relation_1.save()
         self.assertEqual(4.50, self.article_1.rating)
+
+    def test_rating_counters(self):
+        """ Тестирование счётчиков рейтинга """
+        self.assertEqual((8, 2), (self.article_1.rating_sum, self.article_1.rating_count))
+
+        """ Снятие оценки """
+        self.article_relation_2.rating = None
+        self.article_relation_2.save()
+        self.assertEqual((3, 1), (self.article_1.rating_sum, self.article_1.rating_count))
+        self.assertEqual(3, self.article_1.rating)
+
+        """ Повторное сохранение без изменений не меняет счётчики """
+        self.article_relation_2.save()
+        self.article_1.refresh_from_db()
+        self.assertEqual((3, 1), (self.article_1.rating_sum, self.article_1.rating_count))
+
+        """ Удаление связи """
+        self.article_relation_1.delete()
+        self.article_1.refresh_from_db()
+        self.assertEqual((0, 0), (self.article_1.rating_sum, self.article_1.rating_count))
+        self.assertIsNone(self.article_1.rating)
+
+    def test_rebuild_counters(self):
+        """ Тестирование команды пересчёта счётчиков """
+        Article.objects.filter(pk=self.article_1.pk).update(rating_sum=100, rating_count=1, rating=None)
+        call_command('rebuild_counters', stdout=StringIO())
+        self.article_1.refresh_from_db()
+        self.assertEqual((8, 2), (self.article_1.rating_sum, self.article_1.rating_count))
+        self.assertEqual(4, self.article_1.rating)
+
+    def test_like_counter(self):
+        """ Тестирование счётчика лайков """
+        self.assertEqual(0, self.article_1.like_count)
+        self.article_relation_1.like = True
+        self.article_relation_1.save()
+        self.assertEqual(1, self.article_1.like_count)
+        self.article_relation_1.delete()
+        self.article_1.refresh_from_db()
+        self.assertEqual(0, self.article_1.like_count)
+
+    def test_bulk_counters(self):
+        """ Тестирование счётчиков при массовых операциях """
+        user_3 = User.objects.create(username='user-3')
+        article_2 = Article.objects.create(title='article-2', category=self.category_2, owner=self.user_1)
+        ArticleRelation.objects.bulk_create([
+            ArticleRelation(article=article_2, user=self.user_1, like=True, rating=1),
+            ArticleRelation(article=article_2, user=user_3, like=True),
+        ])
+        ArticleRelation.objects.filter(article=self.article_1).update(like=True, rating=2)
+        relations = list(ArticleRelation.objects.filter(user=self.user_1).order_by('pk'))
+        for relation in relations:
+            relation.rating = 5
+        ArticleRelation.objects.bulk_update(relations, ['rating'])
+        ArticleRelation.objects.filter(user=user_3).delete()
+
+        out = StringIO()
+        call_command('rebuild_counters', check=True, stdout=out)
+        self.assertIn('Расхождений нет', out.getvalue())
+        self.article_1.refresh_from_db()
+        article_2.refresh_from_db()
+        self.assertEqual((2, 7, 2), (self.article_1.like_count, self.article_1.rating_sum, self.article_1.rating_count))
+        self.assertEqual((1, 5, 1), (article_2.like_count, article_2.rating_sum, article_2.rating_count))
+
+    def test_save_keeps_counters(self):
+        """ Сохранение статьи с устаревшими значениями не перезаписывает счётчики """
+        article = Article.objects.get(pk=self.article_1.pk)
+        ArticleRelation.objects.create(article=self.article_1, user=User.objects.create(username='user-3'), like=True)
+        article.title = 'article-1-changed'
+        article.save()
+        article.refresh_from_db()
+        self.assertEqual(('article-1-changed', 1, 3), (article.title, article.like_count, article.readers_count))
+
+    def test_check_counters(self):
+        """ Тестирование команды проверки счётчиков """
+        Article.objects.filter(pk=self.article_1.pk).update(like_count=10)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_counters', check=True, stdout=StringIO())
+        call_command('rebuild_counters', self.article_1.pk, stdout=StringIO())
+        call_command('rebuild_counters', check=True, stdout=StringIO())
+
+    @override_settings(ARTICLE_COUNTERS_MODE='queue', ARTICLE_COUNTERS_WORKER='command')
+    def test_counters_queue(self):
+        """ Тестирование отложенного изменения счётчиков """
+        self.article_relation_1.like = True
+        self.article_relation_1.rating = 5
+        self.article_relation_1.save()
+        ArticleRelation.objects.create(article=self.article_1, user=User.objects.create(username='user-3'), rating=2)
+        self.article_relation_2.delete()
+        self.article_1.refresh_from_db()
+        self.assertEqual((0, 8, 2, 2), (self.article_1.like_count, self.article_1.rating_sum,
+                                        self.article_1.rating_count, self.article_1.readers_count))
+        self.assertEqual(3, ArticleCounterDelta.objects.count())
+
+        self.assertEqual(3, flush_counters(batch_size=2))
+        self.article_1.refresh_from_db()
+        self.assertEqual((1, 7, 2, 2), (self.article_1.like_count, self.article_1.rating_sum,
+                                        self.article_1.rating_count, self.article_1.readers_count))
+        self.assertEqual('3.50', str(self.article_1.rating))
+        self.assertFalse(ArticleCounterDelta.objects.exists())
+
+        self.article_relation_1.like = False
+        self.article_relation_1.save()
+        call_command('rebuild_counters', stdout=StringIO())
+        self.assertFalse(ArticleCounterDelta.objects.exists())
+        self.article_1.refresh_from_db()
+        self.assertEqual(0, self.article_1.like_count)
+
+
+class CategoryStatsTestCase(TestCase):
+    def setUp(self):
+        self.category_1 = Category.objects.create(title='Category-1')
+        self.category_2 = Category.objects.create(title='Category-2')
+        self.users = [User.objects.create(username=f'user-{index}') for index in range(3)]
+        self.articles = [
+            Article.objects.create(title=f'article-{index}', category=self.category_1, owner=self.users[0])
+            for index in range(3)
+        ]
+
+    def get_stats(self):
+        return {
+            stats.category_id: (stats.article_count, stats.like_count, stats.rating_sum, stats.rating_count)
+            for stats in CategoryStats.objects.all()
+        }
+
+    def test_category_stats(self):
+        """ Сводные данные категорий после изменений совпадают с полным пересчётом """
+        for index, user in enumerate(self.users):
+            ArticleRelation.objects.create(article=self.articles[0], user=user, like=bool(index % 2), rating=index + 1)
+        ArticleRelation.objects.bulk_create([
+            ArticleRelation(article=self.articles[1], user=user, like=True, rating=5) for user in self.users
+        ])
+        ArticleRelation.objects.filter(article=self.articles[1], user=self.users[0]).update(rating=None)
+        """ Голоса ждут в очереди категорий, TestCase не выполняет on_commit """
+        self.assertEqual({self.category_1.id: (3, 0, 0, 0)}, self.get_stats())
+        self.assertEqual(5, flush_category_stats())
+        self.assertEqual({self.category_1.id: (3, 4, 16, 5)}, self.get_stats())
+
+        self.articles[1].category = self.category_2
+        self.articles[1].save()
+        self.articles[0].delete()
+        Article.objects.create(title='article-3', category=self.category_2, owner=self.users[1])
+        ArticleRelation.objects.filter(user=self.users[2]).delete()
+        with override_settings(ARTICLE_COUNTERS_MODE='queue', ARTICLE_COUNTERS_WORKER='command'):
+            """ Очередь категорий применяется и вместе с отложенными счётчиками """
+            ArticleRelation.objects.create(article=self.articles[2], user=self.users[0], like=True, rating=4)
+            flush_counters()
+
+        incremental = self.get_stats()
+        self.assertEqual({self.category_1.id: (1, 1, 4, 1), self.category_2.id: (2, 2, 5, 1)}, incremental)
+        CategoryStats.objects.update(article_count=0, like_count=0, rating_sum=0, rating_count=0)
+        call_command('rebuild_category_stats', stdout=StringIO())
+        self.assertEqual(incremental, self.get_stats())
+        self.assertEqual('5.00', str(CategoryStats.objects.get(category=self.category_2).rating))
+
+    @override_settings(ARTICLE_COUNTERS_MODE='queue', ARTICLE_COUNTERS_WORKER='command')
+    def test_category_stats_queue(self):
+        """ Пакет изменений статей одной категории изменяет её сводные данные одним UPDATE """
+        for article in self.articles:
+            for user in self.users:
+                ArticleRelation.objects.create(article=article, user=user, like=True, rating=4)
+        self.assertEqual({self.category_1.id: (3, 0, 0, 0)}, self.get_stats())
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(9, flush_counters())
+        """ Пакет статей и пустая очередь категорий: построчный триггер не добавил в неё строк """
+        self.assertEqual(2, sum(CategoryStats._meta.db_table in query['sql'] for query in queries))
+        self.assertFalse(CategoryStatsDelta.objects.exists())
+        self.assertEqual({self.category_1.id: (3, 9, 36, 9)}, self.get_stats())
+
+        """ После пакета триггер снова добавляет изменения счётчиков в очередь категорий """
+        with override_settings(ARTICLE_COUNTERS_MODE='inline'):
+            ArticleRelation.objects.filter(article=self.articles[0], user=self.users[0]).delete()
+        self.assertEqual(1, flush_category_stats())
+        self.assertEqual({self.category_1.id: (3, 8, 32, 8)}, self.get_stats())
+
+
+class CategoryStatsConcurrencyTestCase(TransactionTestCase):
+    def setUp(self):
+        self.category = Category.objects.create(title='Category-1')
+        self.users = [User.objects.create(username=f'user-{index}') for index in range(2)]
+        self.articles = [
+            Article.objects.create(title=f'article-{index}', category=self.category, owner=self.users[0])
+            for index in range(2)
+        ]
+
+    def test_concurrent_votes(self):
+        """ Голос за статью категории не ждёт незавершённой транзакции голоса за другую её статью """
+        started, release = threading.Event(), threading.Event()
+
+        def vote():
+            try:
+                with transaction.atomic():
+                    ArticleRelation.objects.create(article=self.articles[0], user=self.users[0], like=True, rating=5)
+                    started.set()
+                    release.wait(10)
+            finally:
+                connections.close_all()
+
+        thread = threading.Thread(target=vote)
+        thread.start()
+        try:
+            self.assertTrue(started.wait(10))
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    cursor.execute("SET LOCAL lock_timeout = '2s'")
+                ArticleRelation.objects.create(article=self.articles[1], user=self.users[1], like=True, rating=3)
+        finally:
+            release.set()
+            thread.join()
+
+        """ Обе очереди применены после фиксации голосов """
+        stats = CategoryStats.objects.get(category=self.category)
+        self.assertEqual((2, 2, 8, 2), (stats.article_count, stats.like_count, stats.rating_sum, stats.rating_count))
+        self.assertFalse(CategoryStatsDelta.objects.exists())
+
+
+class BulkRelationsConcurrencyTestCase(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='user-1')
+        category = Category.objects.create(title='Category-1')
+        self.articles = [
+            Article.objects.create(title=f'article-{index}', category=category, owner=self.user) for index in range(2)
+        ]
+
+    def test_concurrent_insert(self):
+        """
+        Связь, вставленная параллельной транзакцией после блокировки существующих
+        связей пакета и до его вставки, изменяется пакетом без IntegrityError
+        """
+        inserted = threading.Event()
+
+        def insert():
+            try:
+                with transaction.atomic():
+                    upsert_relation(self.user.id, self.articles[0].id, {'like': True})
+                    inserted.set()
+                    """ Фиксация после того, как пакет ждёт эту строку на уникальном индексе """
+                    with connection.cursor() as cursor:
+                        for _ in range(250):
+                            cursor.execute("""
+                                SELECT count(*) FROM pg_stat_activity
+                                WHERE datname = current_database() AND wait_event_type = 'Lock'
+                            """)
+                            if cursor.fetchone()[0]:
+                                break
+                            time.sleep(0.02)
+            finally:
+                connections.close_all()
+
+        thread = threading.Thread(target=insert)
+        thread.start()
+        try:
+            self.assertTrue(inserted.wait(10))
+            results = bulk_update_relations(self.user, [
+                {'article': self.articles[0].id, 'rating': 4},
+                {'article': self.articles[1].id, 'like': True},
+            ])
+        finally:
+            thread.join()
+
+        self.assertEqual({self.articles[0].id: 'updated', self.articles[1].id: 'created'},
+                         {article_id: status for article_id, (status, _) in results.items()})
+        relation = ArticleRelation.objects.get(user=self.user, article=self.articles[0])
+        self.assertEqual((True, 4), (relation.like, relation.rating))
+        for article, counters in zip(self.articles, ((1, 1, 4, 1), (1, 1, 0, 0))):
+            article.refresh_from_db()
+            self.assertEqual(counters,
+                             (article.readers_count, article.like_count, article.rating_sum, article.rating_count))
+
+
+@override_settings(ARTICLE_COUNTERS_MODE='queue', ARTICLE_COUNTERS_WORKER='thread',
+                   ARTICLE_COUNTERS_FLUSH_INTERVAL=0.05)
+class CountersWorkerTestCase(TransactionTestCase):
+    def tearDown(self):
+        stop_counters_worker()
+
+    def test_counters_worker(self):
+        """ Тестирование потока применения отложенных изменений счётчиков """
+        article = Article.objects.create(title='article-1', category=Category.objects.create(title='Category-1'))
+        ArticleRelation.objects.create(article=article, user=User.objects.create(username='user-1'),
+                                       like=True, rating=4)
+        for _ in range(100):
+            article.refresh_from_db()
+            if article.readers_count:
+                break
+            time.sleep(0.05)
+        self.assertEqual((1, 1, 4), (article.readers_count, article.like_count, article.rating_sum))
+        self.assertEqual(4, article.rating)
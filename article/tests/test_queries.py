@@ -0,0 +1,174 @@
+import json
+from itertools import count
+
+from django.contrib.auth.models import User
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from article.authentication import get_token_user, make_token
+from article.filters import has_trigram
+from article.leaderboards import refresh_leaderboards
+from article.models import Category, Article, ArticleRelation
+from article.tests.mixins import QueryBudgetMixin
+from conf.urls import router
+
+
+@override_settings(API_TOKEN_USER_LOCAL_TTL=3600)
+class TestQueryBudget(QueryBudgetMixin, APITestCase):
+    """
+    Бюджет SQL-запросов каждого действия ArticleViewSet, CategoryViewSet и ArticleRelationViewSet.
+    Вход по токену API, пользователь уже в кэше: запросов аутентификации нет
+    """
+
+    def setUp(self):
+        self.admin = User.objects.create(username='budget-admin', is_staff=True)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {make_token(self.admin)}')
+        get_token_user(self.admin.pk)
+        """ Проверка pg_trgm выполняется раз в TRIGRAM_CHECK_INTERVAL """
+        has_trigram(Article.objects.db)
+        self.grow(1)
+        self.article = Article.objects.order_by('id').first()
+        self.category = self.article.category
+
+    def send(self, method, url, data):
+        return getattr(self.client, method)(url, data=json.dumps(data), content_type='application/json')
+
+    def test_all_actions(self):
+        """ У каждого действия зарегистрированных представлений есть тест бюджета """
+        for prefix, viewset, basename in router.registry:
+            for route in router.get_routes(viewset):
+                for action in router.get_method_map(viewset, route.mapping).values():
+                    with self.subTest(basename=basename, action=action):
+                        self.assertTrue(hasattr(self, f'test_{basename}_{action}'))
+
+    def test_article_list(self):
+        url, owner = reverse('article-list'), self.article.owner.username
+        self.assertQueryBudget(2, lambda: self.client.get(url))
+        self.assertQueryBudget(3, lambda: self.client.get(url, data={'category': self.category.id}))
+        self.assertQueryBudget(2, lambda: self.client.get(url, data={'owner__username': owner}))
+        self.assertQueryBudget(2, lambda: self.client.get(url, data={'search': 'budget'}))
+        self.assertQueryBudget(2, lambda: self.client.get(url, data={'ordering': '-category__title'}))
+        self.assertQueryBudget(3, lambda: self.client.get(url, data={'mine': 'true'}))
+
+    def test_article_retrieve(self):
+        url = reverse('article-detail', args=(self.article.id,))
+        self.assertQueryBudget(3, lambda: self.client.get(url))
+        self.assertQueryBudget(3, lambda: self.client.get(url, data={'mine': 'true'}))
+
+    def test_article_trending(self):
+        url = reverse('article-trending')
+        self.assertQueryBudget(1, lambda _: self.client.get(url), lambda: refresh_leaderboards(full=True))
+        self.assertQueryBudget(1, lambda _: self.client.get(url, data={'category': self.category.id}),
+                               lambda: refresh_leaderboards(full=True))
+
+    def test_article_export(self):
+        url = reverse('article-export')
+        self.assertQueryBudget(1, lambda: self.client.get(url, data={'format': 'csv'}))
+
+    def test_article_readers(self):
+        url = reverse('article-readers', args=(self.article.id,))
+        self.assertQueryBudget(2, lambda: self.client.get(url))
+
+    def test_article_create(self):
+        data = {'title': 'budget-article', 'category': self.category.id, 'description': 'budget'}
+        self.assertQueryBudget(3, lambda: self.send('post', reverse('article-list'), data))
+
+    def test_article_update(self):
+        url = reverse('article-detail', args=(self.article.id,))
+        data = {'title': 'budget-article', 'category': self.category.id, 'description': 'budget'}
+        self.assertQueryBudget(4, lambda: self.send('put', url, data))
+
+    def test_article_partial_update(self):
+        url = reverse('article-detail', args=(self.article.id,))
+        self.assertQueryBudget(3, lambda: self.send('patch', url, {'title': 'budget-article'}))
+
+    def test_article_destroy(self):
+        """ Удаляемая статья прочитана всеми пользователями: связи удаляются одним запросом """
+        def prepare():
+            article = Article.objects.create(title='budget-delete', category=self.category, owner=self.admin)
+            ArticleRelation.objects.bulk_create(ArticleRelation(article=article, user=user, like=True, rating=5)
+                                                for user in User.objects.all())
+            return article
+        """ Включая SAVEPOINT/RELEASE транзакции удаления внутри транзакции теста """
+        self.assertQueryBudget(
+            6, lambda article: self.client.delete(reverse('article-detail', args=(article.id,))), prepare
+        )
+
+    def test_category_list(self):
+        url = reverse('category-list')
+        self.assertQueryBudget(2, lambda: self.client.get(url))
+        self.assertQueryBudget(1, lambda: self.client.get(url, data={'stats': 'true', 'ordering': '-title'}))
+
+    def test_category_retrieve(self):
+        url = reverse('category-detail', args=(self.category.id,))
+        self.assertQueryBudget(2, lambda: self.client.get(url))
+        self.assertQueryBudget(1, lambda: self.client.get(url, data={'stats': 'true'}))
+
+    def test_category_stats(self):
+        url = reverse('category-stats', args=(self.category.id,))
+        self.assertQueryBudget(1, lambda: self.client.get(url))
+
+    def test_category_top(self):
+        url = reverse('category-top', args=(self.category.id,))
+        self.assertQueryBudget(2, lambda _: self.client.get(url), lambda: refresh_leaderboards(full=True))
+
+    def test_category_create(self):
+        titles = count()
+        self.assertQueryBudget(
+            2, lambda: self.send('post', reverse('category-list'), {'title': f'budget-create-{next(titles)}'})
+        )
+
+    def test_category_update(self):
+        url = reverse('category-detail', args=(self.category.id,))
+        self.assertQueryBudget(3, lambda: self.send('put', url, {'title': 'budget-category'}))
+
+    def test_category_partial_update(self):
+        url = reverse('category-detail', args=(self.category.id,))
+        self.assertQueryBudget(3, lambda: self.send('patch', url, {'title': 'budget-category'}))
+
+    def test_category_destroy(self):
+        def prepare():
+            return Category.objects.create(title='budget-delete')
+        self.assertQueryBudget(
+            4, lambda category: self.client.delete(reverse('category-detail', args=(category.id,))), prepare
+        )
+
+    def create_article(self):
+        """ Статья без связи с пользователем: голос создаёт связь """
+        return Article.objects.create(title='budget-vote', category=self.category, owner=self.admin)
+
+    def test_articlerelation_update(self):
+        def request(article):
+            data = {'article': article.id, 'like': True, 'to_favorites': False, 'rating': 4}
+            return self.send('put', reverse('articlerelation-detail', args=(article.id,)), data)
+        self.assertQueryBudget(5, request, self.create_article)
+
+    def test_articlerelation_partial_update(self):
+        def request(article):
+            return self.send('patch', reverse('articlerelation-detail', args=(article.id,)), {'rating': 2})
+        self.assertQueryBudget(4, request, self.create_article)
+
+    def test_articlerelation_bulk(self):
+        """ Счётчики статей изменяются отдельным UPDATE для каждой статьи пакета """
+        def prepare():
+            return [self.create_article().id for _ in range(3)]
+        def request(articles):
+            data = [{'article': article, 'like': True, 'rating': 5} for article in articles]
+            return self.send('post', reverse('articlerelation-bulk'), data)
+        self.assertQueryBudget(10, request, prepare)
+
+    def mark_articles(self):
+        """ Все статьи - в избранном и с лайком администратора """
+        ArticleRelation.objects.bulk_create(
+            ArticleRelation(user=self.admin, article=article, like=True, to_favorites=True)
+            for article in Article.objects.exclude(articlerelation__user=self.admin)
+        )
+
+    def test_articlerelation_favorites(self):
+        url = reverse('articlerelation-favorites')
+        self.assertQueryBudget(1, lambda _: self.client.get(url), self.mark_articles)
+
+    def test_articlerelation_liked(self):
+        url = reverse('articlerelation-liked')
+        self.assertQueryBudget(1, lambda _: self.client.get(url), self.mark_articles)
@@ -0,0 +1,121 @@
+import json
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.db import connections
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+
+from article.cache import get_cache
+from article.filters import _trigram
+from article.models import Category, Article
+from conf.db import DatabaseRoutingMiddleware, check_connections
+
+
+@override_settings(DATABASE_REPLICAS=['replica'], DATABASE_PRIMARY_PIN_SECONDS=5)
+class TestDatabaseRouting(TransactionTestCase):
+    """ Чтение с реплики (в тестах - зеркало default), запись и чтение после записи - с default """
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        self.user = User.objects.create(username='test-1')
+        self.category = Category.objects.create(title='category-1')
+        self.article = Article.objects.create(title='article-1', category=self.category,
+                                              description='description-1', owner=self.user)
+        get_cache().clear()
+
+    def request(self, method, url, **kwargs):
+        """ Ответ и количество запросов к default и replica """
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections['replica']) as replica:
+            response = getattr(self.client, method)(url, **kwargs)
+        return response, len(primary), len(replica)
+
+    def test_reads(self):
+        for url in (reverse('article-list'), reverse('article-detail', args=(self.article.id,)),
+                    reverse('category-list') + '?stats=true'):
+            with self.subTest(url=url):
+                response, primary, replica = self.request('get', url)
+                self.assertEqual(status.HTTP_200_OK, response.status_code)
+                self.assertEqual(0, primary)
+                self.assertGreater(replica, 0)
+
+        get_cache().clear()
+        with self.settings(DATABASE_REPLICAS=[]):
+            response, primary, replica = self.request('get', reverse('article-list'))
+            self.assertEqual((0, True), (replica, primary > 0))
+
+    def test_read_your_writes(self):
+        """ После голоса клиент читает с default, пока не истёк срок cookie """
+        self.client.force_login(self.user)
+        response, primary, replica = self.request(
+            'patch', reverse('articlerelation-detail', args=(self.article.id,)),
+            data=json.dumps({'like': True}), content_type='application/json'
+        )
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual(0, replica)
+        self.assertEqual(5, response.cookies[DatabaseRoutingMiddleware.cookie_name]['max-age'])
+
+        response, primary, replica = self.request('get', reverse('article-detail', args=(self.article.id,)))
+        self.assertEqual(1, response.data['count_like_annotate'])
+        self.assertEqual(0, replica)
+
+        self.client.cookies[DatabaseRoutingMiddleware.cookie_name] = '9999999999'
+        response, primary, replica = self.request('get', reverse('article-detail', args=(self.article.id,)))
+        self.assertEqual(0, primary)
+
+    def test_read_your_writes_cache(self):
+        """ Закреплённый клиент не читает кэш, заполненный другими клиентами с реплики """
+        self.client.force_login(self.user)
+        response = self.client.patch(reverse('articlerelation-detail', args=(self.article.id,)),
+                                     data=json.dumps({'like': True}), content_type='application/json')
+        until = response[DatabaseRoutingMiddleware.header_name]
+        url = reverse('article-detail', args=(self.article.id,))
+        other = self.client_class()
+        self.assertEqual('MISS', other.get(url)['X-Cache'])
+
+        response, primary, replica = self.request('get', url)
+        self.assertEqual(('BYPASS', 0), (response['X-Cache'], replica))
+        self.assertGreater(primary, 0)
+
+        """ Клиент без cookie закрепляется заголовком X-DB-Primary-Until """
+        response = other.get(url, HTTP_X_DB_PRIMARY_UNTIL=until)
+        self.assertEqual('BYPASS', response['X-Cache'])
+        self.assertEqual('HIT', other.get(url)['X-Cache'])
+
+    def test_search_trigram_check(self):
+        """ pg_trgm проверяется в базе, из которой читается поиск, результат кэшируется по алиасу """
+        with mock.patch.dict(_trigram, clear=True):
+            response, primary, replica = self.request('get', reverse('article-list'), data={'search': 'article'})
+            self.assertEqual(status.HTTP_200_OK, response.status_code)
+            self.assertEqual(0, primary)
+            self.assertEqual(['replica'], list(_trigram))
+
+            with self.settings(DATABASE_REPLICAS=[]):
+                response, primary, replica = self.request('get', reverse('article-list'), data={'search': 'title'})
+            self.assertEqual(0, replica)
+            self.assertEqual(['default', 'replica'], sorted(_trigram))
+
+    def test_failed_write_does_not_pin(self):
+        response, primary, replica = self.request(
+            'patch', reverse('articlerelation-detail', args=(self.article.id,)),
+            data=json.dumps({'like': True}), content_type='application/json'
+        )
+        self.assertEqual(status.HTTP_403_FORBIDDEN, response.status_code)
+        self.assertNotIn(DatabaseRoutingMiddleware.cookie_name, response.cookies)
+
+    def test_health_check(self):
+        """ Разорванное постоянное соединение закрывается до выполнения запросов """
+        connection = connections['replica']
+        connection.ensure_connection()
+        connection.health_checked_at = 0
+        with mock.patch.object(type(connection), 'is_usable', return_value=False):
+            check_connections()
+        self.assertIsNone(connection.connection)
+
+        connection.ensure_connection()
+        with mock.patch.object(type(connection), 'is_usable', return_value=False):
+            check_connections()
+        self.assertIsNotNone(connection.connection)
@@ -1,11 +1,23 @@
+import io
 import json
+from decimal import Decimal
+from unittest import mock, skipIf
 
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APITestCase
 from django.contrib.auth.models import User
-from django.db.models import Count, When, Case, Avg
 
+from article.cache import get_cache
+from article import renderers
 from article.models import Category, Article, ArticleRelation
-from article.serializers import ArticleSerializer
+from article.parsers import FastJSONParser
+from article.renderers import FastJSONRenderer
+from article.serializers import ArticleSerializer, ArticleValuesSerializer
 
 
 class TestSerializersAPITestCase(APITestCase):
@@ -51,7 +63,8 @@ class TestSerializersAPITestCase(APITestCase):
                     {'id': self.user_1.id, 'username': self.user_1.username},
                     {'id': self.user_2.id, 'username': self.user_2.username},
                     {'id': self.user_3.id, 'username': self.user_3.username},
-                ]
+                ],
+                'readers_count': 3
             },
             {
                 'id': self.article_2.id,
@@ -66,7 +79,8 @@ class TestSerializersAPITestCase(APITestCase):
                     {'id': self.user_1.id, 'username': self.user_1.username},
                     {'id': self.user_2.id, 'username': self.user_2.username},
                     {'id': self.user_3.id, 'username': self.user_3.username},
-                ]
+                ],
+                'readers_count': 3
             },
             {
                 'id': self.article_3.id,
@@ -77,12 +91,85 @@ class TestSerializersAPITestCase(APITestCase):
                 'owner': self.article_3.owner.username,
                 'count_like_annotate': 0,
                 'rating': None,
-                'readers': []
+                'readers': [],
+                'readers_count': 0
             }
         ]
 
-        articles = Article.objects.all().annotate(
-            count_like_annotate=Count(Case(When(articlerelation__like=True, then=1))),
-            rating_annotate=Avg('articlerelation__rating')).order_by('id')
+        articles = Article.objects.all().order_by('id')
         serializer_data = ArticleSerializer(articles, many=True).data
         self.assertEqual(data, serializer_data)
+
+    def test_values_serializer(self):
+        """ Сравнение ArticleValuesSerializer с ArticleSerializer """
+        Article.objects.create(title='article-4', category=self.category_2, description=None, owner=None)
+        articles = Article.objects.all().order_by('id')
+        rows = articles.values(*ArticleValuesSerializer.values)
+        self.assertEqual(
+            json.loads(json.dumps(ArticleSerializer(articles, many=True).data)),
+            json.loads(json.dumps(ArticleValuesSerializer(rows, many=True).data))
+        )
+        self.assertEqual(ArticleSerializer(articles[0]).data, ArticleValuesSerializer(rows[0]).data)
+
+    def test_values_serializer_api(self):
+        """ Сравнение ответов API в обычном и быстром режимах сериализации """
+        urls = [
+            (reverse('article-list'), {}),
+            (reverse('article-list'), {'ordering': '-title', 'page_size': 2}),
+            (reverse('article-list'), {'category': self.category_1.id}),
+            (reverse('article-list'), {'search': 'article-2'}),
+            (reverse('article-detail', args=(self.article_1.id,)), {}),
+            (reverse('article-detail', args=(0,)), {}),
+        ]
+        for url, params in urls:
+            response = self.client.get(url, data=params)
+            get_cache().clear()
+            with self.settings(ARTICLE_VALUES_SERIALIZATION=True):
+                values_response = self.client.get(url, data=params)
+            self.assertEqual(response.status_code, values_response.status_code)
+            self.assertEqual(response.content, values_response.content)
+
+    @skipIf(renderers.orjson is None, 'orjson не установлен')
+    def test_fast_json_renderer(self):
+        """ FastJSONRenderer выводит то же, что JSONRenderer, и с orjson, и без него """
+        articles = Article.objects.all().order_by('id')
+        payloads = [
+            ArticleSerializer(articles, many=True).data,
+            ArticleSerializer(articles[0]).data,
+            {
+                'title': 'статья \u2028 \u2029 "\\ \x01\t', 'rating': Decimal('4.50'), 1: None,
+                'date': timezone.now(), 'day': timezone.now().date(), 'time': timezone.now().time(),
+                'lazy': gettext_lazy('Not found.'), 'big': 2 ** 70, 'list': (1, 2.5, True),
+            },
+        ]
+        for data in payloads:
+            expected = JSONRenderer().render(data)
+            self.assertEqual(expected, FastJSONRenderer().render(data))
+            self.assertEqual(
+                JSONRenderer().render(data, 'application/json; indent=4'),
+                FastJSONRenderer().render(data, 'application/json; indent=4')
+            )
+            with mock.patch.object(renderers, 'orjson', None):
+                self.assertEqual(expected, FastJSONRenderer().render(data))
+        self.assertEqual(b'', FastJSONRenderer().render(None))
+
+        response = self.client.get(reverse('article-list'))
+        self.assertEqual(JSONRenderer().render(response.data), response.content)
+
+    def test_fast_json_parser(self):
+        """ FastJSONParser разбирает JSON как JSONParser, ошибки - ParseError """
+        body = json.dumps({'article': 1, 'title': 'статья', 'rating': 4.5, 'like': True}).encode()
+        self.assertEqual(JSONParser().parse(io.BytesIO(body)), FastJSONParser().parse(io.BytesIO(body)))
+        self.assertEqual(
+            JSONParser().parse(io.BytesIO(body.decode().encode('cp1251')), parser_context={'encoding': 'cp1251'}),
+            FastJSONParser().parse(io.BytesIO(body.decode().encode('cp1251')), parser_context={'encoding': 'cp1251'})
+        )
+        for body in (b'{"article": ', b'{"rating": NaN}'):
+            with self.subTest(body=body), self.assertRaises(ParseError):
+                FastJSONParser().parse(io.BytesIO(body))
+
+        self.client.force_login(self.user_3)
+        response = self.client.put(
+            reverse('articlerelation-detail', args=(self.article_3.id,)), '{"like": ', content_type='application/json'
+        )
+        self.assertEqual(400, response.status_code)
@@ -1,37 +1,245 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connections
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import render
-from django.db.models import Count, Case, When, Avg
+from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.generics import get_object_or_404
 from rest_framework.mixins import UpdateModelMixin
 from rest_framework.viewsets import ModelViewSet, GenericViewSet
 from rest_framework.filters import SearchFilter, OrderingFilter
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import SAFE_METHODS, IsAuthenticated
+from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
 
-from .models import Category, Article, ArticleRelation
+from conf.db import check_connections
+
+from .authentication import make_token
+from .cache import cache_response, conditional_response, get_list_validators, get_object_validators
+from .filters import ArticleSearchFilter
+from .leaderboards import get_leaderboard
+from .logic import bulk_update_relations, delete_article, get_readers_preview, get_user_relations, upsert_relation
+from .metrics import measure
+from .models import Category, CategoryStats, Article, ArticleRelation, LeaderboardEntry
+from .pagination import KeysetCursorPagination
 from .permissions import IsAuthenticatedOrReadOnlyModify, IsAuthenticatedReadOnlyModify
-from .serializers import CategorySerializer, ArticleSerializer, ArticleRelationSerializer
+from .renderers import CSVRenderer, NDJSONRenderer
+from .serializers import (
+    CategorySerializer, CategoryStatsSerializer, ArticleSerializer, ArticleValuesSerializer,
+    ArticleRelationSerializer, ArticleRelationBulkSerializer, FavoriteSerializer, LeaderboardEntrySerializer,
+    LikedSerializer, ReaderSerializer
+)
+
+
+async def stream_in_thread(content, context):
+    """
+    Асинхронный перебор потокового ответа: части читаются в отдельном потоке ответа,
+    в контексте запроса context, курсор базы данных остаётся в одном потоке.
+    Соединения потока закрываются по окончании или при разрыве соединения клиентом
+    """
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='article-stream')
+    chunks = iter(content)
+    try:
+        while True:
+            chunk = await loop.run_in_executor(executor, context.run, next, chunks, None)
+            if chunk is None:
+                break
+            yield chunk
+    finally:
+        await loop.run_in_executor(executor, connections.close_all)
+        executor.shutdown(wait=False)
+
+
+def run_view(view, request, *args, **kwargs):
+    """
+    Обработка запроса и рендеринг ответа в одном потоке. Соединения с базой данных
+    этого потока закрываются по CONN_MAX_AGE и проверяются, как при запросе WSGI.
+    Потоковый ответ (export) читается по частям в отдельном потоке (stream_in_thread),
+    обработчик ASGI (conf.asgi.ASGIHandler) отправляет первую часть, не дожидаясь остальных
+    """
+    close_old_connections()
+    check_connections()
+    try:
+        with measure('view'):
+            response = view(request, *args, **kwargs)
+        if response.streaming:
+            response.async_streaming_content = stream_in_thread(response.streaming_content, copy_context())
+            return response
+        if not callable(getattr(response, 'render', None)):
+            return response
+        with measure('render'):
+            response.render()
+        rendered = HttpResponse(response.content, status=response.status_code)
+        for header, value in response.items():
+            rendered[header] = value
+        rendered.cookies = response.cookies
+        return rendered
+    finally:
+        close_old_connections()
+
+
+def run_read_view(view, request, *args, **kwargs):
+    """
+    run_view в пуле потоков: запрос может попасть в любой поток пула, постоянные
+    соединения (CONN_MAX_AGE) копились бы по одному на поток и не закрывались никогда.
+    Соединения потока закрываются после запроса, как при CONN_MAX_AGE = 0
+    """
+    try:
+        return run_view(view, request, *args, **kwargs)
+    finally:
+        connections.close_all()
+
+
+class AsyncReadMixin:
+    """
+    При ASYNC_API_VIEWS (запуск через conf/asgi.py) представление - корутина.
+    Чтение (GET/HEAD/OPTIONS) выполняется в пуле потоков параллельно, а не в одном
+    общем потоке sync_to_async(thread_sensitive=True), и за один переход вместе
+    с рендерингом ответа. Фильтры, поиск, сортировка и права доступа - те же, DRF
+    """
 
+    @classmethod
+    def as_view(cls, actions=None, **initkwargs):
+        view = super().as_view(actions, **initkwargs)
+        if not getattr(settings, 'ASYNC_API_VIEWS', False):
+            return view
 
-class ArticleViewSet(ModelViewSet):
+        read = sync_to_async(run_read_view, thread_sensitive=False)
+        write = sync_to_async(run_view, thread_sensitive=True)
+
+        @wraps(view)
+        async def async_view(request, *args, **kwargs):
+            handler = read if request.method in SAFE_METHODS else write
+            return await handler(view, request, *args, **kwargs)
+        return async_view
+
+
+class ArticleViewSet(AsyncReadMixin, ModelViewSet):
     """ Представление данных Article """
-    queryset = Article.objects.all().annotate(
-        count_like_annotate=Count(Case(When(articlerelation__like=True, then=1)))).select_related(
-        'owner').prefetch_related('readers').order_by('id')
+    queryset = Article.objects.all().select_related('owner').defer('search_vector').order_by('id')
     serializer_class = ArticleSerializer
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
-    """ Фильтрация, поиск и сортировка """
+    filter_backends = [DjangoFilterBackend, ArticleSearchFilter, OrderingFilter]
+    """ Фильтрация, поиск (полнотекстовый, по search_vector) и сортировка """
     filter_fields = ['category', 'category__title', 'date_of_publication', 'owner', 'owner__username']
-    search_fields = ['title']
     ordering_fields = ['title', 'date_of_publication', 'category__title']
+    """ Постраничный вывод по курсору """
+    pagination_class = KeysetCursorPagination
+    """ Строк на одно чтение курсора базы данных при выгрузке export """
+    export_chunk_size = 2000
     """ Ограничение прав доступа и действий над объектами """
     permission_classes = [IsAuthenticatedOrReadOnlyModify]
+    """ Изменение и удаление статьи: без фильтров, поиска и сортировки списка """
+    write_actions = ('update', 'partial_update', 'destroy')
+
+    def get_queryset(self):
+        if self.action == 'destroy':
+            """ Для проверки прав и удаления достаточно id и owner_id """
+            return Article.objects.only('pk', 'owner_id')
+        return super().get_queryset()
+
+    def filter_queryset(self, queryset):
+        if self.action in self.write_actions:
+            return queryset
+        return super().filter_queryset(queryset)
 
     def perform_create(self, serializer):
         """ Переопределение метода класса  CreateModelMixin """
         serializer.validated_data['owner'] = self.request.user
         serializer.save()
 
+    def perform_destroy(self, instance):
+        delete_article(instance)
+
+    def use_values_serializer(self):
+        """ Чтение через .values() и ArticleValuesSerializer, включается ARTICLE_VALUES_SERIALIZATION """
+        return self.action in ('list', 'retrieve') and getattr(settings, 'ARTICLE_VALUES_SERIALIZATION', False)
+
+    def get_mine_user(self):
+        """ Пользователь, отметки которого выводятся в ответе (?mine=true), или None """
+        return self.request.user if ArticleSerializer.with_mine(self.request) else None
+
+    @cache_response('article', 'article-list', depends={ArticleSerializer.mine_param: 'relation'},
+                    private=[ArticleSerializer.mine_param])
+    def list(self, request, *args, **kwargs):
+        if not self.use_values_serializer():
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset()).values(*ArticleValuesSerializer.values)
+        page = self.paginate_queryset(queryset)
+        return self.get_paginated_response(ArticleValuesSerializer(page, many=True, user=self.get_mine_user()).data)
 
-class CategoryViewSet(ModelViewSet):
+    @conditional_response(get_object_validators, skip_params=[ArticleSerializer.mine_param])
+    @cache_response('article', 'article-detail', depends={ArticleSerializer.mine_param: 'relation'},
+                    private=[ArticleSerializer.mine_param])
+    def retrieve(self, request, *args, **kwargs):
+        if not self.use_values_serializer():
+            return super().retrieve(request, *args, **kwargs)
+        row = get_object_or_404(self.get_queryset().values(*ArticleValuesSerializer.values), pk=kwargs['pk'])
+        self.check_object_permissions(request, row)
+        return Response(ArticleValuesSerializer(row, user=self.get_mine_user()).data)
+
+    def paginate_queryset(self, queryset):
+        """ Первые читатели статей страницы и отметки пользователя (?mine=true) загружаются одним запросом """
+        page = super().paginate_queryset(queryset)
+        if page is not None and self.action == 'list':
+            ids = [article['id'] if isinstance(article, dict) else article.pk for article in page]
+            preview = get_readers_preview(ids)
+            user = self.get_mine_user()
+            relations = {} if user is None else get_user_relations(user.pk, ids)
+            for article in page:
+                if isinstance(article, dict):
+                    article['readers_preview'] = preview[article['id']]
+                    if user is not None:
+                        article['my_relation'] = relations[article['id']]
+                else:
+                    article.readers_preview = preview[article.pk]
+                    if user is not None:
+                        article.my_relation = relations[article.pk]
+        return page
+
+    @action(detail=False, renderer_classes=[NDJSONRenderer, CSVRenderer])
+    def export(self, request):
+        """
+        Потоковая выгрузка статей (?format=ndjson|csv или Accept) с фильтрами, поиском
+        и сортировкой списка. Строки читаются курсором на стороне сервера порциями
+        export_chunk_size, память не зависит от количества статей
+        """
+        queryset = self.filter_queryset(self.get_queryset()).values(*ArticleValuesSerializer.values)
+        rows = ArticleValuesSerializer(queryset.iterator(chunk_size=self.export_chunk_size), many=True, readers=False)
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(
+            renderer.render_stream(rows.iterator(), ArticleValuesSerializer.fields),
+            content_type=f'{renderer.media_type}; charset={renderer.charset}'
+        )
+        response['Content-Disposition'] = f'attachment; filename="articles.{renderer.format}"'
+        return response
+
+    @action(detail=True, serializer_class=ReaderSerializer, filter_backends=[])
+    def readers(self, request, pk=None):
+        """ Постраничный список всех читателей статьи """
+        article = get_object_or_404(Article.objects.only('pk'), pk=pk)
+        relations = ArticleRelation.objects.filter(article=article).select_related('user').order_by('id')
+        page = self.paginate_queryset(relations)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False, serializer_class=LeaderboardEntrySerializer, filter_backends=[])
+    def trending(self, request):
+        """ Популярные за неделю статьи, общий рейтинг или категории ?category= """
+        category = request.query_params.get('category')
+        if category is not None and not category.isdigit():
+            raise ValidationError({'category': ['A valid integer is required.']})
+        entries = get_leaderboard(LeaderboardEntry.TRENDING, category and int(category))
+        return Response(self.get_serializer(entries, many=True).data)
+
+
+class CategoryViewSet(AsyncReadMixin, ModelViewSet):
     """ Представление данных Category """
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
@@ -42,6 +250,36 @@ class CategoryViewSet(ModelViewSet):
     """ Ограничение прав доступа и действий над объектами """
     permission_classes = [IsAuthenticatedReadOnlyModify]
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'stats' or CategorySerializer.with_stats(self.request):
+            queryset = queryset.select_related('stats')
+        return queryset
+
+    @conditional_response(get_list_validators, skip_params=[CategorySerializer.stats_param])
+    @cache_response('category', 'category-list', depends={CategorySerializer.stats_param: 'article'})
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @conditional_response(get_object_validators, skip_params=[CategorySerializer.stats_param])
+    @cache_response('category', 'category-detail', depends={CategorySerializer.stats_param: 'article'})
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    @action(detail=True, filter_backends=[])
+    def stats(self, request, pk=None):
+        """ Сводные данные категории: количество статей, лайков и оценок, средняя оценка """
+        category = self.get_object()
+        stats = getattr(category, 'stats', None) or CategoryStats(category=category)
+        return Response(CategoryStatsSerializer(stats).data)
+
+    @action(detail=True, serializer_class=LeaderboardEntrySerializer, filter_backends=[])
+    def top(self, request, pk=None):
+        """ Лучшие по оценкам и лайкам статьи категории """
+        category = get_object_or_404(Category.objects.only('pk'), pk=pk)
+        entries = get_leaderboard(LeaderboardEntry.TOP, category.pk)
+        return Response(self.get_serializer(entries, many=True).data)
+
 
 class ArticleRelationViewSet(UpdateModelMixin, GenericViewSet):
     """ Представление данных ArticleRelation """
@@ -49,13 +287,77 @@ class ArticleRelationViewSet(UpdateModelMixin, GenericViewSet):
     serializer_class = ArticleRelationSerializer
     permission_classes = [IsAuthenticated]
     lookup_field = 'article'
+    """ Максимальный размер пакета для bulk """
+    bulk_max_items = 500
+    """ Постраничный вывод favorites и liked по курсору """
+    pagination_class = KeysetCursorPagination
 
     def get_object(self):
         """ Получение объекта """
-        obj, _ = ArticleRelation.objects.get_or_create(user=self.request.user, article_id=self.kwargs['article'])
-        return obj
+        return get_object_or_404(ArticleRelation, user=self.request.user, article_id=self.kwargs['article'])
+
+    def update(self, request, *args, **kwargs):
+        """ Создание или изменение связи одним upsert и одним UPDATE счётчиков статьи """
+        serializer = self.get_serializer(data=request.data, partial=kwargs.pop('partial', False))
+        serializer.is_valid(raise_exception=True)
+        values = {field: value for field, value in serializer.validated_data.items() if field != 'article'}
+        try:
+            relation = upsert_relation(request.user.pk, int(kwargs['article']), values)
+        except (ValueError, Article.DoesNotExist):
+            raise NotFound()
+        return Response(self.get_serializer(relation).data)
+
+    @action(detail=False, methods=['post'], serializer_class=ArticleRelationBulkSerializer)
+    def bulk(self, request):
+        """ Пакетное изменение связей: список {article, like, to_favorites, rating}, результат по элементам """
+        if not isinstance(request.data, list) or len(request.data) > self.bulk_max_items:
+            raise ValidationError({'non_field_errors': [f'Expected a list of at most {self.bulk_max_items} items.']})
+
+        results, valid = [None] * len(request.data), []
+        for index, item in enumerate(request.data):
+            serializer = self.get_serializer(data=item)
+            if serializer.is_valid():
+                valid.append((index, serializer.validated_data))
+            else:
+                results[index] = {'status': 'invalid', 'errors': serializer.errors}
+
+        applied = bulk_update_relations(request.user, [data for _, data in valid])
+        for index, data in valid:
+            result, relation = applied[data['article']]
+            results[index] = {'article': data['article'], 'status': result}
+            if relation is not None:
+                results[index]['data'] = ArticleRelationSerializer(relation).data
+        return Response(results)
+
+    def list_marked(self, marked, marked_at):
+        """
+        Статьи пользователя с отметкой marked, новые отметки первыми. Страница
+        читается одним запросом по частичному индексу (user, -marked_at, -id)
+        """
+        relations = ArticleRelation.objects.filter(user=self.request.user, **{marked: True}).select_related(
+            'article__owner').defer('article__search_vector').order_by(f'-{marked_at}', '-id')
+        page = self.paginate_queryset(relations)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False, serializer_class=FavoriteSerializer)
+    def favorites(self, request):
+        """ Избранное пользователя по времени добавления """
+        return self.list_marked('to_favorites', 'favorited_at')
+
+    @action(detail=False, serializer_class=LikedSerializer)
+    def liked(self, request):
+        """ Статьи с лайком пользователя по времени отметки """
+        return self.list_marked('like', 'liked_at')
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def api_token(request):
+    """ Токен API для заголовка Authorization: Token <token> (вход по сессии или паролю) """
+    return Response({'token': make_token(request.user)})
 
 
 def auth_git(request):
-    """ Страница авторизации gitHub """
-    return render(request, 'auth.html', {})
+    """ Страница авторизации gitHub, после входа - токен API """
+    return render(request, 'auth.html', {'token': request.session.get('api_token')})
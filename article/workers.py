@@ -0,0 +1,62 @@
+import logging
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections, connections
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_worker = None
+
+
+class CountersWorker(threading.Thread):
+    """ Поток процесса, применяющий отложенные изменения счётчиков раз в interval секунд """
+
+    def __init__(self, interval):
+        super().__init__(name='article-counters', daemon=True)
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        from .logic import flush_counters
+
+        try:
+            while not self.stopped.wait(self.interval):
+                try:
+                    flush_counters()
+                except Exception:
+                    logger.exception('Ошибка применения отложенных изменений счётчиков')
+                finally:
+                    close_old_connections()
+        finally:
+            """ Постоянное соединение (CONN_MAX_AGE) потока закрывается вместе с ним """
+            connections.close_all()
+
+    def stop(self):
+        self.stopped.set()
+
+
+def ensure_counters_worker():
+    """
+    Запуск потока применения изменений при первом отложенном изменении в процессе,
+    если ARTICLE_COUNTERS_WORKER = 'thread' (иначе - команда flush_counters)
+    """
+    global _worker
+    if getattr(settings, 'ARTICLE_COUNTERS_WORKER', 'thread') != 'thread':
+        return None
+    with _lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = CountersWorker(getattr(settings, 'ARTICLE_COUNTERS_FLUSH_INTERVAL', 1.0))
+            _worker.start()
+    return _worker
+
+
+def stop_counters_worker():
+    """ Остановка потока с ожиданием его завершения и закрытия его соединений """
+    global _worker
+    with _lock:
+        if _worker is not None:
+            _worker.stop()
+            _worker.join()
+            _worker = None
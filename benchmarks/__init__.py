@@ -0,0 +1,65 @@
+"""
+Бенчмарки article API.
+
+Запуск из корня проекта: python -m benchmarks.<модуль> [параметры]
+Данные создаются во временной тестовой базе, которая удаляется после замера.
+"""
+import os
+import statistics
+import time
+from contextlib import contextmanager
+
+
+def setup():
+    """ Инициализация Django для запуска вне manage.py """
+    import django
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'conf.settings')
+    django.setup()
+
+
+@contextmanager
+def test_database(verbosity=0):
+    """ Временная тестовая база, как у manage.py test """
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    setup_test_environment(debug=False)
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=verbosity, autoclobber=True)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity)
+        teardown_test_environment()
+
+
+def timeit(func, repeat):
+    """ Время выполнения func (секунды) для каждого из repeat запусков """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def report(name, timings, items, baseline=None):
+    """ Медиана замера; baseline - медиана для сравнения (во сколько раз быстрее) """
+    median = statistics.median(timings)
+    line = f'{name:<28} median {median * 1000:8.2f} ms  {items / median:10.0f} articles/s'
+    if baseline is not None:
+        line += f'  x{baseline / median:.2f}'
+    print(line)
+    return median
+
+
+@contextmanager
+def no_response_cache():
+    """ Замер без кэша ответов API (article.cache) """
+    from django.conf import settings
+    from django.test import override_settings
+
+    caches = {**settings.CACHES, settings.API_CACHE_ALIAS: {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+    with override_settings(CACHES=caches):
+        yield
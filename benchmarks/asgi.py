@@ -0,0 +1,150 @@
+"""
+Нагрузка на /api/article/ и /api/category/: conf/wsgi.py под gunicorn (gthread)
+против conf/asgi.py под uvicorn с ASYNC_API_VIEWS, с одинаковым числом потоков
+(--threads). Нужны gunicorn и uvicorn.
+
+    python -m benchmarks.asgi --articles 2000 --requests 3000 --concurrency 32
+"""
+import argparse
+import asyncio
+import multiprocessing
+import random
+import re
+import socket
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks import no_response_cache, setup, test_database
+from benchmarks.serialization import seed
+
+
+def serve_wsgi(port, threads):
+    from gunicorn.app.base import BaseApplication
+
+    class Application(BaseApplication):
+        def load_config(self):
+            for name, value in {'bind': f'127.0.0.1:{port}', 'workers': 1, 'threads': threads,
+                                'worker_class': 'gthread', 'loglevel': 'warning'}.items():
+                self.cfg.set(name, value)
+
+        def load(self):
+            from conf.wsgi import application
+            return application
+
+    Application().run()
+
+
+def serve_asgi(port, threads):
+    """
+    Чтение под ASYNC_API_VIEWS выполняется sync_to_async(thread_sensitive=False)
+    в пуле потоков цикла событий по умолчанию: threads потоков, как у gunicorn
+    """
+    import uvicorn
+    from django.test import override_settings
+
+    override_settings(ASYNC_API_VIEWS=True).enable()
+    from conf.asgi import application
+
+    async def serve():
+        asyncio.get_running_loop().set_default_executor(
+            ThreadPoolExecutor(max_workers=threads, thread_name_prefix='asgi-sync'))
+        config = uvicorn.Config(application, host='127.0.0.1', port=port, log_level='warning')
+        await uvicorn.Server(config).serve()
+
+    asyncio.run(serve())
+
+
+def wait_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f'Сервер не запустился на порту {port}')
+
+
+async def fetch(reader, writer, path):
+    """ GET по keep-alive соединению, (статус, время ответа) """
+    start = time.perf_counter()
+    writer.write(f'GET {path} HTTP/1.1\r\nHost: testserver\r\n\r\n'.encode())
+    await writer.drain()
+    headers = await reader.readuntil(b'\r\n\r\n')
+    length = re.search(rb'content-length: *(\d+)', headers, re.IGNORECASE)
+    await reader.readexactly(int(length.group(1)) if length else 0)
+    return int(headers.split()[1]), time.perf_counter() - start
+
+
+async def load(port, paths, requests, concurrency):
+    queue = asyncio.Queue()
+    for index in range(requests):
+        queue.put_nowait(paths[index % len(paths)])
+    timings, errors = [], 0
+
+    async def client():
+        nonlocal errors
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        try:
+            while not queue.empty():
+                status, elapsed = await fetch(reader, writer, queue.get_nowait())
+                timings.append(elapsed)
+                errors += status != 200
+        finally:
+            writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return timings, errors, time.perf_counter() - start
+
+
+def run(options):
+    from django.db import connections
+
+    from article.models import Article
+
+    seed(options.articles, options.readers)
+    ids = list(Article.objects.values_list('pk', flat=True))
+    random.seed(0)
+    paths = [
+        '/api/article/?page_size=20', '/api/article/?search=bench&page_size=20',
+        '/api/article/?ordering=-date_of_publication&page_size=20', '/api/category/',
+        *(f'/api/article/{pk}/' for pk in random.sample(ids, min(len(ids), 50))),
+    ]
+    connections.close_all()
+    print(f'Статей: {options.articles}, запросов: {options.requests}, параллельно: {options.concurrency}')
+
+    context = multiprocessing.get_context('fork')
+    for name, target in (('WSGI gunicorn gthread', serve_wsgi), ('ASGI uvicorn', serve_asgi)):
+        process = context.Process(target=target, args=(options.port, options.threads), daemon=True)
+        process.start()
+        try:
+            wait_port(options.port)
+            asyncio.run(load(options.port, paths, options.concurrency, options.concurrency))
+            timings, errors, elapsed = asyncio.run(load(options.port, paths, options.requests, options.concurrency))
+        finally:
+            process.terminate()
+            process.join()
+        p99 = statistics.quantiles(timings, n=100)[98]
+        print(f'{name:<24} {len(timings) / elapsed:8.1f} req/s  p50 {statistics.median(timings) * 1000:7.1f} ms'
+              f'  p99 {p99 * 1000:7.1f} ms  ошибок {errors}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--articles', type=int, default=2000)
+    parser.add_argument('--readers', type=int, default=10)
+    parser.add_argument('--requests', type=int, default=3000)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--threads', type=int, default=8, help='Потоков gunicorn gthread и пула синхронного кода uvicorn')
+    parser.add_argument('--port', type=int, default=8765)
+    options = parser.parse_args()
+
+    setup()
+    with test_database(), no_response_cache():
+        run(options)
+
+
+if __name__ == '__main__':
+    main()
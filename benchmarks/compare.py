@@ -0,0 +1,65 @@
+"""
+Сравнение результатов benchmarks.scenarios: изменение каждого показателя
+в процентах. Код возврата 1, если время ответа (p95) выросло больше чем на
+--threshold процентов или выросло количество SQL-запросов на запрос.
+
+    python -m benchmarks.compare baseline.json current.json --threshold 10
+"""
+import argparse
+import json
+import sys
+
+METRICS = ('p50_ms', 'p95_ms', 'p99_ms', 'queries', 'peak_memory_kb')
+
+
+def change(old, new):
+    if old is None or new is None:
+        return None
+    if old == 0:
+        return 0.0 if new == 0 else float('inf')
+    return (new - old) / old * 100
+
+
+def compare(baseline, current, threshold):
+    """ Строки отчёта и список регрессий """
+    lines, regressions = [], []
+    for name in sorted(set(baseline['scenarios']) | set(current['scenarios'])):
+        old, new = baseline['scenarios'].get(name), current['scenarios'].get(name)
+        if old is None or new is None:
+            lines.append(f'{name:<26} {"только в текущем" if old is None else "только в базовом"}')
+            continue
+        cells = []
+        for metric in METRICS:
+            percent = change(old.get(metric), new.get(metric))
+            cells.append(f'{metric} {new.get(metric)} ({"-" if percent is None else f"{percent:+.1f}%"})')
+        lines.append(f'{name:<26} ' + '  '.join(cells))
+
+        p95 = change(old['p95_ms'], new['p95_ms'])
+        if p95 is not None and p95 > threshold:
+            regressions.append(f'{name}: p95 {old["p95_ms"]} -> {new["p95_ms"]} ms')
+        if old.get('queries') is not None and new.get('queries') is not None and new['queries'] > old['queries']:
+            regressions.append(f'{name}: запросов {old["queries"]} -> {new["queries"]}')
+    return lines, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('baseline')
+    parser.add_argument('current')
+    parser.add_argument('--threshold', type=float, default=10, help='Допустимый рост p95, проценты')
+    options = parser.parse_args()
+
+    with open(options.baseline) as baseline, open(options.current) as current:
+        baseline, current = json.load(baseline), json.load(current)
+    if baseline.get('options', {}).get('articles') != current.get('options', {}).get('articles'):
+        print('Внимание: результаты получены на разных объёмах данных')
+
+    lines, regressions = compare(baseline, current, options.threshold)
+    print('\n'.join(lines))
+    if regressions:
+        print('\nРегрессии:\n' + '\n'.join(regressions))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
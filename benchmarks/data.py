@@ -0,0 +1,79 @@
+"""
+Генератор данных для бенчмарков: пользователи, категории, статьи и связи
+с неравномерным распределением, как у живого сервиса. Строки создаются
+в PostgreSQL через generate_series, random() - с setseed(), поэтому данные
+воспроизводимы при том же seed.
+
+- категории и авторы: чем меньше номер, тем больше статей (random() ^ 2);
+- читатели статьи: распределение Парето со средним relations, не больше users;
+- активные пользователи (меньшие номера) читают чаще;
+- доля лайков и оценки зависят от «качества» статьи, оценки смещены к 4-5,
+  часть читателей не оценивает статью.
+"""
+from benchmarks.search import WORDS
+
+""" Параметр распределения Парето числа читателей: меньше - длиннее хвост популярных статей """
+PARETO_ALPHA = 1.5
+
+
+def generate(users=1000, categories=20, articles=20000, relations=10, seed=0):
+    """ Возвращает количество созданных связей """
+    from django.contrib.auth.models import User
+    from django.db import connection
+
+    from article.logic import rebuild_counters
+    from article.models import Article, ArticleRelation, Category
+
+    user_table, category_table = User._meta.db_table, Category._meta.db_table
+    article_table, relation_table = Article._meta.db_table, ArticleRelation._meta.db_table
+    words = 'ARRAY[%s]' % ', '.join(f"'{word}'" for word in WORDS)
+    word = f'({words})[1 + floor(random() * {len(WORDS)})::int]'
+    """ «Качество» статьи в [0, 1) по её id, одинаковое для всех её читателей """
+    quality = 'sqrt(((article.id * 2654435761) %% 1000) / 1000.0)'
+
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT setseed(%s)', [seed % 1000 / 1000])
+        cursor.execute(f"""
+            INSERT INTO {user_table} (username, password, first_name, last_name, email,
+                                      is_superuser, is_staff, is_active, date_joined)
+            SELECT 'bench-user-' || i, '', '', '', '', false, false, true, now()
+            FROM generate_series(1, %s) AS i
+        """, [users])
+        cursor.execute(f"""
+            INSERT INTO {category_table} (title, updated_at)
+            SELECT 'bench-category-' || i, now() FROM generate_series(1, %s) AS i
+        """, [categories])
+        cursor.execute(f"""
+            INSERT INTO {article_table} (
+                title, category_id, description, date_of_publication, owner_id, updated_at,
+                rating_sum, rating_count, like_count, readers_count
+            )
+            SELECT {word} || ' ' || {word} || ' term' || i,
+                   (SELECT min(id) FROM {category_table}) + floor(%s * random() ^ 2)::int,
+                   {word} || ' ' || {word} || ' ' || {word} || ' ' || {word},
+                   now() - random() * interval '365 days',
+                   (SELECT min(id) FROM {user_table}) + floor(%s * random() ^ 2)::int, now(), 0, 0, 0, 0
+            FROM generate_series(1, %s) AS i
+        """, [categories, users, articles])
+        cursor.execute(f"""
+            INSERT INTO {relation_table} (user_id, article_id, "like", to_favorites, rating)
+            SELECT (SELECT min(id) FROM {user_table}) + (reader.start + k) %% %(users)s, article.id,
+                   random() < 0.1 + 0.6 * {quality}, random() < 0.05,
+                   CASE WHEN random() < 0.3 THEN NULL
+                        ELSE least(5, greatest(1, round(1.5 + 3.5 * {quality} + random() - 0.5)))::int END
+            FROM {article_table} AS article
+            CROSS JOIN LATERAL (
+                -- ссылка на article: подзапрос и random() выполняются для каждой статьи
+                SELECT article.id * 0 + floor(%(users)s * random() ^ 2)::int AS start,
+                       least(%(users)s, floor(%(scale)s / (1 - random()) ^ (1 / %(alpha)s)))::int AS count
+            ) AS reader
+            CROSS JOIN LATERAL generate_series(1, reader.count) AS k
+            ON CONFLICT (user_id, article_id) DO NOTHING
+        """, {'users': users, 'alpha': PARETO_ALPHA, 'scale': relations * (PARETO_ALPHA - 1) / PARETO_ALPHA})
+        created = cursor.rowcount
+
+    rebuild_counters()
+    with connection.cursor() as cursor:
+        for table in (user_table, category_table, article_table, relation_table):
+            cursor.execute(f'ANALYZE {table}')
+    return created
@@ -0,0 +1,57 @@
+"""
+JSONRenderer/JSONParser DRF против FastJSONRenderer/FastJSONParser
+(orjson, если установлен) на страницах ArticleSerializer.
+
+    python -m benchmarks.renderers --articles 2000 --page-size 100 --repeat 200
+"""
+import argparse
+import io
+
+from benchmarks import report, setup, test_database, timeit
+from benchmarks.serialization import seed
+
+
+def run(options):
+    from rest_framework.parsers import JSONParser
+    from rest_framework.renderers import JSONRenderer
+
+    from article import renderers
+    from article.logic import get_readers_preview
+    from article.models import Article
+    from article.parsers import FastJSONParser
+    from article.renderers import FastJSONRenderer
+    from article.serializers import ArticleSerializer
+
+    seed(options.articles, options.readers)
+    size = options.page_size
+    page = list(Article.objects.select_related('owner').order_by('id')[:size])
+    preview = get_readers_preview([article.pk for article in page])
+    for article in page:
+        article.readers_preview = preview[article.pk]
+    data = {'next': None, 'previous': None, 'results': ArticleSerializer(page, many=True).data}
+
+    body = JSONRenderer().render(data)
+    assert FastJSONRenderer().render(data) == body, 'FastJSONRenderer: результат отличается от JSONRenderer'
+    print(f'orjson: {"да" if renderers.orjson else "нет"}, статей на странице: {size}, ответ: {len(body)} байт')
+
+    baseline = report('JSONRenderer', timeit(lambda: JSONRenderer().render(data), options.repeat), size)
+    report('FastJSONRenderer', timeit(lambda: FastJSONRenderer().render(data), options.repeat), size, baseline)
+    baseline = report('JSONParser', timeit(lambda: JSONParser().parse(io.BytesIO(body)), options.repeat), size)
+    report('FastJSONParser', timeit(lambda: FastJSONParser().parse(io.BytesIO(body)), options.repeat), size, baseline)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--articles', type=int, default=2000)
+    parser.add_argument('--readers', type=int, default=10)
+    parser.add_argument('--page-size', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=200)
+    options = parser.parse_args()
+
+    setup()
+    with test_database():
+        run(options)
+
+
+if __name__ == '__main__':
+    main()
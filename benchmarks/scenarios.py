@@ -0,0 +1,162 @@
+"""
+Сценарии нагрузки на article API в процессе (тестовый клиент Django, все
+middleware): список, фильтры, поиск, сортировка, статья, голос, категории.
+Для каждого сценария - перцентили времени ответа, SQL-запросов на запрос
+(по Server-Timing article.middleware.MetricsMiddleware) и пик памяти (tracemalloc).
+Результат записывается в JSON для сравнения: python -m benchmarks.compare
+
+    python -m benchmarks.scenarios --articles 20000 --requests 200 --output baseline.json
+"""
+import argparse
+import json
+import platform
+import random
+import re
+import statistics
+import time
+import tracemalloc
+
+from benchmarks import no_response_cache, setup, test_database
+from benchmarks.data import generate
+from benchmarks.search import WORDS
+
+
+def get_scenarios(context):
+    """ {сценарий: функция (random.Random) -> (метод, путь, тело)} """
+    articles, categories = context['articles'], context['categories']
+
+    def get(path):
+        return lambda rnd: ('get', path(rnd), None)
+
+    return {
+        'article-list': get(lambda rnd: '/api/article/?page_size=20'),
+        'article-filter-category': get(lambda rnd: f'/api/article/?page_size=20&category={rnd.choice(categories)}'),
+        'article-filter-owner': get(lambda rnd: f'/api/article/?page_size=20&owner__username=bench-user-{rnd.randint(1, 50)}'),
+        'article-search': get(lambda rnd: f'/api/article/?page_size=20&search={rnd.choice(WORDS)}'),
+        'article-search-rare': get(lambda rnd: f'/api/article/?page_size=20&search=term{rnd.randint(1, 1000)}'),
+        'article-order-date': get(lambda rnd: '/api/article/?page_size=20&ordering=-date_of_publication'),
+        'article-order-title': get(lambda rnd: '/api/article/?page_size=20&ordering=title'),
+        'article-order-category': get(lambda rnd: '/api/article/?page_size=20&ordering=category__title'),
+        'article-detail': get(lambda rnd: f'/api/article/{rnd.choice(articles)}/'),
+        'article-vote': lambda rnd: ('patch', f'/api/relation/{rnd.choice(articles)}/',
+                                     {'like': rnd.random() < 0.5, 'rating': rnd.randint(1, 5)}),
+        'category-list': get(lambda rnd: '/api/category/'),
+        'category-list-stats': get(lambda rnd: '/api/category/?stats=true'),
+        'category-stats': get(lambda rnd: f'/api/category/{rnd.choice(categories)}/stats/'),
+    }
+
+
+def percentile(values, percent):
+    return statistics.quantiles(values, n=100, method='inclusive')[percent - 1] if len(values) > 1 else values[0]
+
+
+def get_queries(response):
+    match = re.search(r'db;desc="(\d+) queries"', response.get('Server-Timing', ''))
+    return int(match.group(1)) if match else None
+
+
+def run_scenario(client, request, rnd, options):
+    """ Замер времени ответа, затем отдельный проход с tracemalloc (он замедляет выполнение) """
+    def call():
+        method, path, data = request(rnd)
+        response = getattr(client, method)(path, data=data, format='json')
+        assert response.status_code == 200, (path, response.status_code)
+        return response
+
+    for _ in range(options.warmup):
+        call()
+    timings, queries = [], []
+    for _ in range(options.requests):
+        start = time.perf_counter()
+        response = call()
+        timings.append(time.perf_counter() - start)
+        queries.append(get_queries(response))
+
+    peaks = []
+    tracemalloc.start()
+    try:
+        for _ in range(options.memory_requests):
+            tracemalloc.reset_peak()
+            call()
+            peaks.append(tracemalloc.get_traced_memory()[1])
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'requests': options.requests,
+        'p50_ms': round(percentile(timings, 50) * 1000, 3),
+        'p95_ms': round(percentile(timings, 95) * 1000, 3),
+        'p99_ms': round(percentile(timings, 99) * 1000, 3),
+        'mean_ms': round(statistics.mean(timings) * 1000, 3),
+        'queries': None if None in queries else round(statistics.mean(queries), 2),
+        'peak_memory_kb': round(max(peaks) / 1024, 1) if peaks else None,
+    }
+
+
+def run(options):
+    import django
+    from django.contrib.auth.models import User
+    from django.test import override_settings
+    from rest_framework.test import APIClient
+
+    from article.models import Article, Category
+
+    start = time.perf_counter()
+    relations = generate(options.users, options.categories, options.articles, options.relations, options.seed)
+    print(f'Данные: {options.users} пользователей, {options.categories} категорий, {options.articles} статей, '
+          f'{relations} связей за {time.perf_counter() - start:.1f} с')
+
+    context = {
+        'articles': list(Article.objects.order_by('id').values_list('id', flat=True)),
+        'categories': list(Category.objects.order_by('id').values_list('id', flat=True)),
+    }
+    scenarios = get_scenarios(context)
+    selected = options.scenarios or list(scenarios)
+    client = APIClient()
+    client.force_authenticate(User.objects.order_by('id').first())
+
+    results = {}
+    with override_settings(API_METRICS_SERVER_TIMING=True, API_METRICS_SAMPLE_RATE=0, API_METRICS_N_PLUS_ONE=10 ** 9):
+        for name in selected:
+            result = run_scenario(client, scenarios[name], random.Random(f'{options.seed}:{name}'), options)
+            results[name] = result
+            print(f'{name:<26} p50 {result["p50_ms"]:8.2f} ms  p95 {result["p95_ms"]:8.2f} ms  '
+                  f'p99 {result["p99_ms"]:8.2f} ms  запросов {result["queries"]}  '
+                  f'память {result["peak_memory_kb"]} КБ')
+
+    if options.output:
+        with open(options.output, 'w') as output:
+            json.dump({
+                'options': {name: value for name, value in vars(options).items() if name != 'output'},
+                'environment': {'python': platform.python_version(), 'django': django.get_version()},
+                'scenarios': results,
+            }, output, ensure_ascii=False, indent=2)
+        print(f'Результат: {options.output}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--categories', type=int, default=20)
+    parser.add_argument('--articles', type=int, default=20000)
+    parser.add_argument('--relations', type=int, default=10, help='Среднее количество читателей статьи')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--requests', type=int, default=200, help='Запросов на сценарий')
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--memory-requests', type=int, default=10, help='Запросов на сценарий под tracemalloc')
+    parser.add_argument('--scenarios', nargs='+', help='По умолчанию - все')
+    parser.add_argument('--cache', action='store_true', help='С кэшем ответов API (article.cache)')
+    parser.add_argument('--output', help='Файл JSON с результатом')
+    options = parser.parse_args()
+
+    setup()
+    with test_database():
+        if options.cache:
+            run(options)
+        else:
+            with no_response_cache():
+                run(options)
+
+
+if __name__ == '__main__':
+    main()
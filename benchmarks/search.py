@@ -0,0 +1,83 @@
+"""
+Сравнение поиска по title ILIKE (прежний SearchFilter) и полнотекстового
+ArticleSearchFilter на сгенерированных статьях.
+
+    python -m benchmarks.search --articles 2000000 --repeat 20
+"""
+import argparse
+
+from benchmarks import report, setup, test_database, timeit
+
+WORDS = (
+    'база', 'данных', 'индекс', 'запрос', 'кэширование', 'поиск', 'статья', 'категория', 'рейтинг',
+    'python', 'django', 'postgresql', 'performance', 'search', 'index', 'cache', 'query', 'api',
+)
+
+
+def seed(articles):
+    """ Статьи генерируются в PostgreSQL через generate_series, без передачи строк из Python """
+    from django.contrib.auth.models import User
+    from django.db import connection
+
+    from article.models import Article, Category
+
+    user = User.objects.create(username='bench-user')
+    category = Category.objects.create(title='bench-category')
+    words = 'ARRAY[%s]' % ', '.join(f"'{word}'" for word in WORDS)
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            INSERT INTO {Article._meta.db_table} (
+                title, category_id, description, date_of_publication, owner_id, updated_at,
+                rating_sum, rating_count, like_count, readers_count
+            )
+            SELECT
+                ({words})[1 + i %% {len(WORDS)}] || ' ' || ({words})[1 + (i / 7) %% {len(WORDS)}] || ' term' || i %% 100000,
+                %s, ({words})[1 + (i / 3) %% {len(WORDS)}] || ' ' || ({words})[1 + (i / 11) %% {len(WORDS)}],
+                now(), %s, now(), 0, 0, 0, 0
+            FROM generate_series(1, %s) AS i
+        """, [category.pk, user.pk, articles])
+        cursor.execute(f'VACUUM ANALYZE {Article._meta.db_table}')
+
+
+def run(options):
+    from django.test import RequestFactory
+    from rest_framework.request import Request
+
+    from article.filters import ArticleSearchFilter
+    from article.models import Article
+
+    seed(options.articles)
+    size = options.page_size
+    queryset = Article.objects.defer('search_vector').order_by('id')
+    search_filter = ArticleSearchFilter()
+    print(f'Статей: {options.articles}, страница: {size}')
+
+    for term in options.terms:
+        request = Request(RequestFactory().get('/', {'search': term}))
+
+        def icontains():
+            return list(queryset.filter(title__icontains=term)[:size])
+
+        def full_text():
+            return list(search_filter.filter_queryset(request, queryset, None)[:size])
+
+        print(f'search={term!r}')
+        baseline = report('title ILIKE', timeit(icontains, options.repeat), size)
+        report('ArticleSearchFilter', timeit(full_text, options.repeat), size, baseline)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--articles', type=int, default=2000000)
+    parser.add_argument('--page-size', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--terms', nargs='+', default=['term12345', 'кэширование django', 'postgresql'])
+    options = parser.parse_args()
+
+    setup()
+    with test_database():
+        run(options)
+
+
+if __name__ == '__main__':
+    main()
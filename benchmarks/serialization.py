@@ -0,0 +1,85 @@
+"""
+Сравнение ArticleSerializer и ArticleValuesSerializer на списке статей.
+
+    python -m benchmarks.serialization --articles 2000 --page-size 100 --repeat 30
+"""
+import argparse
+
+from benchmarks import no_response_cache, report, setup, test_database, timeit
+
+
+def seed(articles, readers):
+    from django.contrib.auth.models import User
+
+    from article.models import Article, ArticleRelation, Category
+
+    users = User.objects.bulk_create(User(username=f'bench-user-{index}') for index in range(max(readers, 1)))
+    category = Category.objects.create(title='bench-category')
+    created = Article.objects.bulk_create(
+        Article(title=f'bench-article-{index}', category=category, description='bench description' * 5,
+                owner=users[index % len(users)])
+        for index in range(articles)
+    )
+    ArticleRelation.objects.bulk_create(
+        ArticleRelation(article=article, user=user, like=bool(index % 2), rating=index % 5 + 1)
+        for article in created for index, user in enumerate(users[:readers])
+    )
+
+
+def run(options):
+    from django.test import override_settings
+    from django.urls import reverse
+    from rest_framework.test import APIClient
+
+    from article.logic import get_readers_preview
+    from article.models import Article
+    from article.serializers import ArticleSerializer, ArticleValuesSerializer
+
+    seed(options.articles, options.readers)
+    size = options.page_size
+
+    def model_serializer():
+        page = list(Article.objects.select_related('owner').order_by('id')[:size])
+        preview = get_readers_preview([article.pk for article in page])
+        for article in page:
+            article.readers_preview = preview[article.pk]
+        return ArticleSerializer(page, many=True).data
+
+    def values_serializer():
+        page = list(Article.objects.order_by('id').values(*ArticleValuesSerializer.values)[:size])
+        preview = get_readers_preview([row['id'] for row in page])
+        for row in page:
+            row['readers_preview'] = preview[row['id']]
+        return ArticleValuesSerializer(page, many=True).data
+
+    print(f'Статей: {options.articles}, читателей на статью: {options.readers}, страница: {size}')
+    baseline = report('ArticleSerializer', timeit(model_serializer, options.repeat), size)
+    report('ArticleValuesSerializer', timeit(values_serializer, options.repeat), size, baseline)
+
+    client = APIClient()
+    url = reverse('article-list')
+
+    def request():
+        response = client.get(url, data={'page_size': size})
+        assert response.status_code == 200, response.status_code
+
+    baseline = report('GET /api/article/', timeit(request, options.repeat), size)
+    with override_settings(ARTICLE_VALUES_SERIALIZATION=True):
+        report('GET /api/article/ (values)', timeit(request, options.repeat), size, baseline)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--articles', type=int, default=2000)
+    parser.add_argument('--readers', type=int, default=10)
+    parser.add_argument('--page-size', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=30)
+    options = parser.parse_args()
+
+    setup()
+    with test_database(), no_response_cache():
+        run(options)
+
+
+if __name__ == '__main__':
+    main()
@@ -9,8 +9,38 @@ https://docs.djangoproject.com/en/3.1/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
+from asgiref.sync import sync_to_async
+from django.core.handlers import asgi
+
+
+class ASGIHandler(asgi.ASGIHandler):
+    """
+    Обработчик Django 3.1 перебирает потоковый ответ синхронно, в цикле событий.
+    Ответ с асинхронным итератором async_streaming_content (см. article.views.run_view)
+    отправляется по частям по мере их получения, цикл событий не блокируется
+    """
+
+    async def send_response(self, response, send):
+        content = getattr(response, 'async_streaming_content', None)
+        if content is None:
+            return await super().send_response(response, send)
+
+        headers = [
+            (header.encode('ascii'), value.encode('latin1')) for header, value in response.items()
+        ] + [(b'Set-Cookie', cookie.output(header='').encode('ascii').strip()) for cookie in response.cookies.values()]
+        await send({'type': 'http.response.start', 'status': response.status_code, 'headers': headers})
+        try:
+            async for part in content:
+                for chunk, _ in self.chunk_bytes(part):
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            await send({'type': 'http.response.body'})
+        finally:
+            await content.aclose()
+            await sync_to_async(response.close, thread_sensitive=True)()
+
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'conf.settings')
 
-application = get_asgi_application()
+django.setup(set_prefix=False)
+application = ASGIHandler()
@@ -0,0 +1,99 @@
+"""
+Маршрутизация запросов к базам данных: чтение безопасных HTTP-запросов (GET, HEAD,
+OPTIONS) - с реплик DATABASE_REPLICAS, запись и всё остальное - с основной базы
+default. После успешного изменяющего запроса клиент DATABASE_PRIMARY_PIN_SECONDS
+секунд читает с основной базы, чтобы видеть свои изменения без задержки репликации:
+срок приходит в cookie db_primary и в заголовке ответа X-DB-Primary-Until. Клиенты
+без cookie (токен API) передают полученное значение в заголовке запроса
+X-DB-Primary-Until. Кэш ответов API такие запросы не читают и не заполняют
+(article.cache.cache_response). Постоянные соединения (CONN_MAX_AGE) проверяются не реже
+DATABASE_HEALTH_CHECK_INTERVAL секунд и закрываются, если база их разорвала.
+"""
+import random
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework.permissions import SAFE_METHODS
+
+""" Чтение текущего запроса допускается с реплики """
+use_replica = ContextVar('use_replica', default=False)
+""" Клиент текущего запроса недавно изменял данные и читает с основной базы """
+primary_pinned = ContextVar('primary_pinned', default=False)
+
+
+class PrimaryReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        replicas = getattr(settings, 'DATABASE_REPLICAS', [])
+        if not replicas or not use_replica.get() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            """ Внутри транзакции основной базы чтение - из неё же """
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        """ Реплики - копии основной базы """
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+def check_connections(**kwargs):
+    """ Проверка открытых соединений потока, неработающие закрываются и открываются заново при запросе """
+    interval = getattr(settings, 'DATABASE_HEALTH_CHECK_INTERVAL', None)
+    if interval is None:
+        return
+    now = time.monotonic()
+    for connection in connections.all():
+        if connection.connection is None or connection.in_atomic_block:
+            continue
+        if now - getattr(connection, 'health_checked_at', 0) < interval:
+            continue
+        if not connection.is_usable():
+            connection.close()
+        connection.health_checked_at = now
+
+
+class DatabaseRoutingMiddleware:
+    """ Выбор базы для чтения по методу запроса и сроку cookie_name (или заголовка header_name) после записи """
+    cookie_name = 'db_primary'
+    header_name = 'X-DB-Primary-Until'
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        request_started.connect(check_connections, dispatch_uid='conf.db.check_connections')
+
+    def __call__(self, request):
+        pinned = self.is_pinned(request)
+        replica_token = use_replica.set(request.method in SAFE_METHODS and not pinned)
+        pinned_token = primary_pinned.set(pinned)
+        try:
+            response = self.get_response(request)
+        finally:
+            use_replica.reset(replica_token)
+            primary_pinned.reset(pinned_token)
+
+        pin = getattr(settings, 'DATABASE_PRIMARY_PIN_SECONDS', 0)
+        if request.method not in SAFE_METHODS and response.status_code < 400 and pin:
+            until = str(int(time.time() + pin))
+            response.set_cookie(self.cookie_name, until, max_age=pin, httponly=True, samesite='Lax')
+            response[self.header_name] = until
+        return response
+
+    def is_pinned(self, request):
+        """ Срок чтения с основной базы не больше DATABASE_PRIMARY_PIN_SECONDS от текущего времени """
+        now = time.time()
+        limit = now + getattr(settings, 'DATABASE_PRIMARY_PIN_SECONDS', 0) + 1
+        for value in (request.COOKIES.get(self.cookie_name), request.headers.get(self.header_name)):
+            try:
+                if value is not None and now < int(value) <= limit:
+                    return True
+            except ValueError:
+                pass
+        return False
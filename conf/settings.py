@@ -37,6 +37,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 
     'debug_toolbar',
     'social_django',
@@ -45,6 +46,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'article.middleware.MetricsMiddleware',
+    'conf.db.DatabaseRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -90,8 +93,49 @@ DATABASES = {
         'PASSWORD': '', #TODO: Пароль пользователя базы данных.
         'HOST': 'localhost',
         'PORT': '',
+        'CONN_MAX_AGE': 60,
     }
 }
+"""
+Реплика только для чтения, используется при DATABASE_REPLICAS = ['replica'].
+В тестах - зеркало default. За пулером в режиме transaction (PgBouncer) нужен
+DISABLE_SERVER_SIDE_CURSORS: выгрузка статей читает курсором на стороне сервера
+"""
+DATABASES['replica'] = {
+    **DATABASES['default'],
+    'HOST': 'localhost', #TODO: Хост реплики.
+    'TEST': {'MIRROR': 'default'},
+}
+
+DATABASE_ROUTERS = ['conf.db.PrimaryReplicaRouter']
+""" Алиасы DATABASES для чтения безопасных запросов, пусто - всё с default """
+DATABASE_REPLICAS = []
+""" Секунды чтения с основной базы после изменяющего запроса клиента (read-your-writes) """
+DATABASE_PRIMARY_PIN_SECONDS = 5
+""" Проверка постоянных соединений не реже чем раз в столько секунд, None - без проверки """
+DATABASE_HEALTH_CHECK_INTERVAL = 30
+
+# Cache
+# https://docs.djangoproject.com/en/3.1/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Кэш ответов API. LocMemCache вытесняет по LRU, но у каждого процесса свой:
+    # при нескольких процессах нужен общий Redis (django-redis), например
+    # 'BACKEND': 'django_redis.cache.RedisCache', 'LOCATION': 'redis://127.0.0.1:6379/1'
+    'api': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'api',
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+}
+
+API_CACHE_ALIAS = 'api'
 
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
@@ -131,15 +175,65 @@ STATIC_URL = '/static/'
 
 """ /?format=json """
 REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'article.authentication.SignedTokenAuthentication',
+        'rest_framework.authentication.SessionAuthentication',
+        'rest_framework.authentication.BasicAuthentication',
+    ],
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        'article.renderers.FastJSONRenderer',
     ],
     'DEFAULT_PARSER_CLASSES': [
-        'rest_framework.parsers.JSONParser',
+        'article.parsers.FastJSONParser',
     ],
     'DATETIME_FORMAT': "%Y-%m-%d %H:%M:%S",
 }
 
+""" Чтение статей (list/retrieve) через .values() без ModelSerializer """
+ARTICLE_VALUES_SERIALIZATION = False
+
+""" Асинхронные представления статей и категорий, включать при запуске через ASGI (conf/asgi.py) """
+ASYNC_API_VIEWS = False
+
+"""
+Счётчики статей: 'inline' - UPDATE в запросе голоса, 'queue' - отложенно, пакетами.
+Сводные данные категорий (CategoryStats) в обоих режимах изменяются пакетом после
+фиксации голоса, голоса в одной категории не ждут друг друга
+"""
+ARTICLE_COUNTERS_MODE = 'inline'
+""" Применение отложенных изменений: 'thread' - поток процесса, 'command' - manage.py flush_counters --interval """
+ARTICLE_COUNTERS_WORKER = 'thread'
+""" Интервал применения (секунды) - граница отставания счётчиков и рейтинга при чтении """
+ARTICLE_COUNTERS_FLUSH_INTERVAL = 1.0
+
+""" Показатели запросов к API (article.middleware.MetricsMiddleware): заголовок Server-Timing """
+API_METRICS_SERVER_TIMING = True
+""" Доля запросов, записываемых в лог article.metrics """
+API_METRICS_SAMPLE_RATE = 0.01
+""" Повторов одного SQL-запроса, после которых запрос записывается в лог как N+1 """
+API_METRICS_N_PLUS_ONE = 10
+
+""" Срок действия токена API (article.authentication), секунды """
+API_TOKEN_MAX_AGE = 60 * 60 * 24 * 7
+"""
+Время хранения пользователя токена в общем кэше API и в кэше процесса, секунды.
+Если кэш API свой у каждого процесса (LocMemCache), первое не больше второго:
+это задержка блокировки пользователя в остальных процессах (check --deploy, article.W001)
+"""
+API_TOKEN_USER_TTL = 300
+API_TOKEN_USER_LOCAL_TTL = 10
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'article.metrics': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
+}
+
 """ social_django """
 AUTHENTICATION_BACKENDS = (
     'social_core.backends.github.GithubOAuth2',
@@ -150,3 +244,16 @@ SOCIAL_AUTH_POSTGRES_JSONFIELD = True
 SOCIAL_AUTH_URL_NAMESPACE = 'social'
 SOCIAL_AUTH_GITHUB_KEY = '' #TODO: KEY from gitHub.
 SOCIAL_AUTH_GITHUB_SECRET = '' #TODO: Secret KEY from gitHub.
+""" Стандартные шаги и выдача токена API """
+SOCIAL_AUTH_PIPELINE = (
+    'social_core.pipeline.social_auth.social_details',
+    'social_core.pipeline.social_auth.social_uid',
+    'social_core.pipeline.social_auth.auth_allowed',
+    'social_core.pipeline.social_auth.social_user',
+    'social_core.pipeline.user.get_username',
+    'social_core.pipeline.user.create_user',
+    'social_core.pipeline.social_auth.associate_user',
+    'social_core.pipeline.social_auth.load_extra_data',
+    'social_core.pipeline.user.user_details',
+    'article.authentication.issue_token',
+)
@@ -20,7 +20,7 @@ from django.conf.urls import url
 from rest_framework.routers import SimpleRouter
 
 from article.views import CategoryViewSet, ArticleViewSet, ArticleRelationViewSet
-from article.views import auth_git
+from article.views import api_token, auth_git
 
 router = SimpleRouter()
 router.register('api/article', ArticleViewSet),
@@ -31,6 +31,7 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     url('', include('social_django.urls', namespace='social')),
     url('auth/', auth_git),
+    path('api/token/', api_token, name='api-token'),
     path('__debug__/', include(debug_toolbar.urls)),
 ]
 urlpatterns += router.urls